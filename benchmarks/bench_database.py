@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015 by Ecpy Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Micro-benchmarks of the task database.
+
+Run as a script : python benchmarks/bench_database.py
+
+"""
+from __future__ import (division, unicode_literals, print_function,
+                        absolute_import)
+
+import os
+import sys
+import pickle
+from threading import Thread
+from timeit import repeat, default_timer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ecpy.tasks.base_tasks import RootTask, ComplexTask, SimpleTask  # noqa
+from ecpy.tasks.tools.database import TaskDatabase  # noqa
+
+
+#: Number of calls per measurement.
+NUMBER = 100000
+
+
+def build_hierarchy(depth=5):
+    """Build a linear hierarchy of complex tasks ending with a simple task.
+
+    """
+    root = RootTask()
+    parent = root
+    for i in range(depth):
+        task = ComplexTask(name='complex%d' % i)
+        parent.add_child_task(0, task)
+        parent = task
+
+    task = SimpleTask(name='simple', database_entries={'val': 1.0})
+    parent.add_child_task(0, task)
+    root.prepare()
+    return root, task
+
+
+def report(title, timings):
+    """Print the best time per call in us.
+
+    """
+    print('{:<45} {:8.3f} us'.format(title, min(timings)/NUMBER*1e6))
+
+
+def bench_handles():
+    """Compare string-keyed access with handle access.
+
+    """
+    root, task = build_hierarchy()
+    database = task.database
+    path = task.path
+    handle = database.get_entry_handle(path, 'simple_val')
+
+    def string_set():
+        database.set_value(path, 'simple_val', 2.0)
+
+    def string_get():
+        database.get_value(path, 'default_path')
+
+    def handle_set():
+        handle.set(2.0)
+
+    def handle_get():
+        handle.get()
+
+    def task_write():
+        task.write_in_database('val', 2.0)
+
+    def task_read():
+        task.get_from_database('default_path')
+
+    report('set_value (string keyed)', repeat(string_set, number=NUMBER))
+    report('EntryHandle.set', repeat(handle_set, number=NUMBER))
+    report('get_value (string keyed, 5 levels)',
+           repeat(string_get, number=NUMBER))
+    report('EntryHandle.get', repeat(handle_get, number=NUMBER))
+    report('BaseTask.write_in_database', repeat(task_write, number=NUMBER))
+    report('BaseTask.get_from_database', repeat(task_read, number=NUMBER))
+
+
+def bench_contention(threads=(1, 2, 4, 8), writes=20000):
+    """Measure the write throughput of N threads writing concurrently.
+
+    The observer pickles each notification, as the MeasureSpy does when
+    sending updates to the main process.
+
+    """
+    for n in threads:
+        database = TaskDatabase()
+        for i in range(n):
+            database.set_value('root', 'val%d' % i, 0.0)
+        database.prepare_to_run()
+        database.observe('notifier', lambda change: pickle.dumps(change))
+
+        def write(i):
+            handle = database.get_entry_handle('root', 'val%d' % i)
+            for j in range(writes):
+                handle.set(float(j))
+
+        workers = [Thread(target=write, args=(i,)) for i in range(n)]
+        tic = default_timer()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = default_timer() - tic
+        print('{:<45} {:8.0f} writes/s'.format('%d writer thread(s)' % n,
+                                                n*writes/elapsed))
+
+
+def bench_typed_storage(entries=5000, number=1000):
+    """Compare snapshots of a list based and a typed flat database.
+
+    """
+    for typed in (False, True):
+        database = TaskDatabase(typed_storage=typed)
+        for i in range(entries):
+            database.set_value('root', 'val%d' % i, float(i))
+        database.prepare_to_run()
+
+        if typed:
+            def snapshot():
+                database.copy_numeric_values()
+        else:
+            def snapshot():
+                with database._lock:
+                    list(database._flat_database)
+
+        title = 'snapshot of %d floats (%s)' % (entries,
+                                               'typed' if typed else 'list')
+        print('{:<45} {:8.3f} us'.format(title,
+                                         min(repeat(snapshot, number=number)) /
+                                         number*1e6))
+
+
+def bench_edition(depth=10, width=100, number=1000):
+    """Measure path resolution and listing in edition mode.
+
+    """
+    database = TaskDatabase()
+    path = 'root'
+    for i in range(depth):
+        database.create_node(path, 'node%d' % i)
+        path += '/node%d' % i
+        for j in range(width):
+            database.set_value(path, 'val%d_%d' % (i, j), j)
+
+    def resolve():
+        database.go_to_path(path)
+
+    def get():
+        database.get_value(path, 'val0_0')
+
+    def listing():
+        database.list_accessible_entries(path)
+
+    for title, func in (('go_to_path (%d levels)' % depth, resolve),
+                        ('get_value (%d levels up)' % depth, get),
+                        ('list_accessible_entries (%d entries)' %
+                         (depth*width), listing)):
+        print('{:<45} {:8.3f} us'.format(title,
+                                         min(repeat(func, number=number)) /
+                                         number*1e6))
+
+
+def bench_prepare(nodes=100, entries=20, number=20):
+    """Compare entering the running mode with and without a cached layout.
+
+    """
+    def build():
+        database = TaskDatabase()
+        for i in range(nodes):
+            database.create_node('root', 'node%d' % i)
+            for j in range(entries):
+                database.set_value('root/node%d' % i, 'val%d' % j, j)
+        return database
+
+    database = build()
+
+    def rerun():
+        database.prepare_to_run()
+        database.exit_running()
+
+    def invalidated():
+        database.set_value('root', 'new', 0)
+        database.delete_value('root', 'new')
+        rerun()
+
+    for title, func in (('prepare_to_run + exit_running (unchanged)', rerun),
+                        ('prepare_to_run + exit_running (fingerprint)',
+                         invalidated)):
+        print('{:<45} {:8.3f} us'.format(title,
+                                         min(repeat(func, number=number)) /
+                                         number*1e6))
+
+
+def bench_snapshots(entries=5000, iterations=1000):
+    """Measure taking a snapshot per iteration when few values change.
+
+    """
+    database = TaskDatabase()
+    for i in range(entries):
+        database.set_value('root', 'val%d' % i, float(i))
+    database.prepare_to_run()
+    handle = database.get_entry_handle('root', 'val0')
+
+    snapshots = []
+    tic = default_timer()
+    for i in range(iterations):
+        handle.set(float(i))
+        snapshots.append(database.snapshot())
+    elapsed = default_timer() - tic
+    title = 'snapshot of %d entries, 1 changed' % entries
+    print('{:<45} {:8.3f} us'.format(title, elapsed/iterations*1e6))
+
+
+def bench_journal(writes=100000):
+    """Compare the write throughput with and without a journal.
+
+    """
+    import tempfile
+    from ecpy.tasks.tools.journal import JournalReader
+
+    fd, path = tempfile.mkstemp(suffix='.bin')
+    os.close(fd)
+    for journal in ('', path):
+        database = TaskDatabase(journal_path=journal)
+        database.set_value('root', 'val', 0.0)
+        database.prepare_to_run()
+        handle = database.get_entry_handle('root', 'val')
+        tic = default_timer()
+        for i in range(writes):
+            handle.set(float(i))
+        elapsed = default_timer() - tic
+        database.close_journal()
+        title = 'writes %s journal' % ('with' if journal else 'without')
+        print('{:<45} {:8.0f} writes/s'.format(title, writes/elapsed))
+
+    tic = default_timer()
+    JournalReader(path)
+    print('{:<45} {:8.3f} s'.format('reading %d records' % writes,
+                                     default_timer() - tic))
+    os.remove(path)
+
+
+def main():
+    """Run all the benchmarks.
+
+    """
+    bench_edition()
+    bench_prepare()
+    bench_handles()
+    bench_contention()
+    bench_typed_storage()
+    bench_snapshots()
+    bench_journal()
+
+
+if __name__ == '__main__':
+    main()
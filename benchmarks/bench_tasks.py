@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015 by Ecpy Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Micro-benchmarks of the execution of the tasks.
+
+Run as a script : python benchmarks/bench_tasks.py
+
+"""
+from __future__ import (division, unicode_literals, print_function,
+                        absolute_import)
+
+import os
+import sys
+from multiprocessing import Event
+from time import sleep
+from timeit import default_timer, repeat
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from atom.api import Unicode, Float, set_default  # noqa
+
+from ecpy.tasks.base_tasks import RootTask, SimpleTask, ComplexTask  # noqa
+from ecpy.tasks.tasks.logic.while_task import WhileTask  # noqa
+from ecpy.tasks.tasks.logic.loop_task import LoopTask  # noqa
+from ecpy.tasks.tasks.logic.conditional_task import ConditionalTask  # noqa
+from ecpy.tasks.tasks.logic.loop_linspace_interface import \
+    LinspaceLoopInterface  # noqa
+
+
+class SetpointTask(SimpleTask):
+    """Task evaluating a setpoint from the loop value.
+
+    """
+    task_id = set_default('bench.SetpointTask')
+
+    setpoint = Unicode('2*{l_value} + 1').tag(feval=True)
+
+    def perform(self):
+        self.format_and_eval_string(self.setpoint)
+
+
+class WaitTask(SimpleTask):
+    """Task waiting for a (simulated) instrument.
+
+    """
+    task_id = set_default('bench.WaitTask')
+
+    delay = Float(0.01)
+
+    def perform(self):
+        sleep(self.delay)
+
+    def perform_async(self):
+        yield self.root.event_loop.sleep(self.delay)
+
+
+def bench_while(iterations=100000):
+    """Measure the time per iteration of a WhileTask without children.
+
+    """
+    root = RootTask(should_stop=Event(), should_pause=Event())
+    task = WhileTask(name='w', condition='{w_index} <= %d' % iterations)
+    root.add_child_task(0, task)
+
+    tic = default_timer()
+    root.perform()
+    elapsed = default_timer() - tic
+    print('{:<45} {:8.3f} us'.format('WhileTask iteration (%d)' % iterations,
+                                     elapsed/iterations*1e6))
+
+
+def bench_loop(points=100000):
+    """Measure the time per iteration of a LoopTask evaluating a setpoint.
+
+    """
+    for vectorize in (False, True):
+        root = RootTask(should_stop=Event(), should_pause=Event())
+        task = LoopTask(name='l', vectorize=vectorize)
+        task.interface = LinspaceLoopInterface(start='0', stop='1',
+                                               step='%g' % (1/(points - 1)))
+        root.add_child_task(0, task)
+        task.add_child_task(0, SetpointTask(name='s'))
+
+        tic = default_timer()
+        root.perform()
+        elapsed = default_timer() - tic
+        title = 'LoopTask setpoint (%d%s)' % (points,
+                                              ', vectorized' if vectorize
+                                              else '')
+        print('{:<45} {:8.3f} us'.format(title, elapsed/points*1e6))
+
+
+def bench_parallel(points=10000):
+    """Measure the time per iteration of a LoopTask whose child runs in
+    parallel and is waited on by the next iteration.
+
+    """
+    root = RootTask(should_stop=Event(), should_pause=Event(),
+                    paused=Event(), resumed=Event())
+    task = LoopTask(name='l')
+    task.interface = LinspaceLoopInterface(start='0', stop='1',
+                                           step='%g' % (1/(points - 1)))
+    root.add_child_task(0, task)
+    task.add_child_task(0, SetpointTask(name='s', parallel={'activated': True,
+                                                            'pool': 'p'},
+                                        wait={'activated': True,
+                                              'wait': ['p']}))
+
+    tic = default_timer()
+    root.perform()
+    elapsed = default_timer() - tic
+    print('{:<45} {:8.3f} us'.format('LoopTask parallel child (%d)' % points,
+                                     elapsed/points*1e6))
+
+
+def bench_plan(outer=100, inner=1000):
+    """Measure the time per inner iteration of nested loops whose body is
+    nested in complex and conditional tasks, with and without execution plan.
+
+    """
+    for use_plan in (False, True):
+        root = RootTask(should_stop=Event(), should_pause=Event(),
+                        use_execution_plan=use_plan)
+        task = LoopTask(name='o')
+        task.interface = LinspaceLoopInterface(start='0', stop='1',
+                                               step='%g' % (1/(outer - 1)))
+        root.add_child_task(0, task)
+        sub = LoopTask(name='l')
+        sub.interface = LinspaceLoopInterface(start='0', stop='1',
+                                              step='%g' % (1/(inner - 1)))
+        task.add_child_task(0, sub)
+        parent = sub
+        for i in range(3):
+            complex_ = ComplexTask(name='c%d' % i)
+            parent.add_child_task(0, complex_)
+            parent = complex_
+        conditional = ConditionalTask(name='cond', condition='True')
+        parent.add_child_task(0, conditional)
+        conditional.add_child_task(0, SetpointTask(name='s'))
+
+        tic = default_timer()
+        root.perform()
+        elapsed = default_timer() - tic
+        title = 'Nested loops, depth 6 (%d%s)' % (outer*inner,
+                                                 ', plan' if use_plan else '')
+        print('{:<45} {:8.3f} us'.format(title, elapsed/(outer*inner)*1e6))
+
+
+def bench_strings(number=100000):
+    """Measure evaluation in edition mode and cached formatting and evaluation
+    in running mode.
+
+    """
+    root = RootTask(should_stop=Event(), should_pause=Event())
+    database = root.database
+    database.set_value('root', 'val1', 1.5)
+    database.set_value('root', 'val2', 2)
+
+    def format_():
+        root.format_string('x = {val1}, y = {val2}')
+
+    def evaluate():
+        root.format_and_eval_string('{val1} < {val2}')
+
+    print('{:<45} {:8.3f} us'.format('format_and_eval_string edition mode',
+                                     min(repeat(evaluate, number=number//10)) /
+                                     (number//10)*1e6))
+
+    database.prepare_to_run()
+    for title, func in (('format_string (2 fields)', format_),
+                        ('format_and_eval_string (2 fields)', evaluate)):
+        print('{:<45} {:8.3f} us'.format(title,
+                                         min(repeat(func, number=number)) /
+                                         number*1e6))
+
+
+def bench_coroutines(tasks=200, rounds=5):
+    """Measure the time needed by parallel tasks waiting for instruments when
+    using threads and coroutines.
+
+    """
+    for use_coroutines in (False, True):
+        root = RootTask(should_stop=Event(), should_pause=Event(),
+                        paused=Event(), resumed=Event(),
+                        use_coroutines=use_coroutines)
+        comp = ComplexTask(name='c')
+        root.add_child_task(0, comp)
+        for i in range(tasks):
+            comp.add_child_task(i, WaitTask(name='w%d' % i,
+                                            parallel={'activated': True,
+                                                      'pool': 'p%d' % i}))
+        comp.add_child_task(tasks, WaitTask(name='end', delay=0,
+                                            wait={'activated': True}))
+        root.pools_max_workers = {'p%d' % i: 1 for i in range(tasks)}
+
+        elapsed = min(repeat(root.perform, number=1, repeat=rounds))
+        label = 'coroutines' if use_coroutines else 'threads'
+        print('{:<45} {:8.3f} ms'.format('%d waiting tasks (%s)' %
+                                         (tasks, label), elapsed*1e3))
+
+
+def main():
+    """Run all the benchmarks.
+
+    """
+    bench_strings()
+    bench_while()
+    bench_loop()
+    bench_parallel()
+    bench_plan()
+    bench_coroutines()
+
+
+if __name__ == '__main__':
+    main()
@@ -43,6 +43,12 @@ class ExecutionInfos(Atom):
     #: Boolean indicating whether the engine should run the checks of the task.
     checks = Bool(True)
 
+    #: Fingerprint of the task (see RootTask.get_checks_fingerprint), set
+    #: when its checks already passed on the task as it is. The engine can
+    #: then ignore the failures of the checks, which must still be run as
+    #: they initialise the database. Empty if the checks must pass.
+    checks_fingerprint = Unicode()
+
     #: Boolean set by the engine, indicating whether or not the task was
     #: successfully executed.
     success = Bool()
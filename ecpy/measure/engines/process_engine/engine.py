@@ -33,6 +33,12 @@ class ProcessEngine(BaseEngine):
     """An engine executing the tasks it is sent in a different process.
 
     """
+    #: Whether the numeric values of the observed entries should be read from
+    #: a memory mapped file shared with the subprocess rather than sent one at
+    #: a time through a queue. This is a programmatic opt-in : it is neither
+    #: exposed in the UI nor saved in the preferences, and has to be set on
+    #: the engine instance before performing a measure.
+    shared_database = Bool(False)
 
     def perform(self, exec_infos):
         """Execute a given task.
@@ -79,7 +85,8 @@ class ProcessEngine(BaseEngine):
                                         self._task_paused,
                                         self._task_resumed,
                                         self._task_stop,
-                                        self._process_stop)
+                                        self._process_stop,
+                                        self._task_changed)
             self._process.daemon = True
 
             # Create the logger thread in charge of dispatching log reports.
@@ -162,6 +169,7 @@ class ProcessEngine(BaseEngine):
         self._task_resumed.clear()
         self._task_paused.clear()
         self._task_pause.set()
+        self._task_changed.set()
 
         self._pause_thread = Thread(target=self._wait_for_pause)
         self._pause_thread.start()
@@ -172,6 +180,7 @@ class ProcessEngine(BaseEngine):
         """
         self.status = 'Resuming'
         self._task_pause.clear()
+        self._task_changed.set()
 
     def stop(self, force=False):
         """Ask the engine to stop the current job.
@@ -190,6 +199,7 @@ class ProcessEngine(BaseEngine):
         self.status = 'Stopping'
         self._stop_requested = True
         self._task_stop.set()
+        self._task_changed.set()
 
         if force:
             self._force_stop.set()
@@ -224,6 +234,7 @@ class ProcessEngine(BaseEngine):
         self.status = 'Shutting down'
         self._stop_requested = True
         self._task_stop.set()
+        self._task_changed.set()
 
         if not force:
             t = Thread(target=self._cleanup)
@@ -251,6 +262,10 @@ class ProcessEngine(BaseEngine):
     #: Interprocess event used to stop the subprocess current measure.
     _task_stop = Typed(Event, ())
 
+    #: Interprocess event set each time _task_pause or _task_stop changes,
+    #: allowing the subprocess to wait for these changes without polling.
+    _task_changed = Typed(Event, ())
+
     #: Interprocess event used to stop the subprocess.
     _process_stop = Typed(Event, ())
 
@@ -325,7 +340,9 @@ class ProcessEngine(BaseEngine):
                 exec_infos.runtime_deps,
                 exec_infos.observed_entries,
                 database_root_state,
-                exec_infos.checks
+                exec_infos.checks,
+                self.shared_database,
+                exec_infos.checks_fingerprint
                 )
 
     def _wait_for_pause(self):
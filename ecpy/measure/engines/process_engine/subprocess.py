@@ -16,10 +16,12 @@ import os
 import logging
 import logging.config
 import sys
+from tempfile import mkstemp
 from multiprocessing import Process
 
 from ....app.log.tools import (StreamToLogRedirector, DayRotatingTimeHandler)
 from ....tasks.api import build_task_from_config
+from ....tasks.tools.interruptions import InterruptionEvent
 from ..utils import MeasureSpy
 from ...processor import errors_to_msg
 
@@ -64,6 +66,9 @@ class TaskProcess(Process):
     process_stop :
         Event set when the user asked the process to stop.
 
+    task_changed : optional
+        Event set each time task_pause or task_stop is set or cleared.
+
     Attributes
     ----------
     meas_log_handler : log handler
@@ -79,7 +84,7 @@ class TaskProcess(Process):
     """
 
     def __init__(self, pipe, log_queue, monitor_queue, task_pause, task_paused,
-                 task_resumed, task_stop, process_stop):
+                 task_resumed, task_stop, process_stop, task_changed=None):
         super(TaskProcess, self).__init__(name='ecpy.MeasureProcess')
         self.daemon = True
         self.task_pause = task_pause
@@ -87,6 +92,7 @@ class TaskProcess(Process):
         self.task_resumed = task_resumed
         self.task_stop = task_stop
         self.process_stop = process_stop
+        self.task_changed = task_changed
         self.pipe = pipe
         self.log_queue = log_queue
         self.monitor_queue = monitor_queue
@@ -125,8 +131,8 @@ class TaskProcess(Process):
                     break
 
                 # Get the measure.
-                name, config, build, runtime, entries, database, checks =\
-                    self.pipe.recv()
+                (name, config, build, runtime, entries, database, checks,
+                 shared, fingerprint) = self.pipe.recv()
                 self.pipe.send(True)
 
                 # Build it by using the given build dependencies.
@@ -142,8 +148,13 @@ class TaskProcess(Process):
                 logger.info('Task built')
 
                 # There are entries in the database we are supposed to
-                # monitor start a spy to do it.
+                # monitor start a spy to do it. If requested, share the
+                # numeric values through a memory mapped file.
                 if entries:
+                    if shared:
+                        fd, path = mkstemp(prefix='ecpy_', suffix='.db')
+                        os.close(fd)
+                        root.database.shared_storage_path = path
                     spy = MeasureSpy(self.monitor_queue, entries,
                                      root.database)
 
@@ -163,13 +174,22 @@ class TaskProcess(Process):
 
                 # Pass the events signaling the task it should stop or pause
                 # to the task and make the database ready.
-                root.should_pause = self.task_pause
+                root.should_pause = InterruptionEvent(self.task_pause,
+                                                      self.task_changed)
                 root.paused = self.task_paused
-                root.should_stop = self.task_stop
+                root.should_stop = InterruptionEvent(self.task_stop,
+                                                     self.task_changed)
                 root.resumed = self.task_resumed
 
-                # Perform the checks.
-                if checks:
+                # Perform the checks. If the main process found that they
+                # already passed on the same task, they are only run because
+                # they initialise the database and their result is ignored.
+                if checks and fingerprint:
+                    root.check()
+                    logger.info('Tests results ignored as the task did not '
+                                'change since they passed')
+                    check = True
+                elif checks:
                     check, errors = root.check()
                 else:
                     logger.info('Tests skipped')
@@ -194,6 +214,7 @@ class TaskProcess(Process):
                 if entries:
                     spy.close()
                     del spy
+                    root.database.close_shared_storage()
 
             except Exception:
                 logger.exception('Error occured during processing')
@@ -14,19 +14,34 @@ from __future__ import (division, unicode_literals, print_function,
 
 import logging
 from threading import Thread
+from timeit import default_timer
 from queue import Empty  # This is allowed thanks to the future package
 from multiprocessing.queues import Queue
 
-from atom.api import Atom, Coerced, Typed
+from atom.api import Atom, Coerced, Typed, Dict
 
 from ...tasks.tools.database import TaskDatabase
+from ...tasks.tools.flat_storage import SharedStorageReader
+
+
+#: Key of the news sent by the spy when the database shares its numeric values
+#: through a memory mapped file. The associated value is the informations
+#: needed to build a SharedStorageReader.
+SHARED_STORAGE = '__shared_storage__'
 
 
 class MeasureSpy(Atom):
     """Spy observing a task database and sending values update into a queue.
 
     All updates are sent immediatly as no issues have been detected so far.
-    Using a timer based implementation would complicate things.
+    Using a timer based implementation would complicate things. The spy
+    subscribes to the observed entries only, so that writes to other entries
+    do not involve it. Updates notified together by the database (batched
+    writes) are sent as a single list of (path, value) tuples.
+
+    If the database stores its numeric values in a shared storage, the
+    informations needed to read them are sent once when the database enters
+    the running mode and no update is sent for those entries.
 
     """
     #: Set of entries for which to send notifications.
@@ -38,39 +53,96 @@ class MeasureSpy(Atom):
     #: Queue in which to send the updates.
     queue = Typed(Queue)
 
+    #: Set of observed entries whose values are read through the shared
+    #: storage of the database.
+    shared_entries = Coerced(set)
+
     def __init__(self, queue, observed_entries, observed_database):
         super(MeasureSpy, self).__init__(queue=queue,
                                          observed_database=observed_database,
                                          observed_entries=observed_entries)
-        self.observed_database.observe('notifier', self.enqueue_update)
+        # Use a single bound method so that batched writes are dispatched
+        # once.
+        callback = self.enqueue_update
+        for entry in self.observed_entries:
+            self.observed_database.subscribe(entry, callback)
+        self.observed_database.observe('running', self._share_storage)
 
     def enqueue_update(self, change):
         """Put an update in the queue.
 
         Notes
         -----
-        Change is a tuple as this is connected to a Signal.
+        Change is a tuple ('added', path, value) or a list of such tuples as
+        this is subscribed to the observed entries of the database.
 
         """
-        if change[0] in self.observed_entries:
-            self.queue.put_nowait(change)
+        shared = self.shared_entries
+        if isinstance(change, list):
+            news = [(c[1], c[2]) for c in change if c[1] not in shared]
+            if news:
+                self.queue.put_nowait(news)
+        elif change[1] not in shared:
+            self.queue.put_nowait((change[1], change[2]))
 
     def close(self):
         """Put a dummy object signaling that no more updates will be sent.
 
         """
+        for entry in self.observed_entries:
+            self.observed_database.unsubscribe(entry, self.enqueue_update)
         self.queue.put(('', ''))
 
+    # =========================================================================
+    # --- Private API ---------------------------------------------------------
+    # =========================================================================
+
+    #: Mapping between the flat index of the shared entries and their path.
+    _shared_indexes = Dict()
+
+    def _share_storage(self, change):
+        """Send the informations about the shared storage of the database.
+
+        """
+        database = self.observed_database
+        infos = database.get_shared_storage_infos()
+        if not change['value'] or infos is None:
+            return
+
+        observed = self.observed_entries
+        infos['entries'] = {k: v for k, v in infos['entries'].items()
+                            if k in observed}
+        self._shared_indexes = {v[2]: k for k, v in infos['entries'].items()}
+        self.shared_entries = set(infos['entries'])
+        database.get_shared_storage().observe('demoted', self._stop_sharing)
+        self.queue.put_nowait((SHARED_STORAGE, infos))
+
+    def _stop_sharing(self, index):
+        """Send the updates of an entry no longer stored in the shared arrays.
+
+        """
+        path = self._shared_indexes.get(index)
+        if path is not None:
+            self.shared_entries.discard(path)
+
 
 class ThreadMeasureMonitor(Thread):
     """Thread sending a queue content to the news signal of an engine.
 
+    When the spy signals that the values are shared through a memory mapped
+    file, the thread also reads them every refresh_period seconds and sends
+    the values which changed as a single list of (path, value) tuples.
+
     """
 
-    def __init__(self, engine, queue):
+    def __init__(self, engine, queue, refresh_period=0.1):
         super(ThreadMeasureMonitor, self).__init__()
         self.queue = queue
         self.engine = engine
+        self.refresh_period = refresh_period
+        self.reader = None
+        self._last_values = {}
+        self._last_read = 0
 
     def run(self):
         """Send the news received from the queue to the engine news signal.
@@ -78,15 +150,49 @@ class ThreadMeasureMonitor(Thread):
         """
         while True:
             try:
-                news = self.queue.get()
-                if news not in [(None, None), ('', '')]:
+                timeout = self.refresh_period if self.reader else None
+                news = self.queue.get(timeout=timeout)
+                if self.reader is not None:
+                    if default_timer() - self._last_read > self.refresh_period:
+                        self.read_shared_values()
+
+                if isinstance(news, tuple) and news[0] == SHARED_STORAGE:
+                    self.reader = SharedStorageReader(news[1])
+                    self._last_values = {}
+                    self.read_shared_values()
+                elif news not in [(None, None), ('', '')]:
                     # Here news is a Signal not Event hence the syntax.
                     self.engine.progress(news)
                 elif news == ('', ''):
+                    self.close_reader()
                     logger = logging.getLogger(__name__)
                     logger.debug('Spy closed')
                 else:
+                    self.close_reader()
                     break
 
-            except Empty:  # pragma: no cover
+            except Empty:
+                self.read_shared_values()
                 continue
+
+    def read_shared_values(self):
+        """Read the shared values and send the ones which changed.
+
+        """
+        self._last_read = default_timer()
+        values = self.reader.read()
+        last = self._last_values
+        news = [(k, v) for k, v in values.items()
+                if k not in last or last[k] != v]
+        if news:
+            last.update(news)
+            self.engine.progress(news)
+
+    def close_reader(self):
+        """Send the last shared values and release the shared file.
+
+        """
+        if self.reader is not None:
+            self.read_shared_values()
+            self.reader.close()
+            self.reader = None
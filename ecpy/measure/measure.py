@@ -14,6 +14,7 @@ from __future__ import (division, unicode_literals, print_function,
                         absolute_import)
 
 import logging
+from hashlib import sha1
 from traceback import format_exc
 from collections import OrderedDict, defaultdict
 from itertools import chain
@@ -299,6 +300,10 @@ class Measure(HasPrefAtom):
     #: some tests are failing.
     forced_enqueued = Bool()
 
+    #: Fingerprint of the measure when its checks last passed (see
+    #: compute_checks_fingerprint). Empty if the checks never passed.
+    checks_fingerprint = Unicode()
+
     #: Object handling the collection and access to the measure dependencies.
     dependencies = Typed(MeasureDependencies)
 
@@ -470,6 +475,41 @@ class Measure(HasPrefAtom):
 
         return result, full_report
 
+    def compute_checks_fingerprint(self, with_task=False):
+        """Compute a fingerprint of everything the measure checks depend on.
+
+        This covers the main task (see RootTask.get_checks_fingerprint),
+        the values the measure writes in the task database and the state of
+        the pre and post hooks. The runtime dependencies needs to be
+        collected before calling this method.
+
+        Parameters
+        ----------
+        with_task : bool, optional
+            Whether to also return the fingerprint of the main task.
+
+        Returns
+        -------
+        fingerprint : unicode
+            Hexadecimal digest of the fingerprint.
+
+        task_fingerprint : unicode
+            Fingerprint of the main task, only returned if with_task is True.
+
+        """
+        self._write_infos_in_task()
+        runtime = self.dependencies.get_runtime_dependencies('main')
+        task_fingerprint = self.root_task.get_checks_fingerprint(runtime)
+        fingerprint = sha1(task_fingerprint.encode('utf-8'))
+        for kind in ('pre_hooks', 'post_hooks'):
+            for id, hook in getattr(self, kind).iteritems():
+                state = '%s/%s=%r\n' % (kind, id, hook.get_state())
+                fingerprint.update(state.encode('utf-8'))
+
+        if with_task:
+            return text(fingerprint.hexdigest()), task_fingerprint
+        return text(fingerprint.hexdigest())
+
     def enter_edition_state(self):
         """Make the the measure ready to be edited
 
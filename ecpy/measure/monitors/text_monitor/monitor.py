@@ -67,11 +67,24 @@ class TextMonitor(BaseMonitor):
     def process_news(self, news):
         """Handle a news by calling every related entrt updater.
 
+        News can be a single (path, value) tuple or a list of such tuples in
+        which case each updater is called only once.
+
         """
-        key, value = news
         values = self._database_values
-        values[key] = value
-        for updater in self.updaters[key]:
+        if isinstance(news, list):
+            updaters = []
+            for key, value in news:
+                values[key] = value
+                for updater in self.updaters[key]:
+                    if updater not in updaters:
+                        updaters.append(updater)
+        else:
+            key, value = news
+            values[key] = value
+            updaters = self.updaters[key]
+
+        for updater in updaters:
             updater(values)
 
     def refresh_monitored_entries(self, entries=None):
@@ -101,6 +114,11 @@ class TextMonitor(BaseMonitor):
         """Generate new entries for added values and clean removed values.
 
         """
+        if isinstance(news, list):
+            for n in news:
+                self.handle_database_change(n)
+            return
+
         # Handle the addition of a new entry to the database
         if news[0] == 'added':
 
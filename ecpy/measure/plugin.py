@@ -74,6 +74,10 @@ class MeasurePlugin(HasPrefPlugin):
     #: What to do of the engine when there is no more measure to perform.
     engine_policy = Enum('stop', 'sleep').tag(pref=True)
 
+    #: What to do of the checks of a measure which already passed them and
+    #: did not change since : skip them or run them again anyway.
+    checks_policy = Enum('skip_unchanged', 'always').tag(pref=True)
+
     #: List of currently available pre-execution hooks.
     pre_hooks = List()
 
@@ -273,12 +273,27 @@ class MeasureProcessor(Atom):
                 'measure %s' % meas_id)
         logger.info(mess.replace('\n', ' '))
 
-        # Run checks now that we have all the runtimes.
+        # Compute once the fingerprint of the measure. It does not depend on
+        # the values written by the checks and pre-execution hooks are not
+        # expected to alter the main task.
+        skip_unchanged = self.plugin.checks_policy == 'skip_unchanged'
+        fingerprint = task_fingerprint = ''
+        if skip_unchanged and not measure.forced_enqueued:
+            fingerprint, task_fingerprint = \
+                measure.compute_checks_fingerprint(with_task=True)
+
+        # Run checks now that we have all the runtimes, unless they already
+        # passed and the measure did not change since.
         if not measure.forced_enqueued:
-            res, errors = measure.run_checks()
-            if not res:
-                msg = 'Measure %s failed to pass the checks :\n' % meas_id
-                return 'FAILED', msg + errors_to_msg(errors)
+            if fingerprint and fingerprint == measure.checks_fingerprint:
+                logger.info('Skipping the checks of the measure %s as it did '
+                            'not change since they passed.', meas_id)
+            else:
+                res, errors = measure.run_checks()
+                if not res:
+                    msg = 'Measure %s failed to pass the checks :\n' % meas_id
+                    return 'FAILED', msg + errors_to_msg(errors)
+                measure.checks_fingerprint = fingerprint
 
         # Now that we know the measure is going to run save it.
         default_filename = meas_id + '.meas.ini'
@@ -311,6 +326,7 @@ class MeasureProcessor(Atom):
                 runtime_deps=deps.get_runtime_dependencies('main'),
                 observed_entries=measure.collect_monitored_entries(),
                 checks=not measure.forced_enqueued,
+                checks_fingerprint=task_fingerprint,
                 )
 
             # Ask the engine to perform the main task.
@@ -263,9 +263,15 @@ class MeasureSpace(Workspace):
                 # TODO : log as debug and display in popup
                 logger.info(msg)
 
+        # If no test is skipped, remember what is checked so that the checks
+        # can be skipped later if they pass and nothing changes.
+        fingerprint = measure.compute_checks_fingerprint() if res else ''
+
         # Run the checks specifying what runtimes are missing.
         check, errors = measure.run_checks(missing=errors.get('unavailable',
                                                               {}))
+        if not check:
+            fingerprint = ''
 
         # Release the runtimes.
         measure.dependencies.release_runtimes()
@@ -307,6 +313,8 @@ class MeasureSpace(Workspace):
             return False
 
         meas.forced_enqueued = measure.forced_enqueued
+        if not meas.forced_enqueued:
+            meas.checks_fingerprint = fingerprint
 
         try:
             os.remove(path)
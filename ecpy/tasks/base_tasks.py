@@ -17,28 +17,46 @@ from __future__ import (division, unicode_literals, print_function,
 
 import os
 import logging
+import numbers
 import threading
+from functools import partial
 from multiprocessing.synchronize import Event
-from collections import Iterable
+from collections import Iterable, OrderedDict
 from inspect import cleandoc
 from textwrap import fill
 from copy import deepcopy
+from hashlib import sha1
 from traceback import format_exc
 from types import MethodType
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
 
 from atom.api import (Atom, Int, Bool, Value, Unicode, List,
                       ForwardTyped, Typed, Callable, Dict, Signal,
                       Tuple, Coerced, Constant, set_default)
 from configobj import Section, ConfigObj
-from future.utils import istext
+from future.builtins import str as text
+from future.utils import istext, string_types
 
 
 from ..utils.atom_util import (tagged_members, update_members_from_preferences)
 from ..utils.container_change import ContainerChange
 from .tools.database import TaskDatabase
+from .tools.dependencies import analyse_dependencies
 from .tools.decorators import (make_parallel, make_wait, make_stoppable,
-                               smooth_crash)
-from .tools.string_evaluation import safe_eval
+                               smooth_crash, handle_stop_pause,
+                               make_parallel_async, make_wait_async,
+                               make_stoppable_async)
+from .tools.interruptions import (InterruptionEvent, InterruptionWatcher,
+                                  link_events)
+from .tools.coroutines import EventLoop
+from .tools.execution_plan import (ExecutionPlan, CALL, CHECK, WAIT, JUMP,
+                                   JUMP_IF, JUMP_IF_NOT, LOOP_START,
+                                   LOOP_NEXT, LOOP_BREAK, LOOP_END)
+from .tools.string_evaluation import (safe_eval, safe_compile, split_fields,
+                                      is_pure_expression, COMPILATION_CACHE,
+                                      ForbiddenExpressionError)
 from .tools.shared_resources import (SharedCounter, ThreadPoolResource,
                                      InstrsResource, FilesResource)
 
@@ -46,6 +64,61 @@ from .tools.shared_resources import (SharedCounter, ThreadPoolResource,
 #: Prefix for placeholders in string formatting and evaluation.
 PREFIX = '_a'
 
+#: Kind of a formatted or evaluated string which does not reference the
+#: database.
+CONSTANT = 'constant'
+
+#: Kind of a formatted or evaluated string which only references database
+#: entries no task writes while running.
+RUN_CONSTANT = 'run-constant'
+
+#: Kind of a formatted or evaluated string whose value can change while
+#: running.
+DYNAMIC = 'dynamic'
+
+#: Maximal number of strings whose compiled form is kept by a task. Strings
+#: computed only once are not accounted for.
+TASK_CACHE_SIZE = 128
+
+#: Default number of threads used to check the children of a complex task
+#: in parallel.
+CHECK_THREADS = 8
+
+
+def _constant(value):
+    """Build a function taking no argument and always returning value.
+
+    """
+    return lambda: value
+
+
+def _is_immutable(value):
+    """Whether a value can be shared by several evaluations of a string.
+
+    Only numbers, strings, None and tuples and frozensets of such values are
+    considered immutable.
+
+    """
+    if isinstance(value, (tuple, frozenset)):
+        return all(_is_immutable(v) for v in value)
+    return (value is None or
+            isinstance(value, string_types + (bytes, numbers.Number,
+                                              np.generic)))
+
+
+def _same_value(old, new):
+    """Compare two values read in the database.
+
+    """
+    if old is new:
+        return True
+    try:
+        if isinstance(old, np.ndarray) or isinstance(new, np.ndarray):
+            return bool(np.array_equal(old, new))
+        return bool(old == new)
+    except Exception:
+        return False
+
 
 #: Id used to identify dependencies type.
 DEP_TYPE = 'ecpy.task'
@@ -97,11 +170,17 @@ class BaseTask(Atom):
     #: interruption check or parallel, wait features.
     perform_ = Callable()
 
+    #: Coroutine counterpart of perform_, wrapping perform_async. Only built
+    #: when the root task uses coroutines.
+    perform_async_ = Callable()
+
     #: Flag indicating if this task can be stopped.
     stoppable = Bool(True).tag(pref=True)
 
     #: Dictionary indicating whether the task is executed in parallel
-    #: ('activated' key) and which is pool it belongs to ('pool' key).
+    #: ('activated' key) and which is pool it belongs to ('pool' key). The
+    #: optional 'workers' key specifies the maximal number of threads of the
+    #: pool (see RootTask.pools_max_workers).
     parallel = Dict(Unicode()).tag(pref=True)
 
     #: Dictionary indicating whether the task should wait on any pool before
@@ -115,6 +194,15 @@ class BaseTask(Atom):
     #: by user code.
     access_exs = Dict().tag(pref=True)
 
+    def __init__(self, **kwargs):
+        super(BaseTask, self).__init__(**kwargs)
+        # Any change of the preferences invalidates the result of the last
+        # check.
+        for name in tagged_members(self, 'pref'):
+            self.observe(name, self._mark_dirty)
+        self.observe('path', self._mark_dirty)
+        self.observe('database_entries', self._mark_dirty)
+
     def perform(self):
         """ Main method of the task called when the measurement is performed.
 
@@ -124,6 +212,19 @@ class BaseTask(Atom):
             BaseTask. This method is called when the program requires the task
             to perform its job.''')))
 
+    def perform_async(self, *args, **kwargs):
+        """Coroutine performing the task when the root task uses coroutines.
+
+        By default perform is called in the executor of the event loop of the
+        root (see EventLoop). Tasks spending most of their time waiting (on
+        instruments for example) can override this method with a generator
+        yielding the futures they wait on so that the waits of concurrent
+        tasks overlap without requiring a thread each.
+
+        """
+        yield self.root.event_loop.run_in_executor(self._perform_in_executor,
+                                                   *args, **kwargs)
+
     def check(self, *args, **kwargs):
         """Check that everything is alright before starting a measurement.
 
@@ -132,6 +233,10 @@ class BaseTask(Atom):
         test will considered passed but a traceback entry will be filled.
         The perform_ member is also computed at this time.
 
+        When called with incremental=True, complex tasks re-use the results
+        of the last successful check of their children whose preferences and
+        read database entries did not change since then (see ComplexTask).
+
         """
         res = True
         traceback = {}
@@ -152,6 +257,12 @@ class BaseTask(Atom):
                 val = self.format_and_eval_string(getattr(self, n))
                 if n in self.database_entries:
                     self.write_in_database(n, val)
+            except ForbiddenExpressionError as e:
+                if m.metadata['feval'] != 'Warn':
+                    res = False
+                msg = 'Forbidden constructs in %s : %s' % (
+                    n, ', '.join(e.rejections))
+                traceback[err_path + '-' + n] = msg
             except Exception:
                 if m.metadata['feval'] != 'Warn':
                     res = False
@@ -175,6 +286,9 @@ class BaseTask(Atom):
         parallel = self.parallel
         if parallel.get('activated') and parallel.get('pool'):
             perform_func = make_parallel(perform_func, parallel['pool'])
+            if parallel.get('workers'):
+                self.root.set_pool_max_workers(parallel['pool'],
+                                               parallel['workers'])
 
         wait = self.wait
         if wait.get('activated'):
@@ -186,6 +300,52 @@ class BaseTask(Atom):
             perform_func = make_stoppable(perform_func)
 
         self.perform_ = MethodType(perform_func, self)
+        self._prepared_perform = perform_func
+
+        root = self.root
+        if root is not None and root.use_coroutines:
+            async_func = self.perform_async.__func__
+            if parallel.get('activated') and parallel.get('pool'):
+                async_func = make_parallel_async(async_func, parallel['pool'])
+            if wait.get('activated'):
+                async_func = make_wait_async(async_func,
+                                             wait.get('wait'),
+                                             wait.get('no_wait'))
+            if self.stoppable:
+                async_func = make_stoppable_async(async_func)
+            self.perform_async_ = MethodType(async_func, self)
+
+        # Resolve once and for all the database entries of the task (tasks
+        # not attached to a root have no database).
+        database = self.database
+        if database is not None and database.running:
+            self._entry_handles = {e: database.get_entry_handle(
+                                      self.path, self._task_entry(e))
+                                   for e in self.database_entries}
+            self._read_handles = {}
+            # The indexes stored in the caches may differ from one run to the
+            # next.
+            self._format_cache = {}
+            self._eval_cache = {}
+            self._fold_strings()
+
+    def compile_plan(self, plan):
+        """Emit the instructions performing the task in an execution plan.
+
+        This method is called on the prepared tasks when the root task uses an
+        execution plan (see RootTask.use_execution_plan). By default the task
+        emits its stop-check point, its wait and a call to its perform method,
+        or simply a call to perform_ if it is executed in parallel. Tasks
+        handling their children should override _compile_perform so that the
+        children are compiled in the plan.
+
+        Parameters
+        ----------
+        plan : ExecutionPlan
+            Plan in which to emit the instructions.
+
+        """
+        plan.compile_task(self, partial(self._compile_perform, plan))
 
     def register_preferences(self):
         """Create the task entries in the preferences object.
@@ -199,6 +359,18 @@ class BaseTask(Atom):
         """
         raise NotImplementedError()
 
+    def preferences_from_members(self):
+        """Get the preferences of the task without altering the preference
+        object.
+
+        Returns
+        -------
+        preferences : OrderedDict
+            Preferences as they would be registered by register_preferences.
+
+        """
+        raise NotImplementedError()
+
     @classmethod
     def build_from_config(cls, config, dependencies):
         """Create a new instance using the provided infos for initialisation.
@@ -342,9 +514,39 @@ class BaseTask(Atom):
             Value to give to the entry.
 
         """
+        handle = self._entry_handles.get(name)
+        if handle is not None and self.database.running:
+            handle.set(value)
+            return False
+
         value_name = self._task_entry(name)
         return self.database.set_value(self.path, value_name, value)
 
+    def write_many_in_database(self, values):
+        """Write several values to the task database entries at once.
+
+        All the values are written under a single acquisition of the database
+        lock and a single notification is emitted.
+
+        Parameters
+        ----------
+        values : dict
+            Mapping between simple entry names (ie no task name required) and
+            the values to give to the entries.
+
+        """
+        handles = self._entry_handles
+        if handles and self.database.running:
+            names = list(values)
+            indexes = [handles[name].index for name in names]
+            self.database.set_values_by_index(indexes,
+                                              [values[n] for n in names])
+            return False
+
+        return self.database.set_values(self.path,
+                                        {self._task_entry(k): v
+                                         for k, v in values.items()})
+
     def get_from_database(self, full_name):
         """Access to a database value using full name.
 
@@ -356,7 +558,15 @@ class BaseTask(Atom):
             the database.
 
         """
-        return self.database.get_value(self.path, full_name)
+        database = self.database
+        if database.running:
+            handles = self._read_handles
+            if full_name not in handles:
+                handles[full_name] = database.get_entry_handle(self.path,
+                                                               full_name)
+            return handles[full_name].get()
+
+        return database.get_value(self.path, full_name)
 
     def remove_from_database(self, full_name):
         """Delete a database entry using its full name.
@@ -371,6 +581,36 @@ class BaseTask(Atom):
         """
         return self.database.delete_value(self.path, full_name)
 
+    def gather_formatted_strings(self):
+        """List the strings formatted or evaluated by the task.
+
+        Those are the values of the members tagged with 'fmt' or 'feval' of the
+        task and of its interfaces.
+
+        Returns
+        -------
+        strings : list
+            List of (owner, member name, string, evaluated) tuples, owner being
+            the task or one of its interfaces and evaluated a bool indicating
+            whether the member is tagged with 'feval'.
+
+        """
+        owners = [self]
+        interface = getattr(self, 'interface', None)
+        while interface:
+            owners.append(interface)
+            interface = getattr(interface, 'interface', None)
+
+        strings = []
+        for owner in owners:
+            for evaluated, tag in ((False, 'fmt'), (True, 'feval')):
+                for name in tagged_members(owner, tag):
+                    string = getattr(owner, name)
+                    if isinstance(string, basestring):
+                        strings.append((owner, name, string, evaluated))
+
+        return strings
+
     def list_accessible_database_entries(self):
         """List the database entries accessible from this task.
 
@@ -391,37 +631,33 @@ class BaseTask(Atom):
             Formatted version of the input.
 
         """
-        # If a cache evaluation of the string already exists use it.
-        if string in self._format_cache:
-            preformatted, ids = self._format_cache[string]
-            vals = self.database.get_values_by_index(ids, PREFIX)
-            return preformatted.format(**vals)
+        # If a cache evaluation of the string already exists use it. Caches
+        # are only valid as long as the database stays in running mode.
+        if string in self._format_cache and self.database.running:
+            render, get_values = self._format_cache[string]
+            return render(*get_values())
 
         # Otherwise if we are in running mode build a cache formatting.
         elif self.database.running:
             database = self.database
-            aux_strings = string.split('{')
-            if len(aux_strings) > 1:
-                elements = [el
-                            for aux in aux_strings
-                            for el in aux.split('}')]
+            literals, fields = split_fields(string)
+            if fields:
                 database_indexes = database.get_entries_indexes(self.path,
-                                                                elements[1::2])
-                str_to_format = ''
-                length = len(elements)
-                for i in range(0, length, 2):
-                    if i + 1 < length:
-                        repl = PREFIX + str(database_indexes[elements[i + 1]])
-                        str_to_format += elements[i] + '{' + repl + '}'
-                    else:
-                        str_to_format += elements[i]
-
-                indexes = database_indexes.values()
-                self._format_cache[string] = (str_to_format, indexes)
-                vals = self.database.get_values_by_index(indexes, PREFIX)
-                return str_to_format.format(**vals)
+                                                                fields)
+                # Values are passed positionally in the order of the fields.
+                str_to_format = '{}'.join(literals)
+                indexes = [database_indexes[e] for e in fields]
+                render = str_to_format.format
+                get_values = database.get_values_getter(indexes)
+                result = render(*get_values())
+                if (string, False) in self._folded:
+                    render, get_values = _constant(result), tuple
+                self._cache_string(self._format_cache, string, False,
+                                   (render, get_values))
+                return result
             else:
-                self._format_cache[string] = (string, [])
+                self._cache_string(self._format_cache, string, False,
+                                   (_constant(string), tuple))
                 return string
 
         # In edition mode simply perfom the formatting as execution time is not
@@ -459,38 +695,43 @@ class BaseTask(Atom):
             Formatted version of the input.
 
         """
-        # If a cache evaluation of the string already exists use it.
-        if string in self._eval_cache:
-            preformatted, ids = self._eval_cache[string]
-            vals = self.database.get_values_by_index(ids, PREFIX)
-            return safe_eval(preformatted, vals)
+        # If a cache evaluation of the string already exists use it. Caches
+        # are only valid as long as the database stays in running mode.
+        if string in self._eval_cache and self.database.running:
+            evaluate, get_values = self._eval_cache[string]
+            return evaluate(*get_values())
 
         # Otherwise if we are in running mode build a cache evaluation.
         elif self.database.running:
             database = self.database
-            aux_strings = string.split('{')
-            if len(aux_strings) > 1:
-                elements = [el
-                            for aux in aux_strings
-                            for el in aux.split('}')]
+            literals, fields = split_fields(string)
+            if fields:
                 database_indexes = database.get_entries_indexes(self.path,
-                                                                elements[1::2])
-                str_to_eval = ''
-                length = len(elements)
-                for i in range(0, length, 2):
-                    if i + 1 < length:
-                        repl = PREFIX + str(database_indexes[elements[i + 1]])
-                        str_to_eval += elements[i] + repl
-                    else:
-                        str_to_eval += elements[i]
-
-                indexes = database_indexes.values()
-                self._eval_cache[string] = (str_to_eval, indexes)
-                vals = self.database.get_values_by_index(indexes, PREFIX)
-                return safe_eval(str_to_eval, vals)
+                                                                fields)
+                str_to_eval = literals[0]
+                for field, literal in zip(fields, literals[1:]):
+                    repl = PREFIX + str(database_indexes[field])
+                    str_to_eval += repl + literal
+
+                # The placeholders names encode the slots of the entries so the
+                # compiled function can be shared by all the tasks.
+                indexes = sorted(set(database_indexes.values()))
+                evaluate = COMPILATION_CACHE.get(
+                    safe_compile, str_to_eval,
+                    tuple(PREFIX + str(i) for i in indexes))
+                get_values = database.get_values_getter(indexes)
             else:
-                self._eval_cache[string] = (string, [])
-                return safe_eval(string, {})
+                evaluate = COMPILATION_CACHE.get(safe_compile, string, ())
+                get_values = tuple
+
+            result = evaluate(*get_values())
+            # A mutable result could be altered by the caller and must hence
+            # be computed again each time.
+            if (string, True) in self._folded and _is_immutable(result):
+                evaluate, get_values = _constant(result), tuple
+            self._cache_string(self._eval_cache, string, True,
+                               (evaluate, get_values))
+            return result
 
         # In edition mode simply perfom the evaluation as execution time is not
         # critical and as the database has not been collapsed to an indexed
@@ -522,14 +763,215 @@ class BaseTask(Atom):
     # --- Private API ---------------------------------------------------------
     # =========================================================================
 
-    #: Dictionary storing infos necessary to perform fast formatting.
+    #: Dictionary storing infos necessary to perform fast formatting (format
+    #: method of the template and getter of the values as a tuple).
     #: Only used in running mode.
     _format_cache = Dict()
 
-    #: Dictionary storing infos necessary to perform fast evaluation.
-    #: Only used in running mode.
+    #: Dictionary storing infos necessary to perform fast evaluation (function
+    #: evaluating the expression, shared through COMPILATION_CACHE, and getter
+    #: of its arguments as a tuple). Only used in running mode.
     _eval_cache = Dict()
 
+    #: Kind (CONSTANT, RUN_CONSTANT, DYNAMIC) of the strings of the members
+    #: tagged with 'fmt' or 'feval' of the task and of its interfaces. Keys are
+    #: (string, evaluated) tuples. Only used in running mode.
+    _string_kinds = Dict()
+
+    #: Keys of _string_kinds whose value is computed only once.
+    #: Only used in running mode.
+    _folded = Value(factory=frozenset)
+
+    #: Handles to the task database entries, built when preparing the task.
+    #: Only used in running mode.
+    _entry_handles = Dict()
+
+    #: Handles to the entries read by the task, built lazily.
+    #: Only used in running mode.
+    _read_handles = Dict()
+
+    #: Result of the last successful incremental check of the task and its
+    #: descendants as a (kwargs, inputs, traceback) tuple, inputs being the
+    #: values of the database entries read by the tasks. None when the task
+    #: or one of its descendants changed since then.
+    _check_cache = Value()
+
+    #: Function wrapped in perform_ by prepare, used to determine whether
+    #: perform_ was altered afterwards.
+    _prepared_perform = Value()
+
+    def _compile_perform(self, plan):
+        """Emit the instructions corresponding to the perform method.
+
+        """
+        plan.emit(CALL, self.perform)
+
+    def _perform_in_executor(self, *args, **kwargs):
+        """Call perform, accounting for the thread of the executor in the
+        active threads of the root.
+
+        """
+        counter = self.root.active_threads_counter
+        counter.increment()
+        try:
+            return self.perform(*args, **kwargs)
+        finally:
+            counter.decrement()
+
+    def _entry_setter(self, name):
+        """Get a callable writing a value to a task database entry.
+
+        The resolved handle of the entry is used when it exists, ie when the
+        task was prepared while the database was running, and the database is
+        still running.
+
+        """
+        handle = self._entry_handles.get(name)
+        if handle is not None and self.database.running:
+            return handle.set
+        return partial(self.write_in_database, name)
+
+    def _discard_run_caches(self):
+        """Discard the informations built against the flat database.
+
+        Called when the database goes back to edition mode, as the indexes
+        these informations rely on are then no longer valid.
+
+        """
+        self._entry_handles = {}
+        self._read_handles = {}
+        self._format_cache = {}
+        self._eval_cache = {}
+        self._string_kinds = {}
+        self._folded = frozenset()
+
+    def _mark_dirty(self, change=None):
+        """Discard the cached check result of the task and its ancestors.
+
+        """
+        # The root task is its own parent.
+        task = self
+        while task is not None:
+            task._check_cache = None
+            parent = task.parent
+            task = parent if parent is not task else None
+
+    def _gather_check_inputs(self):
+        """Values of the database entries read by the task and descendants.
+
+        Returns
+        -------
+        inputs : dict
+            Mapping between the full path of the entries and their value.
+
+        """
+        database = self.database
+        inputs = {}
+        for task in self.traverse():
+            if not isinstance(task, BaseTask):
+                continue
+            for _, _, string, _ in task.gather_formatted_strings():
+                for field in split_fields(string)[1]:
+                    try:
+                        path = database.resolve_entry_path(task.path, field)
+                    except KeyError:
+                        continue
+                    node_path, _, name = path.rpartition('/')
+                    inputs[path] = database.get_value(node_path, name)
+
+        return inputs
+
+    def _get_cached_check(self, kwargs):
+        """Get the traceback of the last successful check if still valid.
+
+        Parameters
+        ----------
+        kwargs : dict
+            Keyword arguments passed to check.
+
+        Returns
+        -------
+        traceback : dict or None
+            Traceback of the last check or None if the task should be checked.
+
+        """
+        cache = self._check_cache
+        if cache is None or cache[0] != kwargs:
+            return None
+
+        inputs = self._gather_check_inputs()
+        old = cache[1]
+        if (set(inputs) != set(old) or
+                not all(_same_value(old[k], v) for k, v in inputs.items())):
+            return None
+
+        return cache[2]
+
+    def _cache_check(self, kwargs, result):
+        """Store the result of a check if it succeeded.
+
+        """
+        test, traceback = result
+        self._check_cache = ((kwargs, self._gather_check_inputs(),
+                              dict(traceback)) if test else None)
+
+    def _cache_string(self, cache, string, evaluated, infos):
+        """Store the infos used to format or evaluate a string.
+
+        When the number of cached strings exceeds TASK_CACHE_SIZE, the strings
+        which are not computed only once are discarded. The compiled objects
+        themselves are kept in the process wide COMPILATION_CACHE.
+
+        """
+        if len(cache) >= TASK_CACHE_SIZE:
+            folded = self._folded
+            for key in [k for k in cache if (k, evaluated) not in folded]:
+                del cache[key]
+        cache[string] = infos
+
+    def _fold_strings(self):
+        """Classify the formatted and evaluated strings of the task.
+
+        Constant and run constant strings are evaluated only once, the first
+        time they are used, if their value is immutable. Evaluated strings
+        calling functions which are not known to be pure are always
+        considered dynamic.
+
+        """
+        written = self.root.get_written_indexes()
+        kinds = {}
+        for _, _, string, evaluated in self.gather_formatted_strings():
+            kinds[(string, evaluated)] = \
+                self._classify_string(string, evaluated, written)
+
+        self._string_kinds = kinds
+        self._folded = frozenset(k for k, v in kinds.items() if v != DYNAMIC)
+
+    def _classify_string(self, string, evaluated, written):
+        """Determine whether the value of a string can change while running.
+
+        """
+        literals, fields = split_fields(string)
+        if evaluated:
+            names = [PREFIX + str(i) for i in range(len(fields))]
+            expr = literals[0] + ''.join(n + l for n, l in zip(names,
+                                                               literals[1:]))
+            if not is_pure_expression(expr):
+                return DYNAMIC
+
+        if not fields:
+            return CONSTANT
+
+        try:
+            indexes = self.database.get_entries_indexes(self.path, fields)
+        except KeyError:
+            return DYNAMIC
+
+        if written.isdisjoint(indexes.values()):
+            return RUN_CONSTANT
+
+        return DYNAMIC
+
     def _default_task_id(self):
         """Default value for the task_id member.
 
@@ -621,6 +1063,17 @@ class SimpleTask(BaseTask):
 
     update_preferences_from_members = register_preferences
 
+    def preferences_from_members(self):
+        """Get the preferences of the task without altering the preference
+        object.
+
+        """
+        prefs = OrderedDict()
+        for name in tagged_members(self, 'pref'):
+            val = getattr(self, name)
+            prefs[name] = val if istext(val) else repr(val)
+        return prefs
+
     @classmethod
     def build_from_config(cls, config, dependencies):
         """ Create a new instance using the provided infos for initialisation.
@@ -669,20 +1122,58 @@ class ComplexTask(BaseTask):
         for child in self.children:
             child.perform_()
 
+    def perform_async(self):
+        """Run sequentially all child tasks as coroutines.
+
+        Subclasses overriding perform without overriding this method are
+        performed in the executor.
+
+        """
+        if type(self).perform == ComplexTask.perform:
+            for child in self.children:
+                yield child.perform_async_()
+        else:
+            yield super(ComplexTask, self).perform_async()
+
     def check(self, *args, **kwargs):
         """Run test of all child tasks.
 
+        In incremental mode, a child is not checked again if its last check
+        succeeded and if since then none of the preferences of the tasks of
+        its subtree changed and all the database entries they read still
+        have the same value. Checks depending on external resources (files,
+        instruments) are hence not re-run for such children.
+
+        When called with parallel=True (or the number of threads to use), the
+        children are checked concurrently in a thread pool, a child waiting
+        for the checks of the previous children whose subtrees access the
+        same database entries (see _get_check_dependencies). The children of
+        a child checked in the pool are checked sequentially. The results are
+        merged in the order of the children so that they do not depend on the
+        scheduling. This is only worth it for checks waiting on external
+        resources and requires them to be thread safe.
+
         """
         test, traceback = super(ComplexTask, self).check(*args, **kwargs)
-        for child in self.gather_children():
-            try:
-                check = child.check(*args, **kwargs)
-                test = test and check[0]
-                traceback.update(check[1])
-            except Exception:
-                test = False
-                msg = 'An exception occured while running check :\n%s'
-                traceback[child.path + '/' + child.name] = msg % format_exc()
+        key = None
+        if kwargs.get('incremental', False):
+            key = dict(kwargs, args=args)
+            del key['incremental']
+            key.pop('parallel', None)
+
+        children = self.gather_children()
+        parallel = kwargs.get('parallel', False)
+        if parallel and len(children) > 1:
+            threads = CHECK_THREADS if parallel is True else parallel
+            results = self._check_children_in_pool(children, threads, key,
+                                                   args, kwargs)
+        else:
+            results = (self._check_child(child, key, args, kwargs)
+                       for child in children)
+
+        for child_test, child_traceback in results:
+            test = test and child_test
+            traceback.update(child_traceback)
 
         return test, traceback
 
@@ -707,6 +1198,7 @@ class ComplexTask(BaseTask):
 
         """
         self.children.insert(index, child)
+        self._mark_dirty()
 
         # In the absence of a root task do nothing else than inserting the
         # child.
@@ -745,6 +1237,7 @@ class ComplexTask(BaseTask):
         """
         child = self.children.pop(old)
         self.children.insert(new, child)
+        self._mark_dirty()
 
         # In the absence of a root task do nothing else than moving the
         # child.
@@ -767,6 +1260,7 @@ class ComplexTask(BaseTask):
 
         """
         child = self.children.pop(index)
+        self._mark_dirty()
 
         # Cleanup database, update preferences
         child.unregister_from_database()
@@ -899,6 +1393,34 @@ class ComplexTask(BaseTask):
         for child in self.gather_children():
             child.update_preferences_from_members()
 
+    def preferences_from_members(self):
+        """Get the preferences of the task and of its children without
+        altering the preference objects.
+
+        """
+        prefs = OrderedDict()
+        members = self.members()
+        for name in members:
+            meta = members[name].metadata
+            if meta and 'pref' in meta:
+                val = getattr(self, name)
+                if isinstance(val, basestring):
+                    prefs[name] = val
+                else:
+                    prefs[name] = repr(val)
+
+            elif meta and 'child' in meta:
+                child = getattr(self, name)
+                if child:
+                    if isinstance(child, list):
+                        for i, aux in enumerate(child):
+                            child_id = name + '_{}'.format(i)
+                            prefs[child_id] = aux.preferences_from_members()
+                    else:
+                        prefs[name] = child.preferences_from_members()
+
+        return prefs
+
     @classmethod
     def build_from_config(cls, config, dependencies):
         """Create a new instance using the provided infos for initialisation.
@@ -972,6 +1494,99 @@ class ComplexTask(BaseTask):
     #: child disabled some access_exs.
     _disabled_exs = List()
 
+    def _compile_perform(self, plan):
+        """Compile the children unless perform is overridden.
+
+        """
+        if type(self).perform == ComplexTask.perform:
+            self._compile_children(plan)
+        else:
+            super(ComplexTask, self)._compile_perform(plan)
+
+    def _compile_children(self, plan):
+        """Emit the instructions performing the children sequentially.
+
+        """
+        for child in self.children:
+            child.compile_plan(plan)
+
+    def _check_child(self, child, key, args, kwargs):
+        """Check a child, re-using its last results if key is not None and
+        nothing changed since (see check).
+
+        """
+        if key is not None:
+            cached = child._get_cached_check(key)
+            if cached is not None:
+                return True, cached
+        try:
+            check = child.check(*args, **kwargs)
+            if key is not None:
+                child._cache_check(key, check)
+            return check
+        except Exception:
+            msg = 'An exception occured while running check :\n%s'
+            return False, {child.path + '/' + child.name: msg % format_exc()}
+
+    def _check_children_in_pool(self, children, threads, key, args, kwargs):
+        """Check the children concurrently using a pool of threads.
+
+        Returns
+        -------
+        results : list
+            Results of the checks of the children, in the children order.
+
+        """
+        kwargs = dict(kwargs, parallel=False)
+        dependencies = self._get_check_dependencies(children)
+        checked = [threading.Event() for child in children]
+
+        def run_check(index, child):
+            try:
+                for i in dependencies[index]:
+                    checked[i].wait()
+                return self._check_child(child, key, args, kwargs)
+            finally:
+                checked[index].set()
+
+        # The pool processes the jobs in order so the children a child waits
+        # for are always already being checked.
+        pool = ThreadPool(min(threads, len(children)))
+        try:
+            jobs = [pool.apply_async(run_check, (i, child))
+                    for i, child in enumerate(children)]
+            return [job.get() for job in jobs]
+        finally:
+            pool.close()
+            pool.join()
+
+    @staticmethod
+    def _get_check_dependencies(children):
+        """Determine which children must be checked before each child.
+
+        A child must be checked after the previous children whose subtrees
+        write entries its subtree reads or writes or read entries it writes.
+
+        Returns
+        -------
+        dependencies : list
+            List of the indexes of the previous children each child depends
+            on.
+
+        """
+        accesses = []
+        for child in children:
+            deps = analyse_dependencies(child)
+            accesses.append((deps.get_read_entries(),
+                             deps.get_written_entries()))
+
+        dependencies = []
+        for j, (reads, writes) in enumerate(accesses):
+            dependencies.append([i for i, (r, w) in enumerate(accesses[:j])
+                                 if w & (reads | writes) or r & writes])
+
+        return dependencies
+
     def _child_path(self):
         """Convenience function returning the path to set for child task.
 
@@ -1015,7 +1630,7 @@ class ComplexTask(BaseTask):
         for child in self.gather_children():
             child.depth = self.depth + 1
             child.database = self.database
-            child.path = self.path + '/' + self.name
+            child.path = self._child_path()
 
             # Give him its root so that it can proceed to any child
             # registration it needs to.
@@ -1037,10 +1652,12 @@ class RootTask(ComplexTask):
     run_time = Dict()
 
     #: Inter-process event signaling the task it should stop execution.
-    should_stop = Typed(Event)
+    #: Events assigned to this member are wrapped in an InterruptionEvent.
+    should_stop = Coerced(InterruptionEvent)
 
     #: Inter-process event signaling the task it should pause execution.
-    should_pause = Typed(Event)
+    #: Events assigned to this member are wrapped in an InterruptionEvent.
+    should_pause = Coerced(InterruptionEvent)
 
     #: Inter-process event signaling the task is paused.
     paused = Typed(Event)
@@ -1058,12 +1675,33 @@ class RootTask(ComplexTask):
     #: Each key is associated to a different kind of resource. Resources must
     #: be stored in SharedDict subclass.
     #: By default three kind of resources exists:
-    #: - threads : currently running threads grouped by pool.
-    #:   ({pool: [threads, releaser]})
+    #: - threads : work submitted to the worker pools and not yet waited on,
+    #:   grouped by pool (see ThreadPoolResource).
     #: - instrs : used instruments referenced by profiles.
     #: - files : currently opened files by path.
     resources = Dict()
 
+    #: Maximal number of threads executing the tasks of each pool. Pools not
+    #: listed use DEFAULT_MAX_WORKERS threads. Tasks can also specify the size
+    #: of their pool through their parallel member, the largest size wins.
+    pools_max_workers = Dict().tag(pref=True)
+
+    #: Whether to compile the hierarchy into a flat execution plan when
+    #: preparing it and to run the plan instead of recursing through the
+    #: perform_ methods of the tasks (see ExecutionPlan).
+    use_execution_plan = Bool().tag(pref=True)
+
+    #: Whether to perform the tasks as coroutines run by a single threaded
+    #: event loop rather than in threads (see EventLoop). Tasks executed in
+    #: parallel are then spawned as concurrent coroutines and the tasks not
+    #: providing a coroutine (see BaseTask.perform_async) are performed in
+    #: the executor of the loop. The execution plan is not used in this mode.
+    use_coroutines = Bool().tag(pref=True)
+
+    #: Event loop performing the tasks when use_coroutines is True. Created
+    #: when preparing the task.
+    event_loop = Typed(EventLoop)
+
     #: Counter keeping track of the active threads.
     active_threads_counter = Typed(SharedCounter, kwargs={'count': 1})
 
@@ -1089,8 +1727,10 @@ class RootTask(ComplexTask):
         self.register_in_database()
         self.root = self
         self.parent = self
+        link_events(self.should_stop, self.should_pause)
         self.active_threads_counter.observe('count', self._state)
         self.paused_threads_counter.observe('count', self._state)
+        self.database.observe('running', self._database_running)
 
     def check(self, *args, **kwargs):
         """Check that the default path is a valid directory.
@@ -1118,9 +1758,18 @@ class RootTask(ComplexTask):
 
         self.prepare()
 
+        # Mirror the changes of the stop and pause events made by other
+        # processes.
+        watcher = InterruptionWatcher(self.should_stop, self.should_pause)
+        watcher.start()
         try:
-            for child in self.children:
-                child.perform_()
+            if self.use_coroutines:
+                self.event_loop.run_until_complete(self._perform_async())
+            elif self._plan is not None:
+                self._run_plan(self._plan)
+            else:
+                for child in self.children:
+                    child.perform_()
         except Exception:
             log = logging.getLogger(__name__)
             msg = 'The following unhandled exception occured :\n'
@@ -1129,7 +1778,12 @@ class RootTask(ComplexTask):
             result = False
             self.errors['unhandled'] = msg + format_exc()
         finally:
+            # Parallel tasks may still check the events while the resources
+            # are released.
             self.release_resources()
+            if self.event_loop is not None:
+                self.event_loop.close()
+            watcher.close()
 
         if self.should_stop.is_set():
             result = False
@@ -1141,7 +1795,111 @@ class RootTask(ComplexTask):
 
         """
         self.database.prepare_to_run()
+        self._written_indexes = None
+        self.resources['threads'].max_workers = dict(self.pools_max_workers)
+        self.event_loop = (EventLoop(poll=self._poll_interruptions)
+                           if self.use_coroutines else None)
         super(RootTask, self).prepare()
+        self._plan = (ExecutionPlan.compile(self)
+                      if self.use_execution_plan and not self.use_coroutines
+                      else None)
+
+    def set_pool_max_workers(self, pool, max_workers):
+        """Set the maximal number of threads of a pool for this run.
+
+        If several sizes are requested for the same pool, the largest one is
+        used.
+
+        Parameters
+        ----------
+        pool : unicode
+            Name of the pool.
+
+        max_workers : int
+            Number of threads the pool should be allowed to use.
+
+        """
+        threads = self.resources['threads']
+        sizes = threads.max_workers
+        if max_workers > sizes.get(pool, 0):
+            sizes[pool] = int(max_workers)
+
+    def get_written_indexes(self):
+        """Indexes of the database entries which tasks may write while running.
+
+        Those are the entries declared by all the tasks but the root task. The
+        result is computed once per run. Only available in running mode.
+
+        """
+        if self._written_indexes is None:
+            database = self.database
+            written = set()
+            for task in self.traverse():
+                if task is self or not isinstance(task, BaseTask):
+                    continue
+                entries = [task._task_entry(e) for e in task.database_entries]
+                written.update(database.get_entries_indexes(task.path,
+                                                            entries).values())
+            self._written_indexes = frozenset(written)
+
+        return self._written_indexes
+
+    def get_checks_fingerprint(self, runtime=None):
+        """Compute a fingerprint of everything the checks depend on.
+
+        The fingerprint covers the preferences of the whole hierarchy, the
+        values stored in the root node of the database which are not entries
+        of the tasks and the ids of the runtime dependencies. The values of
+        the task entries are left out as they are either derived from the
+        preferences or written by the checks, so the fingerprint is the same
+        before and after running the checks, and whether or not the entries
+        were registered. Two hierarchies with the same fingerprint hence
+        pass or fail the same checks, as long as the resources the runtime
+        dependencies refer to (instruments, files, ...) do not change.
+
+        Parameters
+        ----------
+        runtime : dict, optional
+            Runtime dependencies to consider. Default to the run_time member.
+
+        Returns
+        -------
+        fingerprint : unicode
+            Hexadecimal digest of the fingerprint.
+
+        """
+        fingerprint = sha1()
+
+        def update(line):
+            fingerprint.update(line.encode('utf-8') + b'\n')
+
+        def feed(prefs, path):
+            for key in sorted(prefs):
+                value = prefs[key]
+                if isinstance(value, dict):
+                    feed(value, path + '/' + key)
+                else:
+                    update('%s/%s=%s' % (path, key, value))
+
+        # Collecting the preferences leaves the preference objects untouched
+        # and also works on hierarchies rebuilt from a config.
+        feed(self.preferences_from_members(), 'prefs')
+
+        entries = set()
+        for task in self.traverse():
+            if isinstance(task, BaseTask):
+                entries.update(task._task_entry(e)
+                               for e in task.database_entries)
+        values = self.database.copy_node_values()
+        for key in sorted(values):
+            if key not in entries:
+                update('database/%s=%r' % (key, values[key]))
+
+        runtime = self.run_time if runtime is None else runtime
+        for kind in sorted(runtime):
+            update('runtime/%s=%s' % (kind, ','.join(sorted(runtime[kind]))))
+
+        return text(fingerprint.hexdigest())
 
     def release_resources(self):
         """Release all the resources used by tasks.
@@ -1149,6 +1907,7 @@ class RootTask(ComplexTask):
         """
         for _, resource in self.resources.items():
             resource.release()
+        self.database.close_journal()
 
     def register_in_database(self):
         """Don't create a node for the root task.
@@ -1187,12 +1946,97 @@ class RootTask(ComplexTask):
         """
         task = super(RootTask, cls).build_from_config(config, dependencies)
         task._post_setattr_root(None, task)
+        # The children were added before having a root and hence did not
+        # register their entries, which prepare expects to exist.
+        task.register_in_database()
         return task
 
     # =========================================================================
     # --- Private API ---------------------------------------------------------
     # =========================================================================
 
+    #: Indexes of the database entries written while running (see
+    #: get_written_indexes).
+    _written_indexes = Value()
+
+    #: Execution plan built by prepare if use_execution_plan is True.
+    _plan = Value()
+
+    def _run_plan(self, plan):
+        """Interpret an execution plan.
+
+        """
+        instructions = plan.instructions
+        count = len(instructions)
+        iterators = [None]*plan.slots
+        stop = self.should_stop
+        pause = self.should_pause
+        threads = self.resources['threads']
+        pc = 0
+        while pc < count:
+            try:
+                while pc < count:
+                    instruction = instructions[pc]
+                    opcode = instruction[0]
+                    pc += 1
+                    if opcode == CALL:
+                        instruction[1]()
+                    elif opcode == CHECK:
+                        if ((stop.flag or pause.flag) and
+                                handle_stop_pause(self)):
+                            pc = instruction[1]
+                    elif opcode == LOOP_NEXT:
+                        try:
+                            value = next(iterators[instruction[1]])
+                        except StopIteration:
+                            pc = instruction[2]
+                            continue
+                        if instruction[3] is not None:
+                            instruction[3](value)
+                    elif opcode == JUMP:
+                        pc = instruction[1]
+                    elif opcode == JUMP_IF:
+                        if instruction[1](instruction[2]):
+                            pc = instruction[3]
+                    elif opcode == JUMP_IF_NOT:
+                        if not instruction[1](instruction[2]):
+                            pc = instruction[3]
+                    elif opcode == LOOP_START:
+                        iterators[instruction[1]] = instruction[2]()
+                    elif opcode == LOOP_BREAK:
+                        try:
+                            iterators[instruction[1]].send(True)
+                        except StopIteration:
+                            pass
+                    elif opcode == LOOP_END:
+                        iterators[instruction[1]] = None
+                    elif opcode == WAIT:
+                        threads.wait(instruction[1], instruction[2])
+            # The exceptions used by loops derive from BaseException.
+            except BaseException as exc:
+                pc = plan.find_handler(pc - 1, exc, iterators)
+                if pc is None:
+                    raise
+
+    def _perform_async(self):
+        """Coroutine performing the children and waiting for all the
+        coroutines they spawned.
+
+        """
+        for child in self.children:
+            yield child.perform_async_()
+        yield self.event_loop.wait_groups()
+
+    def _poll_interruptions(self):
+        """Pause the event loop when the measure is paused.
+
+        This allows the measure to be paused while all the coroutines are
+        waiting, in which case no coroutine reaches a stop-check point.
+
+        """
+        if self.should_pause.flag and not self.should_stop.flag:
+            handle_stop_pause(self)
+
     def _default_task_id(self):
         pack, _ = self.__module__.split('.', 1)
         return pack + '.' + ComplexTask.__name__
@@ -1209,6 +2053,35 @@ class RootTask(ComplexTask):
         """
         return entry
 
+    def _post_setattr_should_stop(self, old, new):
+        """Make the stop and pause events share the same condition.
+
+        """
+        link_events(new, self.should_pause)
+
+    def _post_setattr_should_pause(self, old, new):
+        """Make the stop and pause events share the same condition.
+
+        """
+        link_events(self.should_stop, new)
+
+    def _discard_run_caches(self):
+        """Also discard the indexes of the written entries.
+
+        """
+        super(RootTask, self)._discard_run_caches()
+        self._written_indexes = None
+
+    def _database_running(self, change):
+        """Discard the caches of the tasks when the database leaves the
+        running mode.
+
+        """
+        if change['type'] == 'update' and not change['value']:
+            for task in self.traverse():
+                if isinstance(task, BaseTask):
+                    task._discard_run_caches()
+
     def _state(self, change):
         """Determine whether the task is paused or not.
 
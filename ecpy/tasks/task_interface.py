@@ -18,6 +18,7 @@ from atom.api import Atom, ForwardTyped, Typed, Tuple, Dict, Property, Constant
 
 from ..utils.atom_util import HasPrefAtom, tagged_members
 from .base_tasks import BaseTask
+from .tools.string_evaluation import ForbiddenExpressionError
 
 
 #: Id used to identify dependencies type.
@@ -176,6 +177,17 @@ class InterfaceableTaskMixin(InterfaceableMixin):
                 del self.preferences.sections[ind]
                 self.preferences.sections.insert(0, 'interface')
 
+    def preferences_from_members(self):
+        """Get the preferences of the task and of its interface.
+
+        """
+        prefs = super(InterfaceableTaskMixin, self).preferences_from_members()
+
+        if self.interface:
+            prefs['interface'] = self.interface.preferences_from_members()
+
+        return prefs
+
     def get_error_path(self):
         """Build the path to use when reporting errors during checks.
 
@@ -285,6 +297,13 @@ class BaseInterface(HasPrefAtom):
     #: Dict of database entries added by the interface.
     database_entries = Dict()
 
+    def __init__(self, **kwargs):
+        super(BaseInterface, self).__init__(**kwargs)
+        # Any change of the preferences invalidates the result of the last
+        # check of the task.
+        for name in tagged_members(self, 'pref'):
+            self.observe(name, self._mark_task_dirty)
+
     def check(self, *args, **kwargs):
         """Check that everything is alright before starting a measurement.
 
@@ -313,6 +332,12 @@ class BaseInterface(HasPrefAtom):
                 val = task.format_and_eval_string(getattr(self, n))
                 if n in self.database_entries:
                     task.write_in_database(n, val)
+            except ForbiddenExpressionError as e:
+                if m.metadata['feval'] != 'Warn':
+                    res = False
+                msg = 'Forbidden constructs in %s : %s' % (
+                    n, ', '.join(e.rejections))
+                traceback[err_path + '-' + n] = msg
             except Exception:
                 if m.metadata['feval'] != 'Warn':
                     res = False
@@ -347,6 +372,18 @@ class BaseInterface(HasPrefAtom):
         interface.update_members_from_preferences(config)
         return interface
 
+    # =========================================================================
+    # --- Private API ---------------------------------------------------------
+    # =========================================================================
+
+    def _mark_task_dirty(self, change):
+        """Discard the cached check result of the task using the interface.
+
+        """
+        task = getattr(self, 'task', None)
+        if task is not None:
+            task._mark_dirty()
+
 
 class TaskInterface(BaseInterface):
     """Base class to use when writing a task interface.
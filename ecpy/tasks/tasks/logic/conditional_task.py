@@ -15,6 +15,7 @@ from __future__ import (division, unicode_literals, print_function,
 from atom.api import (Unicode)
 
 from ...base_tasks import ComplexTask
+from ...tools.execution_plan import JUMP_IF_NOT
 
 
 class ConditionalTask(ComplexTask):
@@ -34,3 +35,19 @@ class ConditionalTask(ComplexTask):
         if self.format_and_eval_string(self.condition):
             for child in self.children:
                 child.perform_()
+
+    # =========================================================================
+    # --- Private API ---------------------------------------------------------
+    # =========================================================================
+
+    def _compile_perform(self, plan):
+        """Compile the children behind a jump on the condition.
+
+        """
+        if type(self).perform != ConditionalTask.perform:
+            return super(ConditionalTask, self)._compile_perform(plan)
+
+        jump = plan.emit(JUMP_IF_NOT, self.format_and_eval_string,
+                         self.condition, None)
+        self._compile_children(plan)
+        plan.set_target(jump)
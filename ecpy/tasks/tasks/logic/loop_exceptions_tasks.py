@@ -56,6 +56,19 @@ class BreakTask(SimpleTask):
         if self.format_and_eval_string(self.condition):
             raise BreakException()
 
+    # =========================================================================
+    # --- Private API ---------------------------------------------------------
+    # =========================================================================
+
+    def _compile_perform(self, plan):
+        """Compile the task as a jump out of the enclosing loop.
+
+        """
+        if (type(self).perform != BreakTask.perform or
+                not plan.compile_jump_out('break', self.format_and_eval_string,
+                                          self.condition)):
+            super(BreakTask, self)._compile_perform(plan)
+
 
 class ContinueTask(SimpleTask):
     """Task jumping to next loop iteration when a condition is met.
@@ -92,3 +105,18 @@ class ContinueTask(SimpleTask):
         """
         if self.format_and_eval_string(self.condition):
             raise ContinueException()
+
+    # =========================================================================
+    # --- Private API ---------------------------------------------------------
+    # =========================================================================
+
+    def _compile_perform(self, plan):
+        """Compile the task as a jump to the next iteration of the enclosing
+        loop.
+
+        """
+        if (type(self).perform != ContinueTask.perform or
+                not plan.compile_jump_out('continue',
+                                          self.format_and_eval_string,
+                                          self.condition)):
+            super(ContinueTask, self)._compile_perform(plan)
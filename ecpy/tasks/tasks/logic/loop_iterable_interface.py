@@ -51,7 +51,10 @@ class IterableLoopInterface(TaskInterface):
         """Compute the iterable and pass it to the LoopTask.
 
         """
-        task = self.task
-        iterable = task.format_and_eval_string(self.iterable)
+        self.task.perform_loop(self.build_iterable())
 
-        task.perform_loop(iterable)
+    def build_iterable(self):
+        """Compute the iterable on which to loop.
+
+        """
+        return self.task.format_and_eval_string(self.iterable)
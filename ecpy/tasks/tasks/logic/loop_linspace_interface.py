@@ -68,6 +68,12 @@ class LinspaceLoopInterface(TaskInterface):
     def perform(self):
         """Build the linspace and pass it to the LoopTask.
 
+        """
+        self.task.perform_loop(self.build_iterable())
+
+    def build_iterable(self):
+        """Build the linspace on which to loop.
+
         """
         task = self.task
         start = task.format_and_eval_string(self.start)
@@ -75,5 +81,4 @@ class LinspaceLoopInterface(TaskInterface):
         step = task.format_and_eval_string(self.step)
         num = int(round(abs(((stop - start)/step)))) + 1
 
-        iterable = linspace(start, stop, num)
-        task.perform_loop(iterable)
+        return linspace(start, stop, num)
@@ -12,16 +12,28 @@
 from __future__ import (division, unicode_literals, print_function,
                         absolute_import)
 
-from atom.api import (Typed, Bool, set_default)
+from functools import partial
+
+from atom.api import (Typed, Bool, List, set_default)
 
 from timeit import default_timer
 
-from ...base_tasks import (SimpleTask, ComplexTask)
+import numpy as np
+
+from ...base_tasks import (SimpleTask, ComplexTask, PREFIX)
 from ...task_interface import InterfaceableTaskMixin
 from ...tools.decorators import handle_stop_pause
+from ...tools.string_evaluation import (split_fields, safe_compile,
+                                        is_pure_expression, COMPILATION_CACHE)
 from .loop_exceptions import BreakException, ContinueException
 
 
+#: Maximal number of points on which a vectorized evaluation is compared to
+#: the point by point one. Shorter iterables are validated on every point,
+#: longer ones on evenly spaced points including the first and last ones.
+VALIDATION_POINTS = 32
+
+
 class LoopTask(InterfaceableTaskMixin, ComplexTask):
     """Complex task which, at each iteration, call all its child tasks.
 
@@ -32,6 +44,11 @@ class LoopTask(InterfaceableTaskMixin, ComplexTask):
     #: Flag indicating whether or not to time the loop.
     timing = Bool().tag(pref=True)
 
+    #: Flag indicating whether the evaluated strings of the descendant tasks
+    #: which depend only on the loop index and value should be evaluated once
+    #: on the whole iterable using numpy.
+    vectorize = Bool().tag(pref=True)
+
     #: Task to call before other child tasks with current loop value. This task
     #: is simply a convenience and can be set to None.
     task = Typed(SimpleTask).tag(child=50)
@@ -58,6 +75,15 @@ class LoopTask(InterfaceableTaskMixin, ComplexTask):
 
         return test, traceback
 
+    def prepare(self):
+        """Overridden to collect the expressions which can be vectorized.
+
+        """
+        super(LoopTask, self).prepare()
+        self._vectorized = []
+        if self.vectorize and self.database.running:
+            self._vectorized = self._find_vectorizable()
+
     def perform_loop(self, iterable):
         """Perform the loop on the iterable calling all child tasks at each
         iteration.
@@ -70,21 +96,184 @@ class LoopTask(InterfaceableTaskMixin, ComplexTask):
             Iterable on which the loop should be performed.
 
         """
-        if self.timing:
-            if self.task:
-                self._perform_loop_timing_task(iterable)
-            else:
-                self._perform_loop_timing(iterable)
-        else:
-            if self.task:
-                self._perform_loop_task(iterable)
+        installed = self._vectorize(iterable) if self._vectorized else ()
+        try:
+            if self.timing:
+                if self.task:
+                    self._perform_loop_timing_task(iterable)
+                else:
+                    self._perform_loop_timing(iterable)
             else:
-                self._perform_loop(iterable)
+                if self.task:
+                    self._perform_loop_task(iterable)
+                else:
+                    self._perform_loop(iterable)
+        finally:
+            # The precomputed values are only valid for this iterable.
+            for task, string in installed:
+                task._eval_cache.pop(string, None)
 
     # =========================================================================
     # --- Private API ---------------------------------------------------------
     # =========================================================================
 
+    #: Expressions which may be vectorized as (task, string, function,
+    #: entries) tuples, entries being the loop entries ('index' or 'value')
+    #: to pass to the function. Only used in running mode.
+    _vectorized = List()
+
+    def _discard_run_caches(self):
+        """Also discard the vectorizable expressions.
+
+        """
+        super(LoopTask, self)._discard_run_caches()
+        self._vectorized = []
+
+    def _point_writer(self):
+        """Get the function writing the index and value of a point.
+
+        Returns
+        -------
+        set_values : callable
+            Function to call with keys and an (index, value) tuple.
+
+        keys : tuple
+            Keys identifying the index and value entries.
+
+        """
+        handles = self._entry_handles
+        if 'index' in handles and 'value' in handles:
+            return (self.database.set_values_by_index,
+                    (handles['index'].index, handles['value'].index))
+        return self._write_point, ('index', 'value')
+
+    def _write_point(self, names, values):
+        """Write the index and value of a point when the handles are missing.
+
+        """
+        self.write_many_in_database(dict(zip(names, values)))
+
+    def _find_vectorizable(self):
+        """Find the evaluated strings depending only on the loop entries.
+
+        """
+        database = self.database
+        handles = self._entry_handles
+        loop_entries = {handles[e].path: e for e in ('index', 'value')
+                        if e in handles}
+
+        vectorizable = []
+        for task in self.traverse():
+            if task is self or not hasattr(task, 'gather_formatted_strings'):
+                continue
+            for _, _, string, evaluated in task.gather_formatted_strings():
+                literals, fields = split_fields(string)
+                if not evaluated or not fields:
+                    continue
+                try:
+                    entries = [loop_entries.get(database.resolve_entry_path(
+                                   task.path, f)) for f in fields]
+                except KeyError:
+                    continue
+                if None in entries:
+                    continue
+
+                expr = literals[0]
+                for entry, literal in zip(entries, literals[1:]):
+                    expr += PREFIX + entry + literal
+                if not is_pure_expression(expr):
+                    continue
+                names = tuple(sorted(set(entries)))
+                function = COMPILATION_CACHE.get(
+                    safe_compile, expr, tuple(PREFIX + n for n in names))
+                vectorizable.append((task, string, function, names))
+
+        return vectorizable
+
+    def _vectorize(self, iterable):
+        """Evaluate the vectorizable expressions on the whole iterable.
+
+        The results are stored in the evaluation cache of the tasks so that
+        each iteration simply picks the value matching the current index.
+        An expression is evaluated point by point if its vectorized
+        evaluation fails, does not give one value per point or gives a
+        different result from the point by point evaluation on the points
+        used for validation (see VALIDATION_POINTS).
+
+        Returns
+        -------
+        installed : list
+            List of (task, string) tuples whose cached evaluation was replaced.
+
+        """
+        num = len(iterable)
+        if not num:
+            return []
+
+        try:
+            arrays = {'index': np.arange(1, num + 1),
+                      'value': np.asarray(iterable)}
+            # Values written in the database for the validation points.
+            samples = np.unique(np.linspace(0, num - 1,
+                                            min(num, VALIDATION_POINTS)
+                                            ).round().astype(int)).tolist()
+            points = {'index': [i + 1 for i in samples],
+                      'value': [iterable[i] for i in samples]}
+        except Exception:
+            return []
+
+        get_index = self.database.get_values_getter(
+            [self._entry_handles['index'].index])
+        installed = []
+        for task, string, function, names in self._vectorized:
+            try:
+                results = function(*[arrays[n] for n in names])
+            except Exception:
+                continue
+            if (not isinstance(results, np.ndarray) or
+                    results.shape != (num,)):
+                continue
+
+            values = self._validate_vectorized(function, names, samples,
+                                               points, results)
+            if values is not None:
+                # The index entry goes from 1 to num.
+                task._eval_cache[string] = ([None] + values).__getitem__, \
+                    get_index
+                installed.append((task, string))
+
+        return installed
+
+    @staticmethod
+    def _validate_vectorized(function, names, samples, points, results):
+        """Compare the vectorized results to the point by point evaluation.
+
+        samples lists the positions in the iterable of the points to compare
+        and points maps the names of the loop entries to their values on
+        those points.
+
+        Returns
+        -------
+        values : list or None
+            Results as a list whose elements have the same type as the point
+            by point results or None if the results do not match.
+
+        """
+        candidates = (list(results), results.tolist())
+        for i, point in enumerate(samples):
+            try:
+                expected = function(*[points[n][i] for n in names])
+            except Exception:
+                return None
+            candidates = [c for c in candidates
+                          if type(c[point]) is type(expected) and
+                          (c[point] == expected or
+                           (c[point] != c[point] and expected != expected))]
+            if not candidates:
+                return None
+
+        return candidates[0]
+
     def _perform_loop(self, iterable):
         """Perform the loop when there is no child and timing is not required.
 
@@ -92,13 +281,13 @@ class LoopTask(InterfaceableTaskMixin, ComplexTask):
         self.write_in_database('point_number', len(iterable))
 
         root = self.root
+        set_values, indexes = self._point_writer()
         for i, value in enumerate(iterable):
 
             if handle_stop_pause(root):
                 return
 
-            self.write_in_database('index', i+1)
-            self.write_in_database('value', value)
+            set_values(indexes, (i+1, value))
             try:
                 for child in self.children:
                     child.perform_()
@@ -114,12 +303,13 @@ class LoopTask(InterfaceableTaskMixin, ComplexTask):
         self.write_in_database('point_number', len(iterable))
 
         root = self.root
+        set_index = self._entry_setter('index')
         for i, value in enumerate(iterable):
 
             if handle_stop_pause(root):
                 return
 
-            self.write_in_database('index', i+1)
+            set_index(i+1)
             self.task.perform_(value)
             try:
                 for child in self.children:
@@ -136,24 +326,25 @@ class LoopTask(InterfaceableTaskMixin, ComplexTask):
         self.write_in_database('point_number', len(iterable))
 
         root = self.root
+        set_values, indexes = self._point_writer()
+        set_time = self._entry_setter('elapsed_time')
         for i, value in enumerate(iterable):
 
             if handle_stop_pause(root):
                 return
 
-            self.write_in_database('index', i+1)
-            self.write_in_database('value', value)
+            set_values(indexes, (i+1, value))
             tic = default_timer()
             try:
                 for child in self.children:
                     child.perform_()
             except BreakException:
-                self.write_in_database('elapsed_time', default_timer()-tic)
+                set_time(default_timer()-tic)
                 break
             except ContinueException:
-                self.write_in_database('elapsed_time', default_timer()-tic)
+                set_time(default_timer()-tic)
                 continue
-            self.write_in_database('elapsed_time', default_timer()-tic)
+            set_time(default_timer()-tic)
 
     def _perform_loop_timing_task(self, iterable):
         """Perform the loop when there is a child and timing is required.
@@ -162,24 +353,86 @@ class LoopTask(InterfaceableTaskMixin, ComplexTask):
         self.write_in_database('point_number', len(iterable))
 
         root = self.root
+        set_index = self._entry_setter('index')
+        set_time = self._entry_setter('elapsed_time')
         for i, value in enumerate(iterable):
 
             if handle_stop_pause(root):
                 return
 
-            self.write_in_database('index', i+1)
+            set_index(i+1)
             tic = default_timer()
             self.task.perform_(value)
             try:
                 for child in self.children:
                     child.perform_()
             except BreakException:
-                self.write_in_database('elapsed_time', default_timer()-tic)
+                set_time(default_timer()-tic)
                 break
             except ContinueException:
-                self.write_in_database('elapsed_time', default_timer()-tic)
+                set_time(default_timer()-tic)
                 continue
-            self.write_in_database('elapsed_time', default_timer()-tic)
+            set_time(default_timer()-tic)
+
+    def _compile_perform(self, plan):
+        """Compile the loop, the iterations being driven by _iterate.
+
+        The loop is compiled only if its interface can build the iterable
+        (build_iterable method).
+
+        """
+        if (type(self).perform != LoopTask.perform or
+                type(self).perform_loop != LoopTask.perform_loop or
+                not hasattr(self.interface, 'build_iterable')):
+            return super(LoopTask, self)._compile_perform(plan)
+
+        plan.compile_loop(self._iterate, partial(self._compile_children, plan),
+                          {BreakException: 'break',
+                           ContinueException: 'continue'},
+                          self.task.perform_ if self.task else None)
+
+    def _iterate(self):
+        """Generator driving the loop when executed through an execution plan.
+
+        Each value is yielded after the same operations as in perform_loop,
+        the execution of the task member being left to the plan. If the
+        generator is sent True, the loop is broken.
+
+        """
+        iterable = self.interface.build_iterable()
+        installed = self._vectorize(iterable) if self._vectorized else ()
+        try:
+            self.write_in_database('point_number', len(iterable))
+
+            root = self.root
+            timing = self.timing
+            if timing:
+                set_time = self._entry_setter('elapsed_time')
+            has_task = bool(self.task)
+            if has_task:
+                set_index = self._entry_setter('index')
+            else:
+                set_values, indexes = self._point_writer()
+
+            for i, value in enumerate(iterable):
+
+                if handle_stop_pause(root):
+                    return
+
+                if has_task:
+                    set_index(i+1)
+                else:
+                    set_values(indexes, (i+1, value))
+                if timing:
+                    tic = default_timer()
+                broken = yield value
+                if timing:
+                    set_time(default_timer()-tic)
+                if broken:
+                    return
+        finally:
+            for task, string in installed:
+                task._eval_cache.pop(string, None)
 
     def _post_setattr_task(self, old, new):
         """Keep the database entries in sync with the task member.
@@ -12,6 +12,8 @@
 from __future__ import (division, unicode_literals, print_function,
                         absolute_import)
 
+from functools import partial
+
 from atom.api import (Unicode, set_default)
 
 
@@ -40,8 +42,9 @@ class WhileTask(ComplexTask):
         """
         i = 1
         root = self.root
+        set_index = self._entry_setter('index')
         while True:
-            self.write_in_database('index', i)
+            set_index(i)
             i += 1
             if not self.format_and_eval_string(self.condition):
                 break
@@ -57,4 +60,40 @@ class WhileTask(ComplexTask):
             except ContinueException:
                 continue
 
+    # =========================================================================
+    # --- Private API ---------------------------------------------------------
+    # =========================================================================
+
+    def _compile_perform(self, plan):
+        """Compile the loop, the iterations being driven by _iterate.
+
+        """
+        if type(self).perform != WhileTask.perform:
+            return super(WhileTask, self)._compile_perform(plan)
+
+        plan.compile_loop(self._iterate, partial(self._compile_children, plan),
+                          {BreakException: 'break',
+                           ContinueException: 'continue'})
+
+    def _iterate(self):
+        """Generator driving the loop when executed through an execution plan.
+
+        Each iteration is yielded after the same operations as in perform.
+
+        """
+        i = 1
+        root = self.root
+        set_index = self._entry_setter('index')
+        while True:
+            set_index(i)
+            i += 1
+            if not self.format_and_eval_string(self.condition):
+                return
+
+            if handle_stop_pause(root):
+                return
+
+            if (yield):
+                return
+
 KNOWN_PY_TASKS = [WhileTask]
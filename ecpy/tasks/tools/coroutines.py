@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015 by Ecpy Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Single threaded execution of tasks as coroutines.
+
+When a root task uses coroutines (see RootTask.use_coroutines), its tasks are
+performed by an EventLoop instead of being executed in threads, which allows
+to overlap the waits on instruments without paying for a thread per parallel
+task.
+
+Coroutines are generators. Each time a coroutine yields, the loop resumes it
+according to the yielded value :
+
+- None : the coroutine is resumed after the other ready coroutines.
+- Future : the coroutine is resumed once the future is done. The result of
+  the future is sent to the coroutine or its exception raised in it.
+- generator : the generator is run as a coroutine and the coroutine resumed
+  once it is done, its exceptions being raised in the coroutine.
+
+Functions which block (such as the perform method of the tasks which do not
+provide a coroutine) are executed in the threads of the executor of the loop
+(see EventLoop.run_in_executor).
+
+"""
+from __future__ import (division, unicode_literals, print_function,
+                        absolute_import)
+
+import sys
+from collections import deque
+from functools import partial
+from heapq import heappush, heappop
+from itertools import count
+from multiprocessing import Event
+from threading import Lock
+from timeit import default_timer
+from types import GeneratorType
+
+from future.utils import raise_
+
+from .shared_resources import WorkerPool, DEFAULT_MAX_WORKERS
+
+
+#: Maximal time (in s) during which the loop waits without calling its poll
+#: function.
+POLL_PERIOD = 0.01
+
+
+class Future(object):
+    """Result of an operation executed by an EventLoop.
+
+    Futures are not thread safe and should only be manipulated from the
+    thread running the loop.
+
+    """
+    __slots__ = ('_done', '_result', '_exc_info', '_callbacks')
+
+    def __init__(self):
+        self._done = False
+        self._result = None
+        self._exc_info = None
+        self._callbacks = []
+
+    def done(self):
+        """Whether the operation is done.
+
+        """
+        return self._done
+
+    def result(self):
+        """Get the result of the operation or raise its exception.
+
+        """
+        if not self._done:
+            raise RuntimeError('The operation is not done.')
+        if self._exc_info is not None:
+            raise_(*self._exc_info)
+        return self._result
+
+    def add_done_callback(self, callback):
+        """Call a function with the future once it is done.
+
+        """
+        if self._done:
+            callback(self)
+        else:
+            self._callbacks.append(callback)
+
+    def set_result(self, result):
+        """Mark the operation as done and set its result.
+
+        """
+        self._result = result
+        self._finish()
+
+    def set_exception(self, exc_info):
+        """Mark the operation as failed.
+
+        Parameters
+        ----------
+        exc_info : tuple
+            Exception information as returned by sys.exc_info.
+
+        """
+        self._exc_info = exc_info
+        self._finish()
+
+    # =========================================================================
+    # --- Private API ---------------------------------------------------------
+    # =========================================================================
+
+    def _finish(self):
+        """Mark the future as done and call the callbacks.
+
+        """
+        self._done = True
+        callbacks = self._callbacks
+        self._callbacks = []
+        for callback in callbacks:
+            callback(self)
+
+
+class EventLoop(object):
+    """Loop running coroutines in the thread from which it is run.
+
+    Coroutines can be spawned in named groups, the counterpart of the pools
+    in which the tasks are executed in parallel when using threads, and a
+    coroutine can wait for groups to complete (see wait_groups).
+
+    Parameters
+    ----------
+    max_workers : int, optional
+        Maximal number of threads of the executor.
+
+    poll : callable, optional
+        Function called with no arguments at each iteration of the loop and
+        at least every POLL_PERIOD while the loop waits.
+
+    """
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, poll=None):
+        self.max_workers = max_workers
+        self.poll = poll
+        self._ready = deque()
+        self._timers = []
+        self._sequence = count()
+        self._threadsafe = deque()
+        self._lock = Lock()
+        # On Python 2, waiting with a timeout on a threading event polls
+        # while a multiprocessing event truly blocks.
+        self._wakeup = Event()
+        self._executor = None
+        self._pending = {}
+        self._waiters = []
+
+    def spawn(self, coroutine, group=None):
+        """Schedule the execution of a coroutine.
+
+        Parameters
+        ----------
+        coroutine : generator
+            Coroutine to execute.
+
+        group : unicode, optional
+            Name of the group to which the coroutine belongs.
+
+        Returns
+        -------
+        future : Future
+            Future done once the coroutine returned.
+
+        """
+        future = Future()
+        self._ready.append((self._step, (coroutine, future)))
+        if group is not None:
+            self._pending[group] = self._pending.get(group, 0) + 1
+            future.add_done_callback(partial(self._group_done, group))
+        return future
+
+    def wait_groups(self, groups=None, excluded=None):
+        """Get a future done once some groups have no coroutine running.
+
+        Coroutines spawned while waiting are waited for too.
+
+        Parameters
+        ----------
+        groups : iterable, optional
+            Names of the groups to wait for. If None, all the groups are
+            waited for except the excluded ones.
+
+        excluded : iterable, optional
+            Names of the groups not to wait for when groups is None.
+
+        """
+        if groups is not None:
+            groups = tuple(groups)
+        excluded = tuple(excluded or ())
+
+        future = Future()
+        if self._count_pending(groups, excluded):
+            self._waiters.append((groups, excluded, future))
+        else:
+            future.set_result(None)
+        return future
+
+    def run_in_executor(self, function, *args, **kwargs):
+        """Call a function in a thread of the executor.
+
+        Returns
+        -------
+        future : Future
+            Future whose result is the value returned by the function.
+
+        """
+        if self._executor is None:
+            self._executor = WorkerPool('EventLoopExecutor', self.max_workers)
+        future = Future()
+        self._executor.submit(self._execute, future, function, args, kwargs)
+        return future
+
+    def sleep(self, delay):
+        """Get a future done after some time.
+
+        """
+        future = Future()
+        self.call_later(delay, future.set_result, None)
+        return future
+
+    def call_soon(self, callback, *args):
+        """Call a function at the next iteration of the loop.
+
+        """
+        self._ready.append((callback, args))
+
+    def call_later(self, delay, callback, *args):
+        """Call a function after some time (in s).
+
+        """
+        heappush(self._timers, (default_timer() + delay, next(self._sequence),
+                                callback, args))
+
+    def call_soon_threadsafe(self, callback, *args):
+        """Call a function at the next iteration of the loop.
+
+        This is the only method which can be called from another thread than
+        the one running the loop.
+
+        """
+        with self._lock:
+            self._threadsafe.append((callback, args))
+        self._wakeup.set()
+
+    def run_until_complete(self, coroutine):
+        """Run the loop till a coroutine returns.
+
+        Returns
+        -------
+        result :
+            Result of the coroutine.
+
+        """
+        future = self.spawn(coroutine)
+        while not future.done():
+            self._run_once()
+        return future.result()
+
+    def close(self):
+        """Stop the executor once the functions it executes have returned.
+
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    # =========================================================================
+    # --- Private API ---------------------------------------------------------
+    # =========================================================================
+
+    def _run_once(self):
+        """Wait for something to do and do it.
+
+        """
+        if self.poll is not None:
+            self.poll()
+
+        ready = self._ready
+        timers = self._timers
+        if not ready:
+            timeout = None
+            if timers:
+                timeout = max(0, timers[0][0] - default_timer())
+            if self.poll is not None:
+                timeout = (POLL_PERIOD if timeout is None else
+                           min(timeout, POLL_PERIOD))
+            if not self._threadsafe:
+                self._wakeup.wait(timeout)
+            # Callbacks scheduled after the event is cleared are collected
+            # below or at the next iteration.
+            self._wakeup.clear()
+
+        if self._threadsafe:
+            with self._lock:
+                callbacks = self._threadsafe
+                self._threadsafe = deque()
+            ready.extend(callbacks)
+
+        if timers:
+            now = default_timer()
+            while timers and timers[0][0] <= now:
+                _, _, callback, args = heappop(timers)
+                ready.append((callback, args))
+
+        # Only run the callbacks scheduled till now so that waiting
+        # coroutines are not starved.
+        for _ in range(len(ready)):
+            callback, args = ready.popleft()
+            callback(*args)
+
+    def _step(self, coroutine, future, value=None, exc_info=None):
+        """Resume a coroutine till it yields.
+
+        """
+        try:
+            if exc_info is None:
+                awaited = coroutine.send(value)
+            else:
+                awaited = coroutine.throw(*exc_info)
+        except StopIteration:
+            future.set_result(None)
+            return
+        # The exceptions used by loops derive from BaseException.
+        except BaseException:
+            future.set_exception(sys.exc_info())
+            return
+
+        if awaited is None:
+            self._ready.append((self._step, (coroutine, future)))
+            return
+
+        if isinstance(awaited, GeneratorType):
+            awaited = self.spawn(awaited)
+        elif not isinstance(awaited, Future):
+            exc = TypeError('Coroutines can only yield None, futures or '
+                            'generators, not %r' % (awaited,))
+            self._ready.append((self._step, (coroutine, future, None,
+                                             (TypeError, exc, None))))
+            return
+
+        awaited.add_done_callback(partial(self._resume, coroutine, future))
+
+    def _resume(self, coroutine, future, awaited):
+        """Schedule the resumption of a coroutine once a future is done.
+
+        """
+        self._ready.append((self._step, (coroutine, future, awaited._result,
+                                         awaited._exc_info)))
+
+    def _execute(self, future, function, args, kwargs):
+        """Call a function in the executor and transfer its result.
+
+        """
+        try:
+            result = function(*args, **kwargs)
+        except BaseException:
+            self.call_soon_threadsafe(future.set_exception, sys.exc_info())
+        else:
+            self.call_soon_threadsafe(future.set_result, result)
+
+    def _group_done(self, group, future):
+        """Account for the completion of a coroutine belonging to a group.
+
+        """
+        remaining = self._pending[group] - 1
+        self._pending[group] = remaining
+        if remaining or not self._waiters:
+            return
+
+        waiters = []
+        for waiter in self._waiters:
+            groups, excluded, waiting = waiter
+            if self._count_pending(groups, excluded):
+                waiters.append(waiter)
+            else:
+                waiting.set_result(None)
+        self._waiters = waiters
+
+    def _count_pending(self, groups, excluded):
+        """Count the coroutines still running in some groups.
+
+        """
+        pending = self._pending
+        if groups is not None:
+            return sum(pending.get(g, 0) for g in groups)
+
+        return (sum(pending.values()) -
+                sum(pending.get(g, 0) for g in excluded))
@@ -16,8 +16,17 @@ from __future__ import (division, unicode_literals, print_function,
                         absolute_import)
 
 from future.builtins import str
-from atom.api import Atom, Dict, Bool, Value, Signal, List, Typed, ForwardTyped
+from atom.api import (Atom, Dict, Bool, Value, Signal, List, Typed,
+                      ForwardTyped, Int, Unicode)
 from threading import Lock
+from operator import itemgetter
+from collections import deque
+
+from .flat_storage import TypedFlatStorage, SharedFlatStorage
+from .journal import DatabaseJournal
+
+#: Number of entries per chunk of a snapshot is 2**SNAPSHOT_CHUNK_SHIFT.
+SNAPSHOT_CHUNK_SHIFT = 6
 
 
 class DatabaseNode(Atom):
@@ -34,6 +43,87 @@ class DatabaseNode(Atom):
     meta = Dict()
 
 
+class EntryHandle(Atom):
+    """Resolved reference to an entry of the flattened database.
+
+    Handles are built in running mode by `TaskDatabase.get_entry_handle` and
+    give access to an entry without resolving its path on each call.
+
+    """
+    #: Index of the entry in the flat database.
+    index = Int()
+
+    #: Full path of the entry, once access exceptions have been resolved.
+    path = Unicode()
+
+    #: Reference to the database to which this handle belongs.
+    database = ForwardTyped(lambda: TaskDatabase)
+
+    def get(self):
+        """Get the current value of the entry.
+
+        """
+        return self.database._flat_database[self.index]
+
+    def set(self, value):
+        """Set the value of the entry.
+
+        """
+        self.database.set_value_by_index(self.index, value)
+
+
+class DatabaseSnapshot(Atom):
+    """Immutable view of the values of a database in running mode.
+
+    Snapshots are built by `TaskDatabase.snapshot`. The values are stored in
+    fixed size chunks shared with the previous and next snapshots as long as
+    none of the values they contain changed. Values are not copied, hence
+    objects modified in place (list, dict, ...) are seen modified by all
+    snapshots.
+
+    """
+    #: Tuple of tuples holding the values of the entries.
+    chunks = Value()
+
+    #: Full path of each entry of the flat database.
+    paths = Value()
+
+    #: Dict mapping full paths (including access exceptions) to indexes.
+    index_map = Value()
+
+    #: Full path of the entries excluded when listing the values.
+    excluded = Value()
+
+    def get_value(self, path):
+        """Get the value of an entry.
+
+        Parameters
+        ----------
+        path : unicode
+            Full path of the entry (access exceptions can be used).
+
+        """
+        index = self.index_map[path]
+        chunk = self.chunks[index >> SNAPSHOT_CHUNK_SHIFT]
+        return chunk[index & ((1 << SNAPSHOT_CHUNK_SHIFT) - 1)]
+
+    def get_values(self):
+        """Get the values of all the entries.
+
+        Returns
+        -------
+        values : dict
+            Dict mapping the entries full path to their value. Excluded root
+            entries are omitted.
+
+        """
+        excluded = self.excluded
+        return {path: value
+                for path, value in zip(self.paths,
+                                       (v for c in self.chunks for v in c))
+                if path not in excluded}
+
+
 class TaskDatabase(Atom):
     """ A database for inter tasks communication.
 
@@ -45,7 +135,12 @@ class TaskDatabase(Atom):
     - a running mode in which the entries are fixed (only their values can
       change). In this mode the database is represented as a flat list.
       In running mode the database is thread safe but the object it contains
-      may not be so (dict, list, etc)
+      may not be so (dict, list, etc). Notifications are emitted once the
+      lock has been released, in the order in which the writes occured.
+      They are delivered by a single thread at a time: a write performed
+      while another thread is delivering notifications returns immediately
+      and its notifications are delivered asynchronously, by the delivering
+      thread, before that thread returns from its own write.
 
     """
     #: Signal used to notify a value changed in the database. The update is
@@ -76,6 +171,22 @@ class TaskDatabase(Atom):
     #: running mode the database is flattened into a list for faster acces.
     running = Bool(False)
 
+    #: Flag indicating whether or not numeric entries (bool, int, float,
+    #: complex) should be stored in numpy arrays when entering the running
+    #: mode. Must be set before calling prepare_to_run.
+    typed_storage = Bool(False)
+
+    #: Path of a file in which to store the numeric entries in running mode.
+    #: When set, numeric entries are kept in numpy arrays located in a memory
+    #: mapped file so that other processes can read them (see
+    #: get_shared_storage_infos). Must be set before calling prepare_to_run.
+    shared_storage_path = Unicode()
+
+    #: Path of a file in which to record all the writes made in running mode
+    #: (see journal.JournalReader to read it). Must be set before calling
+    #: prepare_to_run.
+    journal_path = Unicode()
+
     def set_value(self, node_path, value_name, value):
         """Method used to set the value of the entry at the specified path
 
@@ -104,19 +215,75 @@ class TaskDatabase(Atom):
         if self.running:
             full_path = node_path + '/' + value_name
             index = self._entry_index_map[full_path]
+            journal = self._journal
+            if journal is not None:
+                frozen = journal.freeze(value)
             with self._lock:
                 self._flat_database[index] = value
-                self.notifier(('added', node_path + '/' + value_name, value))
+                if self._dirty_chunks is not None:
+                    self._dirty_chunks.add(index >> SNAPSHOT_CHUNK_SHIFT)
+                if journal is not None and self._journal is journal:
+                    journal.append(index, frozen)
+                change = ('added', full_path, value)
+                subscribers = self._subscribers[index]
+                if subscribers:
+                    self._outbox.append((subscribers, change))
+                if self.has_observers('notifier'):
+                    self._outbox.append((None, change))
+            self._flush_outbox()
         else:
             node = self.go_to_path(node_path)
             if value_name not in node.data:
                 new_val = True
             node.data[value_name] = value
             if new_val:
+                self._structure_changed(node_path)
                 self.notifier(('added', node_path + '/' + value_name, value))
 
         return new_val
 
+    def set_values(self, node_path, values):
+        """Set the values of several entries of a node at once.
+
+        In running mode the lock is acquired only once and a single
+        notification (a list of tuples) is emitted for all the entries.
+
+        Parameters
+        ----------
+        node_path : unicode
+            Path to the node holding the values to be set
+
+        values : dict
+            Mapping between the public keys associated with the values and the
+            actual values to be stored.
+
+        Returns
+        -------
+        new_val : bool
+            Boolean indicating whether or not a new entry has been created in
+            the database
+
+        """
+        if self.running:
+            mapping = self._entry_index_map
+            names = list(values)
+            indexes = [mapping[node_path + '/' + name] for name in names]
+            self.set_values_by_index(indexes, [values[n] for n in names])
+            return False
+
+        node = self.go_to_path(node_path)
+        notif = []
+        for name, value in values.items():
+            if name not in node.data:
+                notif.append(('added', node_path + '/' + name, value))
+            node.data[name] = value
+
+        if notif:
+            self._structure_changed(node_path)
+            self.notifier(notif)
+
+        return bool(notif)
+
     def get_value(self, assumed_path, value_name):
         """Method to get a value from the database from its name and a path
 
@@ -144,24 +311,62 @@ class TaskDatabase(Atom):
 
         else:
             node = self.go_to_path(assumed_path)
+            while node is not None:
+                # First check if the entry is in the current node.
+                if value_name in node.data:
+                    return node.data[value_name]
+
+                # Second check if there is a special rule about this entry.
+                access = node.meta.get('access')
+                if access and value_name in access:
+                    path = assumed_path + '/' + access[value_name]
+                    return self.get_value(path, value_name)
 
-            # First check if the entry is in the current node.
+                # Finally go one step up in the node hierarchy.
+                node = node.parent
+                assumed_path = assumed_path.rpartition('/')[0]
+
+            mes = "Can't find database entry : {}".format(value_name)
+            raise KeyError(mes)
+
+    def resolve_entry_path(self, assumed_path, value_name):
+        """Get the full path of the entry get_value would access.
+
+        This method can be used both in edition and running mode.
+
+        Parameters
+        ----------
+        assumed_path : unicode
+            Path where we start looking for the entry
+
+        value_name : unicode
+            Name of the value we are looking for
+
+        Returns
+        -------
+        path : unicode
+            Full path of the entry once access exceptions are resolved.
+
+        """
+        if self.running:
+            return self._flat_paths[self._find_index(assumed_path,
+                                                     value_name)]
+
+        node = self.go_to_path(assumed_path)
+        while node is not None:
             if value_name in node.data:
-                value = node.data[value_name]
-                return value
+                return assumed_path + '/' + value_name
 
-            # Second check if there is a special rule about this entry.
-            elif 'access' in node.meta and value_name in node.meta['access']:
-                path = assumed_path + '/' + node.meta['access'][value_name]
-                return self.get_value(path, value_name)
+            access = node.meta.get('access')
+            if access and value_name in access:
+                path = assumed_path + '/' + access[value_name]
+                return self.resolve_entry_path(path, value_name)
 
-            # Finally go one step up in the node hierarchy.
-            else:
-                new_assumed_path = assumed_path.rpartition('/')[0]
-                if assumed_path == new_assumed_path:
-                    mes = "Can't find database entry : {}".format(value_name)
-                    raise KeyError(mes)
-                return self.get_value(new_assumed_path, value_name)
+            node = node.parent
+            assumed_path = assumed_path.rpartition('/')[0]
+
+        mes = "Can't find database entry : {}".format(value_name)
+        raise KeyError(mes)
 
     def rename_values(self, node_path, old, new, access_exs=None):
         """Rename database entries.
@@ -219,8 +424,11 @@ class TaskDatabase(Atom):
 
         # Avoid sending spurious notifications
         if notif:
+            self._structure_changed(node_path)
             self.notifier(notif)
         if acc_notif:
+            for path in set(n[1] for n in acc_notif):
+                self._structure_changed(path)
             self.access_notifier(acc_notif)
 
     def delete_value(self, node_path, value_name):
@@ -247,6 +455,7 @@ class TaskDatabase(Atom):
 
             if value_name in node.data:
                 del node.data[value_name]
+                self._structure_changed(node_path)
                 self.notifier(('removed', node_path + '/' + value_name))
             else:
                 err_str = 'No entry {} in node {}'.format(value_name,
@@ -272,10 +481,319 @@ class TaskDatabase(Atom):
             prefix was not None.
 
         """
+        flat = self._flat_database
+        if isinstance(flat, TypedFlatStorage):
+            values = flat.take(indexes)
+            if prefix is None:
+                return values
+            return {prefix + str(i): v for i, v in zip(indexes, values)}
+
         if prefix is None:
-            return [self._flat_database[i] for i in indexes]
+            return [flat[i] for i in indexes]
         else:
-            return {prefix + str(i): self._flat_database[i] for i in indexes}
+            return {prefix + str(i): flat[i] for i in indexes}
+
+    def get_values_getter(self, indexes):
+        """Build a function returning the values of several entries.
+
+        This method can only be used in running mode.
+
+        Parameters
+        ----------
+        indexes : list(int)
+            Indexes of the entries in the flat database.
+
+        Returns
+        -------
+        getter : callable
+            Function taking no argument and returning the current values of
+            the entries as a tuple in the same order as indexes.
+
+        """
+        if not indexes:
+            return tuple
+
+        if len(indexes) == 1:
+            index = indexes[0]
+            return lambda: (self._flat_database[index],)
+
+        getter = itemgetter(*indexes)
+        return lambda: getter(self._flat_database)
+
+    def set_value_by_index(self, index, value):
+        """Set the value of an entry using its index in the flat database.
+
+        This method can only be used in running mode.
+
+        Parameters
+        ----------
+        index : int
+            Index of the entry in the flattened database.
+
+        value : any
+            Actual value to be stored
+
+        """
+        journal = self._journal
+        if journal is not None:
+            frozen = journal.freeze(value)
+        with self._lock:
+            self._flat_database[index] = value
+            if self._dirty_chunks is not None:
+                self._dirty_chunks.add(index >> SNAPSHOT_CHUNK_SHIFT)
+            if journal is not None and self._journal is journal:
+                journal.append(index, frozen)
+            change = ('added', self._flat_paths[index], value)
+            subscribers = self._subscribers[index]
+            if subscribers:
+                self._outbox.append((subscribers, change))
+            if self.has_observers('notifier'):
+                self._outbox.append((None, change))
+        self._flush_outbox()
+
+    def set_values_by_index(self, indexes, values):
+        """Set the values of several entries using their index.
+
+        The lock is acquired only once and a single notification (a list of
+        tuples) is emitted for all the entries. Similarly each subscriber is
+        called once with the list of the changes it subscribed to. This method
+        can only be used in running mode.
+
+        Parameters
+        ----------
+        indexes : list(int)
+            Indexes of the entries in the flattened database.
+
+        values : list
+            Values to store in the same order as indexes.
+
+        """
+        flat = self._flat_database
+        paths = self._flat_paths
+        notify = self.has_observers('notifier')
+        notif = []
+        dispatch = {}
+        journal = self._journal
+        if journal is not None:
+            frozen = [journal.freeze(value) for value in values]
+        with self._lock:
+            subscribers = self._subscribers
+            for index, value in zip(indexes, values):
+                flat[index] = value
+                change = ('added', paths[index], value)
+                if notify:
+                    notif.append(change)
+                if subscribers[index]:
+                    # Callbacks are not necessarily hashable (bound methods of
+                    # unhashable objects), hence the use of id.
+                    for callback in subscribers[index]:
+                        dispatch.setdefault(id(callback),
+                                            (callback, []))[1].append(change)
+            if self._dirty_chunks is not None:
+                self._dirty_chunks.update(i >> SNAPSHOT_CHUNK_SHIFT
+                                          for i in indexes)
+            if journal is not None and self._journal is journal:
+                for index, value in zip(indexes, frozen):
+                    journal.append(index, value)
+            for callback, changes in dispatch.values():
+                self._outbox.append(((callback,), changes))
+            if notif:
+                self._outbox.append((None, notif))
+        self._flush_outbox()
+
+    def snapshot(self):
+        """Capture the current values of all the entries.
+
+        This method can only be used in running mode. The first call copies
+        references to all the values, the following ones only copy the chunks
+        of entries in which a value was written since the previous snapshot
+        (see SNAPSHOT_CHUNK_SHIFT), the others are shared.
+
+        Returns
+        -------
+        snapshot : DatabaseSnapshot
+            Immutable view of the values of the database.
+
+        """
+        if not self.running:
+            raise RuntimeError('Snapshots are only available in running mode')
+
+        flat = self._flat_database
+        size = 1 << SNAPSHOT_CHUNK_SHIFT
+        with self._lock:
+            chunks = self._snapshot_chunks
+            if self._dirty_chunks is None:
+                dirty = range(len(chunks))
+                self._dirty_chunks = set()
+            else:
+                dirty = self._dirty_chunks
+                self._dirty_chunks = set()
+            if isinstance(flat, list):
+                for c in dirty:
+                    chunks[c] = tuple(flat[c*size:(c+1)*size])
+            else:
+                length = len(flat)
+                for c in dirty:
+                    indexes = range(c*size, min((c+1)*size, length))
+                    chunks[c] = tuple(flat.take(indexes))
+            frozen = tuple(chunks)
+
+        return DatabaseSnapshot(chunks=frozen, paths=self._flat_paths,
+                                index_map=self._entry_index_map,
+                                excluded=set('root/' + e
+                                             for e in self.excluded))
+
+    def subscribe(self, path, callback):
+        """Register a callback called when an entry is written in running mode.
+
+        The callback is called, outside of the database lock, with a tuple
+        ('added', path, value) or a list of such tuples for batched writes.
+        It may be called from another writing thread than the one which
+        performed the write, after that write returned (see the class
+        docstring).
+        Contrary to the notifier signal, only the writes to the subscribed
+        entries are dispatched. Subscriptions to entries which do not exist
+        when entering the running mode are ignored.
+
+        Parameters
+        ----------
+        path : unicode
+            Full path of the entry (access exceptions can be used).
+
+        callback : callable
+            Callable taking the change as single argument.
+
+        """
+        self._subscriptions.setdefault(path, []).append(callback)
+        if self.running:
+            with self._lock:
+                self._resolve_subscriptions()
+
+    def unsubscribe(self, path, callback):
+        """Remove a callback registered using subscribe.
+
+        """
+        callbacks = self._subscriptions.get(path, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+        if not callbacks:
+            self._subscriptions.pop(path, None)
+        if self.running:
+            with self._lock:
+                self._resolve_subscriptions()
+
+    def get_entry_handle(self, assumed_path, entry):
+        """Get a resolved handle for an entry.
+
+        This method can only be used in running mode.
+
+        Parameters
+        ----------
+        assumed_path : unicode
+            Path to the node in which the value is assumed to be stored.
+
+        entry : unicode
+            Name of the entry for which to build an handle.
+
+        Returns
+        -------
+        handle : EntryHandle
+            Handle allowing fast read and write access to the entry.
+
+        """
+        index = self._find_index(assumed_path, entry)
+        return EntryHandle(index=index, path=self._flat_paths[index],
+                           database=self)
+
+    def copy_numeric_values(self):
+        """Copy all the numeric entries stored in numpy arrays.
+
+        This is only available in running mode when typed_storage is True and
+        costs a single copy per numpy array. Use get_numeric_layout to know
+        where each entry is located.
+
+        Returns
+        -------
+        columns : dict
+            Copy of the numpy arrays storing the numeric values by kind.
+
+        """
+        flat = self._typed_storage()
+        with self._lock:
+            return flat.copy_columns()
+
+    def get_numeric_layout(self):
+        """Get the location of the entries stored in numpy arrays.
+
+        Entries in which a non numeric value has been written are not part of
+        the layout.
+
+        Returns
+        -------
+        layout : dict
+            Mapping between the entries full path and their location in the
+            arrays as a (kind, position) tuple.
+
+        """
+        flat = self._typed_storage()
+        paths = self._flat_paths
+        return {paths[i]: loc for i, loc in flat.layout().items()}
+
+    def get_shared_storage(self):
+        """Access the storage shared with other processes.
+
+        Returns
+        -------
+        storage : SharedFlatStorage or None
+            Storage used in running mode if shared_storage_path is set.
+
+        """
+        flat = self._flat_database
+        return flat if isinstance(flat, SharedFlatStorage) else None
+
+    def get_shared_storage_infos(self):
+        """Get the informations needed to read the values from another process.
+
+        Returns
+        -------
+        infos : dict or None
+            Informations to pass to a SharedStorageReader, or None if the
+            database does not use a shared storage. The 'entries' key maps the
+            entries full path to their location as a (kind, position, index)
+            tuple.
+
+        """
+        storage = self.get_shared_storage()
+        if storage is None:
+            return None
+        infos = storage.infos()
+        paths = self._flat_paths
+        infos['entries'] = {paths[i]: (kind, pos, i)
+                            for i, (kind, pos) in storage.layout().items()}
+        return infos
+
+    def close_shared_storage(self):
+        """Release the file used to share the values with other processes.
+
+        The values stored in the shared arrays are copied back to a plain
+        list, so that the database can still be accessed.
+
+        """
+        storage = self.get_shared_storage()
+        if storage is not None:
+            with self._lock:
+                self._flat_database = [storage[i] for i in range(len(storage))]
+            storage.close()
+
+    def close_journal(self):
+        """Write the pending records of the journal and close it.
+
+        """
+        if self._journal is not None:
+            with self._lock:
+                journal = self._journal
+                self._journal = None
+            journal.close()
 
     def get_entries_indexes(self, assumed_path, entries):
         """ Access to the index in the flattened database for some entries.
@@ -316,31 +834,8 @@ class TaskDatabase(Atom):
             List of entries accessible from the specified node
 
         """
-        entries = []
-        while True:
-            node = self.go_to_path(node_path)
-            keys = node.data.keys()
-            # Looking for the entries in the node.
-            for key in keys:
-                if not isinstance(node.data[key], DatabaseNode):
-                    entries.append(key)
-
-            # Adding the special access if they are not already in the list.
-            for entry in node.meta.get('access', []):
-                if entry not in entries:
-                    entries.append(entry)
-
-            if node_path != 'root':
-                # Going to the next node.
-                node_path = node_path.rpartition('/')[0]
-            else:
-                break
-
-        for entry in self.excluded:
-            if entry in entries:
-                entries.remove(entry)
-
-        return sorted(entries)
+        return sorted(self._accessible_entries(node_path) -
+                      set(self.excluded))
 
     def list_all_entries(self, path='root', values=False):
         """List all entries in the database.
@@ -409,6 +904,7 @@ class TaskDatabase(Atom):
             access_exceptions[entry] = rel_path
         else:
             node.meta['access'] = {entry: rel_path}
+        self._structure_changed(node_path)
         self.access_notifier(('added', node_path, rel_path, entry))
 
     def remove_access_exception(self, node_path, entry=None):
@@ -432,6 +928,7 @@ class TaskDatabase(Atom):
         else:
             relative_path = ''
             del node.meta['access']
+        self._structure_changed(node_path)
         self.access_notifier(('removed', node_path, relative_path, entry))
 
     def create_node(self, parent_path, node_name):
@@ -456,7 +953,11 @@ class TaskDatabase(Atom):
 
         parent_node = self.go_to_path(parent_path)
         node = DatabaseNode(parent=parent_node)
+        path = parent_path + '/' + node_name
+        if node_name in parent_node.data:
+            self._discard_nodes(path)
         parent_node.data[node_name] = node
+        self._node_index[path] = node
         self.nodes_notifier(('added', parent_path, node_name, node))
 
     def rename_node(self, parent_path, old_name, new_name):
@@ -481,6 +982,12 @@ class TaskDatabase(Atom):
         parent_node.data[new_name] = parent_node.data[old_name]
         del parent_node.data[old_name]
 
+        old_path = parent_path + '/' + old_name
+        new_path = parent_path + '/' + new_name
+        index = self._node_index
+        for path, node in self._discard_nodes(old_path).items():
+            index[new_path + path[len(old_path):]] = node
+
         while parent_node:
             if 'access' not in parent_node.meta:
                 parent_node = parent_node.parent
@@ -513,6 +1020,7 @@ class TaskDatabase(Atom):
         parent_node = self.go_to_path(parent_path)
         if node_name in parent_node.data:
             del parent_node.data[node_name]
+            self._discard_nodes(parent_path + '/' + node_name)
         else:
             err_str = 'No node {} at the path {}'.format(node_name,
                                                          parent_path)
@@ -541,40 +1049,78 @@ class TaskDatabase(Atom):
     def prepare_to_run(self):
         """Enter a thread safe, flat database state.
 
-        This is used when tasks are executed.
+        This is used when tasks are executed. The flat layout is reused if the
+        structure of the database did not change since the last run. If the
+        database is already running, the current values are first stored
+        back in the nodes.
 
         """
+        if self.running:
+            self.exit_running()
+
         self._lock = Lock()
-        self.running = True
+        self._notifier_lock = Lock()
+        self._outbox = deque()
+
+        layout = self._layout
+        if layout is None or layout[0] != self._structure_version:
+            layout = self._layout = self._compute_layout()
+        _, slots, paths, mapping = layout
+        datas = [data[key] for data, key in slots]
+
+        if self.shared_storage_path:
+            self._flat_database = SharedFlatStorage(datas,
+                                                    self.shared_storage_path)
+        elif self.typed_storage:
+            self._flat_database = TypedFlatStorage(datas)
+        else:
+            self._flat_database = datas
+        self._flat_paths = paths
+        self._entry_index_map = mapping
 
-        # Flattening the database by walking all the nodes.
-        index = 0
-        nodes = [('root', self._database)]
-        mapping = {}
-        datas = []
-        for (node_path, node) in nodes:
-            for key, val in node.data.iteritems():
-                path = node_path + '/' + key
-                if isinstance(val, DatabaseNode):
-                    nodes.append((path, val))
-                else:
-                    mapping[path] = index
-                    index += 1
-                    datas.append(val)
-
-        # Walking a second time to add the exception to the _entry_index_map,
-        # in reverse order in case an entry has multiple exceptions.
-        for (node_path, node) in nodes[::-1]:
-            access = node.meta.get('access', [])
-            for entry in access:
-                short_path = node_path + '/' + entry
-                full_path = node_path + '/' + access[entry] + '/' + entry
-                mapping[short_path] = mapping[full_path]
+        self._resolve_subscriptions()
+        if self.journal_path:
+            self._journal = DatabaseJournal(self.journal_path, paths)
 
-        self._flat_database = datas
-        self._entry_index_map = mapping
+        chunks_number = -(-len(paths) >> SNAPSHOT_CHUNK_SHIFT)
+        self._snapshot_chunks = [()]*chunks_number
+        self._dirty_chunks = None
 
+        self._edition_database = self._database
         self._database = None
+        self._node_index = {}
+        self._accessible_cache = {}
+        self.running = True
+
+    def exit_running(self):
+        """Go back to edition mode.
+
+        The values written while running are stored back in the nodes. If a
+        shared storage was used it is closed.
+
+        """
+        if not self.running:
+            raise RuntimeError('The database is not in running mode')
+
+        flat = self._flat_database
+        with self._lock:
+            values = [flat[i] for i in range(len(flat))]
+        if isinstance(flat, SharedFlatStorage):
+            flat.close()
+        self.close_journal()
+
+        for (data, key), value in zip(self._layout[1], values):
+            data[key] = value
+
+        self._database = self._edition_database
+        self._edition_database = None
+        self._node_index = {'root': self._database}
+        self._flat_database = []
+        self._flat_paths = []
+        self._entry_index_map = {}
+        self._snapshot_chunks = None
+        self._dirty_chunks = None
+        self.running = False
 
     def list_nodes(self):
         """List all the nodes present in the database.
@@ -598,6 +1144,11 @@ class TaskDatabase(Atom):
         """Method used to reach a node specified by a path.
 
         """
+        try:
+            return self._node_index[path]
+        except KeyError:
+            pass
+
         node = self._database
         if path == 'root':
             return node
@@ -621,6 +1172,7 @@ class TaskDatabase(Atom):
                         {}'.format(path, key, keys[ind-1])
                 raise KeyError(err_str)
 
+        self._node_index[path] = node
         return node
 
     # =========================================================================
@@ -630,16 +1182,209 @@ class TaskDatabase(Atom):
     #: Main container for the database.
     _database = Typed(DatabaseNode, ())
 
+    #: Tree of nodes kept aside while the database is in running mode.
+    _edition_database = Typed(DatabaseNode)
+
     #: Flat version of the database only used in running mode for perfomances
-    #: issues.
-    _flat_database = List()
+    #: issues. This is a list or a TypedFlatStorage if typed_storage is True.
+    _flat_database = Value(factory=list)
 
-    #: Dict mapping full paths to flat database indexes.
-    _entry_index_map = Dict()
+    #: Full path of each entry of the flat database (access exceptions are
+    #: resolved). This list may be shared with other databases and must not be
+    #: modified.
+    _flat_paths = Value(factory=list)
+
+    #: Dict mapping full paths to flat database indexes. This dict is reused
+    #: by the following runs and must not be modified.
+    _entry_index_map = Value(factory=dict)
+
+    #: Version of the structure of the database, incremented each time nodes
+    #: or entries are added or removed (see _structure_changed).
+    _structure_version = Int()
+
+    #: Flat layout of the database as a tuple (version, slots, paths,
+    #: mapping), version being the structure version for which it was
+    #: computed and slots the (node data, key) pairs holding the entries in
+    #: edition mode.
+    _layout = Value()
 
     #: Lock to make the database thread safe in running mode.
     _lock = Value()
 
+    #: Notifications waiting to be emitted in running mode as (subscribers,
+    #: change) tuples, subscribers being None for the notifier signal. They are
+    #: queued while holding _lock so that their order matches the order of the
+    #: writes.
+    _outbox = Value()
+
+    #: Callbacks subscribed to the changes of an entry by path.
+    _subscriptions = Dict()
+
+    #: Tuple of the callbacks subscribed to each entry of the flat database
+    #: (None if the entry has no subscriber). Only used in running mode.
+    _subscribers = Value()
+
+    def _resolve_subscriptions(self):
+        """Build the per index tuples of subscribers.
+
+        """
+        mapping = self._entry_index_map
+        subscribers = [None]*len(self._flat_paths)
+        for path, callbacks in self._subscriptions.items():
+            if path in mapping and callbacks:
+                index = mapping[path]
+                subscribers[index] = (subscribers[index] or ()) + \
+                    tuple(callbacks)
+        self._subscribers = subscribers
+
+    #: Lock held by the thread currently emitting the queued notifications.
+    _notifier_lock = Value()
+
+    #: Journal recording the writes in running mode. The values are captured
+    #: (see DatabaseJournal.freeze) before acquiring _lock and queued while
+    #: holding it so that the records follow the order of the writes.
+    _journal = Value()
+
+    #: Chunks of values captured by the last snapshot.
+    _snapshot_chunks = Value()
+
+    #: Indexes of the chunks in which a value was written since the last
+    #: snapshot. None until the first snapshot is taken.
+    _dirty_chunks = Value()
+
+    #: Dict mapping the path of the nodes to the nodes in edition mode.
+    _node_index = Dict()
+
+    #: Dict mapping the path of the nodes to the set of entries accessible
+    #: from them (excluded entries included). Filled on demand in edition mode.
+    _accessible_cache = Dict()
+
+    def _default__node_index(self):
+        return {'root': self._database}
+
+    def _discard_nodes(self, path):
+        """Remove a node and its descendants from the node index.
+
+        Returns
+        -------
+        nodes : dict
+            Removed nodes by path.
+
+        """
+        index = self._node_index
+        prefix = path + '/'
+        removed = {k: v for k, v in index.items()
+                   if k == path or k.startswith(prefix)}
+        for k in removed:
+            del index[k]
+        self._structure_changed(path)
+        return removed
+
+    def _structure_changed(self, path):
+        """Discard the cached informations depending on the node structure.
+
+        The structure version is incremented, which invalidates the flat
+        layout, and the cached accessible entries of the node and its
+        descendants are discarded.
+
+        """
+        self._structure_version += 1
+        cache = self._accessible_cache
+        if not cache:
+            return
+        prefix = path + '/'
+        for k in [k for k in cache if k == path or k.startswith(prefix)]:
+            del cache[k]
+
+    def _accessible_entries(self, node_path):
+        """Set of entries accessible from a node, using the cache.
+
+        """
+        cache = self._accessible_cache
+        if node_path in cache:
+            return cache[node_path]
+
+        node = self.go_to_path(node_path)
+        if node_path != 'root':
+            parent_path = node_path.rpartition('/')[0]
+            entries = set(self._accessible_entries(parent_path))
+        else:
+            entries = set()
+        entries.update(k for k, v in node.data.items()
+                       if not isinstance(v, DatabaseNode))
+        entries.update(node.meta.get('access', ()))
+        cache[node_path] = entries
+        return entries
+
+    def _compute_layout(self):
+        """Compute the flat layout of the database for its current structure
+        version.
+
+        """
+        # Flattening the database by walking all the nodes.
+        nodes = [('root', self._database)]
+        slots = []
+        paths = []
+        accesses = []
+        for (node_path, node) in nodes:
+            for key, val in node.data.iteritems():
+                path = node_path + '/' + key
+                if isinstance(val, DatabaseNode):
+                    nodes.append((path, val))
+                else:
+                    slots.append((node.data, key))
+                    paths.append(path)
+            if 'access' in node.meta:
+                accesses.append((node_path,
+                                 tuple(node.meta['access'].items())))
+
+        mapping = {path: i for i, path in enumerate(paths)}
+        # Adding the exceptions to the _entry_index_map, in reverse order in
+        # case an entry has multiple exceptions.
+        for (node_path, access) in accesses[::-1]:
+            for entry, rel_path in access:
+                short_path = node_path + '/' + entry
+                full_path = node_path + '/' + rel_path + '/' + entry
+                mapping[short_path] = mapping[full_path]
+
+        return self._structure_version, slots, paths, mapping
+
+    def _typed_storage(self):
+        """Access the flat database checking it uses typed storage.
+
+        """
+        flat = self._flat_database
+        if not isinstance(flat, TypedFlatStorage):
+            raise RuntimeError('Numeric values are not stored in numpy '
+                               'arrays.')
+        return flat
+
+    def _flush_outbox(self):
+        """Emit the queued notifications.
+
+        Only one thread emits notifications at a time, if another thread is
+        already doing it, it will take care of the notifications queued by the
+        current one so that the caller can return immediately. Notifications
+        are hence delivered in the order of the writes and, once all the
+        writing threads returned, all of them have been delivered.
+
+        """
+        outbox = self._outbox
+        lock = self._notifier_lock
+        # Checking the outbox after releasing the lock ensures that no
+        # notification queued while we were emitting is left behind.
+        while outbox and lock.acquire(False):
+            try:
+                while outbox:
+                    subscribers, change = outbox.popleft()
+                    if subscribers is None:
+                        self.notifier(change)
+                    else:
+                        for callback in subscribers:
+                            callback(change)
+            finally:
+                lock.release()
+
     def _find_index(self, assumed_path, entry):
         """Find the index associated with a path.
 
@@ -17,14 +17,17 @@ from __future__ import (division, unicode_literals, print_function,
 
 import logging
 from functools import update_wrapper
-from time import sleep
-from threading import Thread, current_thread
+from threading import current_thread
 from traceback import format_exc
 
 
 def handle_stop_pause(root):
     """Check the state of the stop and pause event and handle the pause.
 
+    The check relies on the in-process copy of the state of the events (see
+    InterruptionEvent) so that it is cheap. When paused the thread blocks
+    till the execution is resumed or stopped.
+
     When the pause stops the main thread take care of re-initializing the
     driver owners (so that any user modification shoudl not cause a crash) and
     signal the other threads it is done by setting the resume flag.
@@ -41,32 +44,27 @@ def handle_stop_pause(root):
 
     """
     stop_flag = root.should_stop
-    if stop_flag.is_set():
+    if stop_flag.flag:
         return True
 
     pause_flag = root.should_pause
-    if pause_flag.is_set():
+    if pause_flag.flag:
         root.resumed.clear()
         root.paused_threads_counter.increment()
-        while True:
-            sleep(0.05)
-            if stop_flag.is_set():
-                root.paused_threads_counter.decrement()
-                return True
-            if not pause_flag.is_set():
-                if current_thread().ident == root.thread_id:
-                    # Prevent issues if a user alter a resource while in pause.
-                    for _, resource in root.resources.items():
-                        resource.reset()
-                    root.resumed.set()
-                    root.paused_threads_counter.decrement()
-                    break
-                else:
-                    # Safety here ensuring the main thread finished
-                    # re-initializing the resources.
-                    root.resumed.wait()
-                    root.paused_threads_counter.decrement()
-                    break
+        if pause_flag.wait_cleared(stop_flag):
+            root.paused_threads_counter.decrement()
+            return True
+
+        if current_thread().ident == root.thread_id:
+            # Prevent issues if a user alter a resource while in pause.
+            for _, resource in root.resources.items():
+                resource.reset()
+            root.resumed.set()
+        else:
+            # Safety here ensuring the main thread finished re-initializing
+            # the resources.
+            root.resumed.wait()
+        root.paused_threads_counter.decrement()
 
 
 def make_stoppable(function_to_decorate):
@@ -99,11 +97,7 @@ def smooth_crash(function_to_decorate):
         try:
             return function_to_decorate(*args, **kwargs)
         except Exception:
-            log = logging.getLogger(function_to_decorate.__module__)
-            msg = 'The following unhandled exception occured in %s :'
-            log.exception(msg % obj.name)
-            obj.root.should_stop.set()
-            obj.root.errors['unhandled'] = msg % obj.name + '\n' + format_exc()
+            _report_crash(obj, function_to_decorate)
 
     update_wrapper(decorator, function_to_decorate)
     return decorator
@@ -112,8 +106,12 @@ def smooth_crash(function_to_decorate):
 def make_parallel(perform, pool):
     """Machinery to execute perform in parallel.
 
-    Create a wrapper around a method to execute it in a thread and register the
-    thread.
+    Create a wrapper around a method to execute it in the worker pool of the
+    given name (see ThreadPoolResource). The work is accounted for in the
+    active threads counter of the root only while it is executed, so that
+    work waiting for a free worker does not prevent the measure from being
+    paused. As the measure may have been stopped or paused while the work was
+    waiting, the stop and pause are handled again before executing it.
 
     Parameters
     ----------
@@ -121,31 +119,24 @@ def make_parallel(perform, pool):
         Method which should be wrapped to run in parallel.
 
     pool : str
-        Name of the execution pool to which the created thread belongs.
+        Name of the execution pool to which the work belongs.
 
     """
-    def wrapper(*args, **kwargs):
+    safe_perform = smooth_crash(perform)
 
-        obj = args[0]
-        root = obj.root
-        safe_perform = smooth_crash(perform)
-
-        def thread_perform(task, *args, **kwargs):
-            safe_perform(task, *args, **kwargs)
-            task.root.active_threads_counter.decrement()
+    def pool_perform(task, *args, **kwargs):
+        counter = task.root.active_threads_counter
+        counter.increment()
+        try:
+            if not handle_stop_pause(task.root):
+                safe_perform(task, *args, **kwargs)
+        finally:
+            counter.decrement()
 
-        thread = Thread(group=None,
-                        target=thread_perform,
-                        args=args,
-                        kwargs=kwargs)
+    def wrapper(obj, *args, **kwargs):
 
         pools = obj.root.resources['threads']
-
-        with pools.safe_access(pool) as threads:
-            threads.append(thread)
-
-        root.active_threads_counter.increment()
-        thread.start()
+        return pools.submit(pool, pool_perform, obj, *args, **kwargs)
 
     update_wrapper(wrapper, perform)
     return wrapper
@@ -154,9 +145,10 @@ def make_parallel(perform, pool):
 def make_wait(perform, wait, no_wait):
     """Machinery to make perform wait on other tasks execution.
 
-    Create a wrapper around a method to wait for some threads to terminate
-    before calling the method. Threads are grouped in execution pools.
-    This method supports new threads being started while it is waiting.
+    Create a wrapper around a method to wait for some execution pools to
+    complete their work before calling the method (see
+    ThreadPoolResource.wait). This method supports new work being submitted
+    while it is waiting.
 
     Parameters
     ----------
@@ -175,94 +167,146 @@ def make_wait(perform, wait, no_wait):
 
     """
     if wait:
+        wait = tuple(wait)
+
         def wrapper(obj, *args, **kwargs):
 
-            all_threads = obj.root.resources['threads']
-            while True:
-                threads = []
-                # Get all the threads we should be waiting upon.
-                with all_threads.locked():
-                    for p in wait:
-                        threads.extend(all_threads[p])
+            obj.root.resources['threads'].wait(wait)
+            return perform(obj, *args, **kwargs)
 
-                # If there is none break. Use any as threads is an iterator.
-                if not any(threads):
-                    break
+    elif no_wait:
+        no_wait = tuple(no_wait)
 
-                # Else join them.
-                for thread in threads:
-                    thread.join()
+        def wrapper(obj, *args, **kwargs):
 
-                # Make sure nobody modify the pools and update them by removing
-                # the references to the dead threads.
-                with all_threads.locked():
-                    for w in wait:
-                        all_threads[w] = [t for t in all_threads[w]
-                                          if t.is_alive()]
+            obj.root.resources['threads'].wait(excluded=no_wait)
+            return perform(obj, *args, **kwargs)
 
-                # Start over till no thread remain in the pools in wait.
+    else:
+        def wrapper(obj, *args, **kwargs):
 
+            obj.root.resources['threads'].wait()
             return perform(obj, *args, **kwargs)
 
-    elif no_wait:
-        def wrapper(obj, *args, **kwargs):
+    update_wrapper(wrapper, perform)
+
+    return wrapper
+
 
-            all_threads = obj.root.resources['threads']
-            with all_threads.locked():
-                pools = [k for k in all_threads if k not in no_wait]
+def make_stoppable_async(function_to_decorate):
+    """Coroutine counterpart of make_stoppable.
 
-            while True:
-                # Get all the threads we should be waiting upon.
-                threads = []
-                with all_threads.locked():
-                    for p in pools:
-                        threads.extend(all_threads[p])
+    This is applied to the perform_async method of every task marked as
+    stoppable when the root task uses coroutines (see EventLoop).
 
-                # If there is None break. Use any as threads is an iterator.
-                if not any(threads):
-                    break
+    """
+    def decorator(*args, **kwargs):
 
-                # Else join them.
-                for thread in threads:
-                    thread.join()
+        if handle_stop_pause(args[0].root):
+            return
 
-                # Make sure nobody modify the pools and update them by removing
-                # the references to the dead threads.
-                with all_threads.locked():
-                    for p in pools:
-                        all_threads[p] = [t for t in all_threads[p]
-                                          if t.is_alive()]
+        yield function_to_decorate(*args, **kwargs)
 
-                # Start over till no thread remain in the pool in wait.
+    update_wrapper(decorator, function_to_decorate)
 
-            return perform(obj, *args, **kwargs)
-    else:
-        def wrapper(obj, *args, **kwargs):
+    return decorator
+
+
+def smooth_crash_async(function_to_decorate):
+    """Coroutine counterpart of smooth_crash, used for the coroutines
+    executed in parallel.
+
+    """
+    def decorator(*args, **kwargs):
+        obj = args[0]
+
+        try:
+            yield function_to_decorate(*args, **kwargs)
+        except Exception:
+            _report_crash(obj, function_to_decorate)
+
+    update_wrapper(decorator, function_to_decorate)
+    return decorator
+
+
+def make_parallel_async(perform, pool):
+    """Machinery to execute a coroutine concurrently with the other ones.
+
+    The coroutine is spawned in the group of the event loop of the root
+    whose name is the name of the pool. The stop and pause are handled again
+    once the spawned coroutine starts.
+
+    Parameters
+    ----------
+    perform : method
+        Coroutine method which should be wrapped to run in parallel.
+
+    pool : str
+        Name of the group to which the coroutine belongs.
+
+    """
+    safe_perform = smooth_crash_async(perform)
+
+    def pool_perform(task, *args, **kwargs):
+        if handle_stop_pause(task.root):
+            return
+        yield safe_perform(task, *args, **kwargs)
+
+    def wrapper(obj, *args, **kwargs):
+
+        obj.root.event_loop.spawn(pool_perform(obj, *args, **kwargs), pool)
+        yield
+
+    update_wrapper(wrapper, perform)
+    return wrapper
 
-            all_threads = obj.root.resources['threads']
-            while True:
-                threads = []
-                with all_threads.locked():
-                    # Get all the threads we should be waiting upon.
-                    for p in all_threads:
-                        threads.extend(all_threads[p])
-
-                # If there is none break. Use any as threads is an iterator.
-                if not any(threads):
-                    break
-
-                # Else join them.
-                for thread in threads:
-                    thread.join()
-
-                # Make sure nobody modify the pools and update them by removing
-                # the references to the dead threads.
-                with all_threads.locked():
-                    for p in all_threads:
-                        all_threads[p] = [t for t in all_threads[p]
-                                          if t.is_alive()]
-            return perform(obj, *args, **kwargs)
+
+def make_wait_async(perform, wait, no_wait):
+    """Machinery to make a coroutine wait on other tasks execution.
+
+    The coroutine waits for the groups of coroutines of the event loop of the
+    root (see EventLoop.wait_groups) and then for the corresponding thread
+    pools, in which the tasks run in the executor may have submitted work.
+
+    Parameters
+    ----------
+    perform : method
+        Coroutine method which should be wrapped to wait on other tasks.
+
+    wait : list(str)
+        Names of the pools which should be waited.
+
+    no_wait : list(str)
+        Names of the pools which should not be waited for.
+
+    Both parameters are mutually exclusive. If both lists are empty the
+    execution will be deferred till all the pools have completed their work.
+
+    """
+    wait = tuple(wait) if wait else None
+    no_wait = tuple(no_wait) if no_wait else None
+
+    def wrapper(obj, *args, **kwargs):
+
+        root = obj.root
+        loop = root.event_loop
+        yield loop.wait_groups(wait, no_wait)
+        threads = root.resources['threads']
+        if threads.pending(wait, no_wait):
+            yield loop.run_in_executor(threads.wait, wait, no_wait)
+        yield perform(obj, *args, **kwargs)
 
     update_wrapper(wrapper, perform)
 
     return wrapper
+
+
+def _report_crash(obj, function):
+    """Log an unhandled exception and stop the measure.
+
+    """
+    log = logging.getLogger(function.__module__)
+    msg = 'The following unhandled exception occured in %s :'
+    log.exception(msg % obj.name)
+    obj.root.should_stop.set()
+    obj.root.errors['unhandled'] = msg % obj.name + '\n' + format_exc()
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015 by Ecpy Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Static analysis of the database entries read and written by tasks.
+
+A task is considered to read the entries referenced between '{' and '}' in
+its members tagged with 'fmt' or 'feval' (and those of its interfaces) and to
+write the entries it declares in database_entries.
+
+"""
+from __future__ import (division, unicode_literals, print_function,
+                        absolute_import)
+
+from atom.api import Atom, Dict, List
+
+from .string_evaluation import split_fields
+
+
+class TaskDependencies(Atom):
+    """Read/write dependencies between the tasks of a hierarchy.
+
+    Tasks are identified by their full path (path + '/' + name) and entries by
+    their full path once access exceptions are resolved.
+
+    """
+    #: Identifiers of the tasks in the order in which they are executed.
+    tasks = List()
+
+    #: Entries read by each task.
+    reads = Dict()
+
+    #: Entries written by each task.
+    writes = Dict()
+
+    #: Fields referenced by each task which do not match any entry.
+    unresolved = Dict()
+
+    #: Execution pools in which each task runs : the pools of the task and of
+    #: its ancestors which are executed in parallel, innermost first.
+    pools = Dict()
+
+    #: Pools each task waits on before being executed.
+    waits = Dict()
+
+    def get_readers(self, entry):
+        """List the tasks reading an entry.
+
+        """
+        return [t for t in self.tasks if entry in self.reads[t]]
+
+    def get_writers(self, entry):
+        """List the tasks writing an entry.
+
+        """
+        return [t for t in self.tasks if entry in self.writes[t]]
+
+    def get_read_entries(self):
+        """Set of all the entries read by at least one task.
+
+        """
+        return set().union(*self.reads.values())
+
+    def get_written_entries(self):
+        """Set of all the entries written by at least one task.
+
+        This is the set of entries worth observing when monitoring a measure.
+
+        """
+        return set().union(*self.writes.values())
+
+    def get_graph(self):
+        """Build the dependency graph between tasks.
+
+        Returns
+        -------
+        graph : dict
+            Dict mapping each writer task to a dict mapping the tasks reading
+            the entries it writes to the set of those entries.
+
+        """
+        graph = {}
+        for writer in self.tasks:
+            written = self.writes[writer]
+            if not written:
+                continue
+            for reader in self.tasks:
+                common = written & self.reads[reader]
+                if reader != writer and common:
+                    graph.setdefault(writer, {})[reader] = common
+
+        return graph
+
+    def find_races(self):
+        """Find the entries which may be accessed concurrently.
+
+        Two accesses to the same entry, at least one of them being a write,
+        race if the task executed first runs in a pool in which the second
+        one does not run, and if no task waits on that pool in between. Loops
+        are not unrolled, so accesses in different iterations are not
+        considered.
+
+        Returns
+        -------
+        races : list
+            List of (entry, first task, second task, pool) tuples.
+
+        """
+        races = []
+        tasks = self.tasks
+        for i, first in enumerate(tasks):
+            pools = self.pools[first]
+            if not pools:
+                continue
+            accessed = self.reads[first] | self.writes[first]
+            for j in range(i + 1, len(tasks)):
+                second = tasks[j]
+                for pool in pools:
+                    if pool in self.pools[second]:
+                        continue
+                    if any(pool in self.waits[tasks[k]]
+                           for k in range(i + 1, j + 1)):
+                        continue
+                    conflicts = ((self.writes[first] &
+                                  (self.reads[second] | self.writes[second])) |
+                                 (accessed & self.writes[second]))
+                    for entry in sorted(conflicts):
+                        races.append((entry, first, second, pool))
+
+        return races
+
+
+def analyse_dependencies(root):
+    """Analyse the database entries read and written by a hierarchy of tasks.
+
+    This works both in edition and running mode.
+
+    Parameters
+    ----------
+    root : BaseTask
+        Root of the hierarchy to analyse. This can be any task attached to a
+        root task.
+
+    Returns
+    -------
+    dependencies : TaskDependencies
+        Result of the analysis.
+
+    """
+    database = root.database
+    all_pools = set()
+    tasks = []
+    reads = {}
+    writes = {}
+    unresolved = {}
+    pools = {}
+    task_pools = {}
+
+    # traverse yields the tasks in execution order, parents first.
+    for task in root.traverse():
+        if not hasattr(task, 'database_entries') or not hasattr(task, 'path'):
+            continue
+        t_id = task.path + '/' + task.name
+        tasks.append(t_id)
+
+        read = set()
+        missing = set()
+        for _, _, string, _ in task.gather_formatted_strings():
+            for field in split_fields(string)[1]:
+                try:
+                    read.add(database.resolve_entry_path(task.path, field))
+                except KeyError:
+                    missing.add(field)
+        reads[t_id] = read
+        unresolved[t_id] = missing
+
+        writes[t_id] = set(database.resolve_entry_path(task.path,
+                                                       task._task_entry(e))
+                           for e in task.database_entries)
+
+        own = ()
+        if task.parallel.get('activated') and task.parallel.get('pool'):
+            own = (task.parallel['pool'],)
+            all_pools.add(task.parallel['pool'])
+        parent = task.parent if task is not root else None
+        task_pools[task] = own + (task_pools.get(parent, ()))
+        pools[t_id] = task_pools[task]
+
+    waits = {}
+    for task in task_pools:
+        t_id = task.path + '/' + task.name
+        wait = task.wait
+        if not wait.get('activated'):
+            waits[t_id] = set()
+        elif wait.get('wait'):
+            waits[t_id] = set(wait['wait'])
+        elif wait.get('no_wait'):
+            waits[t_id] = all_pools - set(wait['no_wait'])
+        else:
+            waits[t_id] = set(all_pools)
+
+    return TaskDependencies(tasks=tasks, reads=reads, writes=writes,
+                            unresolved=unresolved, pools=pools, waits=waits)
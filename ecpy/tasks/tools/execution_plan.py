@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015 by Ecpy Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Flat execution plan of a task hierarchy.
+
+Instead of recursing through the perform_ methods of the tasks, a hierarchy
+can be compiled into a linear list of instructions with explicit jump targets
+which is run by a small interpreter (see RootTask.use_execution_plan). Each
+task emits its own instructions through its compile_plan method.
+
+Instructions are tuples whose first element is the opcode :
+
+- CALL, function : call the function without arguments.
+- CHECK, target : stop-check point, jump to target if the execution should
+  stop (see handle_stop_pause).
+- WAIT, pools, excluded : wait for pools to complete their work (see
+  ThreadPoolResource.wait).
+- JUMP, target : jump to target.
+- JUMP_IF, function, argument, target : jump to target if
+  function(argument) is true.
+- JUMP_IF_NOT, function, argument, target : jump to target if
+  function(argument) is false.
+- LOOP_START, slot, factory : store the iterator returned by factory in
+  slot.
+- LOOP_NEXT, slot, target, function : advance the iterator stored in slot
+  and call function with the value if function is not None. Jump to target
+  when the iterator is exhausted.
+- LOOP_BREAK, slot : send True to the iterator stored in slot to signal it
+  the loop is broken.
+- LOOP_END, slot : discard the iterator stored in slot.
+
+The iterators used by loops are generators yielding the loop values. Loops
+also register handlers redirecting the exceptions raised in their body (such
+as the ones used for break and continue) to jump targets.
+
+"""
+from __future__ import (division, unicode_literals, print_function,
+                        absolute_import)
+
+
+CALL = 0
+CHECK = 1
+WAIT = 2
+JUMP = 3
+JUMP_IF = 4
+JUMP_IF_NOT = 5
+LOOP_START = 6
+LOOP_NEXT = 7
+LOOP_BREAK = 8
+LOOP_END = 9
+
+
+class ExecutionPlan(object):
+    """Linear list of instructions executing a task hierarchy.
+
+    Parameters
+    ----------
+    root : RootTask
+        Root of the hierarchy to compile.
+
+    """
+    def __init__(self, root):
+        self.root = root
+
+        #: Instructions as lists till the plan is finalized, as tuples after.
+        self.instructions = []
+
+        #: Number of slots needed to store the loop iterators.
+        self.slots = 0
+
+        #: Handlers of each instruction, from the innermost to the outermost
+        #: loop (see find_handler).
+        self.handlers = []
+
+        self._loops = []
+        self._ranges = []
+
+    @classmethod
+    def compile(cls, root):
+        """Compile the children of a root task.
+
+        """
+        plan = cls(root)
+        for child in root.children:
+            child.compile_plan(plan)
+        plan._finalize()
+        return plan
+
+    @property
+    def position(self):
+        """Index of the next instruction.
+
+        """
+        return len(self.instructions)
+
+    def emit(self, opcode, *args):
+        """Append an instruction to the plan.
+
+        Returns
+        -------
+        index : int
+            Index of the instruction, to use to set its jump target later.
+
+        """
+        self.instructions.append([opcode] + list(args))
+        return len(self.instructions) - 1
+
+    def set_target(self, index, target=None):
+        """Set the jump target of an instruction.
+
+        Parameters
+        ----------
+        index : int
+            Index of the instruction.
+
+        target : int, optional
+            Index to jump to. Defaults to the position of the next instruction
+            to be emitted.
+
+        """
+        instruction = self.instructions[index]
+        target = self.position if target is None else target
+        position = 3 if instruction[0] in (JUMP_IF, JUMP_IF_NOT) else \
+            2 if instruction[0] == LOOP_NEXT else 1
+        instruction[position] = target
+
+    def compile_task(self, task, compile_body):
+        """Compile a task performed in the current thread.
+
+        Emit the stop-check point and the wait of the task before its body
+        if the task is stoppable or waits. Tasks executed in parallel and
+        tasks whose perform_ method was not built by BaseTask.prepare are
+        simply called.
+
+        Parameters
+        ----------
+        task : BaseTask
+            Task to compile.
+
+        compile_body : callable
+            Callable emitting the instructions corresponding to the perform
+            method of the task.
+
+        """
+        perform_func = getattr(task.perform_, '__func__', None)
+        if (task.parallel.get('activated') or perform_func is None or
+                perform_func is not task._prepared_perform):
+            self.emit(CALL, task.perform_)
+            return
+
+        check = self.emit(CHECK, None) if task.stoppable else None
+        wait = task.wait
+        if wait.get('activated'):
+            if wait.get('wait'):
+                self.emit(WAIT, tuple(wait['wait']), None)
+            elif wait.get('no_wait'):
+                self.emit(WAIT, None, tuple(wait['no_wait']))
+            else:
+                self.emit(WAIT, None, None)
+
+        compile_body()
+
+        if check is not None:
+            self.set_target(check)
+
+    def compile_loop(self, factory, compile_body, handlers, function=None):
+        """Compile a loop.
+
+        Parameters
+        ----------
+        factory : callable
+            Callable returning a generator yielding the loop values. After
+            the last iteration of a broken loop, the generator is sent True
+            and should then return.
+
+        compile_body : callable
+            Callable emitting the instructions of the body of the loop.
+
+        handlers : dict
+            Mapping between the exceptions which may be raised in the body and
+            the action to take : 'break' or 'continue'.
+
+        function : callable, optional
+            Callable to call with the loop value at the beginning of each
+            iteration, outside of the body.
+
+        """
+        slot = self.slots
+        self.slots += 1
+        start = self.emit(LOOP_START, slot, factory)
+        next_ = self.emit(LOOP_NEXT, slot, None, function)
+
+        loop = {'break': [], 'continue': next_}
+        self._loops.append(loop)
+        body_start = self.position
+        compile_body()
+        body_end = self.position
+        self._loops.pop()
+
+        self.emit(JUMP, next_)
+        break_ = self.emit(LOOP_BREAK, slot)
+        end = self.emit(LOOP_END, slot)
+        self.set_target(next_, end)
+        for index in loop['break']:
+            self.set_target(index, break_)
+
+        targets = tuple((exc, break_ if action == 'break' else next_)
+                        for exc, action in handlers.items())
+        self._ranges.append((start, end, body_start, body_end, slot, targets))
+
+    def compile_jump_out(self, action, function, argument):
+        """Compile a conditional break or continue of the innermost loop.
+
+        Parameters
+        ----------
+        action : {'break', 'continue'}
+            Kind of jump.
+
+        function : callable
+            Function called with argument to determine whether to jump.
+
+        argument : object
+            Argument of the function.
+
+        Returns
+        -------
+        compiled : bool
+            False if there is no enclosing loop in the plan, in which case
+            no instruction is emitted.
+
+        """
+        if not self._loops:
+            return False
+
+        loop = self._loops[-1]
+        if action == 'break':
+            loop['break'].append(self.emit(JUMP_IF, function, argument,
+                                           None))
+        else:
+            self.emit(JUMP_IF, function, argument, loop['continue'])
+        return True
+
+    def find_handler(self, index, exc, iterators):
+        """Find where to jump when an instruction raised an exception.
+
+        The iterators of the loops exited because of the exception are
+        closed.
+
+        Parameters
+        ----------
+        index : int
+            Index of the instruction which raised.
+
+        exc : Exception
+            Exception raised.
+
+        iterators : list
+            Iterators of the running loops, by slot.
+
+        Returns
+        -------
+        target : int or None
+            Index to jump to, None if the exception is not handled by the
+            plan.
+
+        """
+        for body_start, body_end, slot, targets in self.handlers[index]:
+            if body_start <= index < body_end:
+                for exc_class, target in targets:
+                    if isinstance(exc, exc_class):
+                        return target
+            iterator = iterators[slot]
+            if iterator is not None:
+                iterators[slot] = None
+                iterator.close()
+
+        return None
+
+    # =========================================================================
+    # --- Private API ---------------------------------------------------------
+    # =========================================================================
+
+    def _finalize(self):
+        """Convert the instructions to tuples and build the handlers table.
+
+        """
+        self.instructions = [tuple(i) for i in self.instructions]
+        handlers = [[] for _ in self.instructions]
+        # Loops are registered from the innermost to the outermost so the
+        # handlers are naturally ordered.
+        for start, end, body_start, body_end, slot, targets in self._ranges:
+            for index in range(start, end + 1):
+                handlers[index].append((body_start, body_end, slot, targets))
+        self.handlers = [tuple(h) for h in handlers]
+
@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015 by Ecpy Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Storages used by the task database in running mode.
+
+By default the flattened database is a simple list. The storages defined here
+keep numeric entries in numpy arrays, possibly located in a memory mapped file
+so that other processes can read the values without any communication.
+
+"""
+from __future__ import (division, unicode_literals, print_function,
+                        absolute_import)
+
+import os
+import mmap
+import logging
+from numbers import Integral
+
+import numpy as np
+from atom.api import Atom, Dict, List, Value, Unicode, Signal, Int
+
+
+#: Numpy types used to store numeric entries by kind when using typed storage.
+NUMERIC_DTYPES = {'bool': np.bool_, 'int': np.int64, 'float': np.float64,
+                  'complex': np.complex128}
+
+
+def numeric_kind(value):
+    """Determine the kind of numpy column in which a value can be stored.
+
+    Parameters
+    ----------
+    value : any
+        Value which should be stored in the database.
+
+    Returns
+    -------
+    kind : unicode or None
+        Kind of column ('bool', 'int', 'float', 'complex') or None if the value
+        should be stored as a Python object.
+
+    """
+    if isinstance(value, (bool, np.bool_)):
+        return 'bool'
+    elif isinstance(value, Integral):
+        return 'int' if -2**63 <= value < 2**63 else None
+    elif isinstance(value, (float, np.floating)):
+        return 'float'
+    elif isinstance(value, (complex, np.complexfloating)):
+        return 'complex'
+    return None
+
+
+class TypedFlatStorage(Atom):
+    """Flat storage keeping numeric entries in contiguous numpy arrays.
+
+    Entries whose initial value is numeric are stored in a numpy array per
+    kind of number, other entries are stored as Python objects. If a value of
+    another type is later written in a numeric entry, the entry is moved to
+    the object storage.
+
+    Parameters
+    ----------
+    values : list
+        Initial values of the entries.
+
+    """
+    #: Numpy arrays storing the numeric entries by kind.
+    columns = Dict()
+
+    #: Location of each entry: (array, position, kind) or None if the entry is
+    #: stored as a Python object.
+    locations = List()
+
+    #: Values of the entries stored as Python objects.
+    objects = List()
+
+    def __init__(self, values):
+        super(TypedFlatStorage, self).__init__()
+        kinds = [numeric_kind(v) for v in values]
+        columns = self._create_columns({k: kinds.count(k)
+                                        for k in NUMERIC_DTYPES if k in kinds},
+                                       len(values))
+        positions = dict.fromkeys(columns, 0)
+        locations = []
+        for value, kind in zip(values, kinds):
+            if kind is None:
+                locations.append(None)
+            else:
+                column = columns[kind]
+                column[positions[kind]] = value
+                locations.append((column, positions[kind], kind))
+                positions[kind] += 1
+
+        self.columns = columns
+        self.locations = locations
+        self.objects = [v if k is None else None
+                        for v, k in zip(values, kinds)]
+
+    def take(self, indexes):
+        """Get the values of several entries.
+
+        Values stored in the same column are gathered using a single numpy
+        indexing operation.
+
+        """
+        locations = self.locations
+        objects = self.objects
+        values = [None]*len(indexes)
+        gather = {}
+        for n, index in enumerate(indexes):
+            loc = locations[index]
+            if loc is None:
+                values[n] = objects[index]
+            else:
+                ns, ps = gather.setdefault(loc[2], ([], []))
+                ns.append(n)
+                ps.append(loc[1])
+
+        columns = self.columns
+        for kind, (ns, ps) in gather.items():
+            for n, value in zip(ns, columns[kind][ps].tolist()):
+                values[n] = value
+
+        return values
+
+    def copy_columns(self):
+        """Copy the numpy arrays holding the numeric entries.
+
+        """
+        return {k: c.copy() for k, c in self.columns.items()}
+
+    def layout(self):
+        """Location of the entries stored in numpy arrays.
+
+        Returns
+        -------
+        layout : dict
+            Mapping between the indexes of the entries stored in a numpy array
+            and their location as a (kind, position) tuple.
+
+        """
+        return {i: (loc[2], loc[1]) for i, loc in enumerate(self.locations)
+                if loc is not None}
+
+    def __getitem__(self, index):
+        loc = self.locations[index]
+        if loc is None:
+            return self.objects[index]
+        return loc[0].item(loc[1])
+
+    def __setitem__(self, index, value):
+        loc = self.locations[index]
+        if loc is not None:
+            if numeric_kind(value) == loc[2]:
+                loc[0][loc[1]] = value
+                return
+            self._demote(index)
+        self.objects[index] = value
+
+    def __len__(self):
+        return len(self.locations)
+
+    # =========================================================================
+    # --- Private API ---------------------------------------------------------
+    # =========================================================================
+
+    def _create_columns(self, counts, total):
+        """Create the numpy arrays used to store the numeric entries.
+
+        Parameters
+        ----------
+        counts : dict
+            Number of entries to store by kind.
+
+        total : int
+            Total number of entries (numeric or not).
+
+        """
+        return {k: np.empty(n, dtype=NUMERIC_DTYPES[k])
+                for k, n in counts.items()}
+
+    def _demote(self, index):
+        """Move an entry from the numpy arrays to the object storage.
+
+        """
+        self.locations[index] = None
+
+
+class SharedFlatStorage(TypedFlatStorage):
+    """Typed storage whose numpy arrays live in a memory mapped file.
+
+    Other processes can read the numeric values using a SharedStorageReader
+    built from the informations returned by the infos method.
+
+    Parameters
+    ----------
+    values : list
+        Initial values of the entries.
+
+    path : unicode
+        Path of the file to create and map in memory.
+
+    """
+    #: Path of the memory mapped file.
+    path = Unicode()
+
+    #: Per entry flag set to 1 when the value stored in the arrays is valid.
+    valid = Value()
+
+    #: Signal emitted with the index of an entry moved to the object storage.
+    demoted = Signal()
+
+    def __init__(self, values, path):
+        self.path = path
+        super(SharedFlatStorage, self).__init__(values)
+        valid = self.valid
+        for i, loc in enumerate(self.locations):
+            valid[i] = loc is not None
+
+    def infos(self):
+        """Informations needed to read the numeric values in another process.
+
+        Returns
+        -------
+        infos : dict
+            Dictionary containing the path of the file ('path'), its size
+            ('size'), the offset and length of each array ('columns') and of
+            the validity flags ('valid').
+
+        """
+        return {'path': self.path, 'size': self._size,
+                'columns': self._offsets.copy(),
+                'valid': self._offsets_valid}
+
+    def close(self):
+        """Unmap and remove the memory mapped file.
+
+        The storage cannot be used anymore after this call.
+
+        """
+        self.columns = {}
+        self.locations = []
+        self.valid = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            logger = logging.getLogger(__name__)
+            logger.debug('Failed to remove shared database file %s',
+                         self.path)
+
+    # =========================================================================
+    # --- Private API ---------------------------------------------------------
+    # =========================================================================
+
+    #: Open file backing the memory map.
+    _file = Value()
+
+    #: Memory map in which the numpy arrays are allocated.
+    _mmap = Value()
+
+    #: Size of the memory map in bytes.
+    _size = Int()
+
+    #: Offset and length of each array in the memory map.
+    _offsets = Dict()
+
+    #: Offset and length of the validity flags array in the memory map.
+    _offsets_valid = Value()
+
+    def _create_columns(self, counts, total):
+        """Allocate the numpy arrays and the validity flags in a memory mapped
+        file.
+
+        """
+        offsets = {}
+        size = 0
+        for kind in sorted(counts):
+            offsets[kind] = (size, counts[kind])
+            nbytes = counts[kind]*np.dtype(NUMERIC_DTYPES[kind]).itemsize
+            # Keep all arrays aligned on 16 bytes.
+            size += nbytes + (-nbytes % 16)
+
+        # mmap does not support empty maps hence the max.
+        self._offsets = offsets
+        self._offsets_valid = (size, total)
+        self._size = size + max(total, 1)
+        self._file = open(self.path, 'w+b')
+        self._file.truncate(self._size)
+        self._mmap = mmap.mmap(self._file.fileno(), self._size)
+        self.valid = np.frombuffer(self._mmap, np.uint8, total, size)
+        return {k: np.frombuffer(self._mmap, NUMERIC_DTYPES[k], n, off)
+                for k, (off, n) in offsets.items()}
+
+    def _demote(self, index):
+        """Mark the entry as invalid in the shared arrays and notify it.
+
+        """
+        super(SharedFlatStorage, self)._demote(index)
+        self.valid[index] = 0
+        self.demoted(index)
+
+
+class SharedStorageReader(Atom):
+    """Read only access to the numeric entries of a SharedFlatStorage.
+
+    This is meant to be used in a different process than the one running the
+    tasks.
+
+    Parameters
+    ----------
+    infos : dict
+        Informations describing the shared storage as returned by
+        TaskDatabase.get_shared_storage_infos.
+
+    """
+    #: Mapping between the entries path and their location as a
+    #: (kind, position, index) tuple.
+    entries = Dict()
+
+    def __init__(self, infos):
+        super(SharedStorageReader, self).__init__(entries=infos['entries'])
+        self._file = open(infos['path'], 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), infos['size'],
+                               access=mmap.ACCESS_READ)
+        columns = {k: np.frombuffer(self._mmap, NUMERIC_DTYPES[k], n, off)
+                   for k, (off, n) in infos['columns'].items()}
+        offset, count = infos['valid']
+        self._valid = np.frombuffer(self._mmap, np.uint8, count, offset)
+
+        gathers = {}
+        for path, (kind, position, index) in self.entries.items():
+            paths, positions, indexes = gathers.setdefault(kind, ([], [], []))
+            paths.append(path)
+            positions.append(position)
+            indexes.append(index)
+        self._gathers = [(columns[k], np.array(pos, dtype=np.intp),
+                          np.array(ind, dtype=np.intp), paths)
+                         for k, (paths, pos, ind) in gathers.items()]
+
+    def read(self):
+        """Read the current value of all the entries.
+
+        Returns
+        -------
+        values : dict
+            Mapping between the entries path and their current value. Entries
+            which are not stored in the shared arrays anymore are omitted.
+
+        """
+        values = {}
+        valid = self._valid
+        for column, positions, indexes, paths in self._gathers:
+            flags = valid[indexes].tolist()
+            for path, value, flag in zip(paths, column[positions].tolist(),
+                                         flags):
+                if flag:
+                    values[path] = value
+
+        return values
+
+    def close(self):
+        """Unmap the shared file.
+
+        """
+        self._gathers = []
+        self._valid = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+        self._file.close()
+
+    # =========================================================================
+    # --- Private API ---------------------------------------------------------
+    # =========================================================================
+
+    #: Open file backing the memory map.
+    _file = Value()
+
+    #: Read only memory map of the file.
+    _mmap = Value()
+
+    #: Validity flags of the entries.
+    _valid = Value()
+
+    #: Arrays, positions in the arrays, flat indexes and paths of the entries
+    #: grouped by kind.
+    _gathers = List()
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015 by Ecpy Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Events used to interrupt the execution of a task hierarchy.
+
+The inter-process events asking a measure to stop or pause are checked before
+every stoppable task. To make this check cheap, each event is wrapped in an
+InterruptionEvent keeping an in-process copy of its state. This copy is
+updated immediately when the event is set or cleared through the wrapper and
+is kept in sync with the changes made by other processes by an
+InterruptionWatcher.
+
+"""
+from __future__ import (division, unicode_literals, print_function,
+                        absolute_import)
+
+from multiprocessing import Event
+from threading import Condition, Lock, Thread
+from time import sleep
+
+
+#: Period (in s) at which the watcher polls the inter-process events when they
+#: do not share a changed event. Changes made by other processes are hence
+#: mirrored with a latency of up to WATCH_PERIOD. Sharing a changed event
+#: (see InterruptionEvent) lets the watcher block instead and mirror them
+#: immediately.
+WATCH_PERIOD = 0.01
+
+
+class InterruptionEvent(object):
+    """Inter-process event keeping an in-process copy of its state.
+
+    Parameters
+    ----------
+    event : multiprocessing.Event, optional
+        Inter-process event to wrap. If None, a new one is created.
+
+    changed : multiprocessing.Event, optional
+        Inter-process event set each time the state of the event changes.
+        Every process modifying the event should set it after doing so.
+
+    """
+    __slots__ = ('event', 'flag', 'changed', 'condition')
+
+    def __init__(self, event=None, changed=None):
+        #: Wrapped inter-process event.
+        self.event = event if event is not None else Event()
+
+        #: In-process copy of the state of the event. Reading it is cheap but
+        #: the changes made by other processes are reflected only while an
+        #: InterruptionWatcher watches the event.
+        self.flag = self.event.is_set()
+
+        #: Inter-process event set when the state of the event changes.
+        self.changed = changed
+
+        #: Condition notified each time the in-process state changes. Events
+        #: waited for together should share it (see link_events).
+        self.condition = Condition(Lock())
+
+    def set(self):
+        """Set the event.
+
+        """
+        with self.condition:
+            self.event.set()
+            self.flag = True
+            self.condition.notify_all()
+        if self.changed is not None:
+            self.changed.set()
+
+    def clear(self):
+        """Clear the event.
+
+        """
+        with self.condition:
+            self.event.clear()
+            self.flag = False
+            self.condition.notify_all()
+        if self.changed is not None:
+            self.changed.set()
+
+    def is_set(self):
+        """Whether the event is set, queried from the inter-process event.
+
+        """
+        return self.event.is_set()
+
+    def wait(self, timeout=None):
+        """Wait for the inter-process event to be set.
+
+        """
+        return self.event.wait(timeout)
+
+    def wait_cleared(self, other):
+        """Block till this event is cleared or another one is set.
+
+        Both events must share the same condition (see link_events).
+
+        Parameters
+        ----------
+        other : InterruptionEvent
+            Event whose setting should interrupt the wait.
+
+        Returns
+        -------
+        other_set : bool
+            Whether the method returned because the other event was set.
+
+        """
+        condition = self.condition
+        with condition:
+            while self.flag and not other.flag:
+                condition.wait()
+            return other.flag
+
+
+def link_events(*events):
+    """Make interruption events share the condition notified on changes.
+
+    """
+    condition = events[0].condition
+    for event in events[1:]:
+        event.condition = condition
+
+
+class InterruptionWatcher(object):
+    """Thread mirroring the changes of the stop and pause events made by
+    other processes.
+
+    If both events share the same changed event, the thread blocks till it is
+    set. Otherwise it polls the events every WATCH_PERIOD.
+
+    Parameters
+    ----------
+    stop : InterruptionEvent
+        Event signaling the execution should stop.
+
+    pause : InterruptionEvent
+        Event signaling the execution should pause.
+
+    """
+    def __init__(self, stop, pause):
+        link_events(stop, pause)
+        self.stop = stop
+        self.pause = pause
+        self._changed = (stop.changed if stop.changed is pause.changed
+                         else None)
+        self._closed = False
+        self._thread = Thread(target=self._watch, name='InterruptionWatcher')
+        self._thread.daemon = True
+
+    def start(self):
+        """Start watching the events.
+
+        """
+        self._thread.start()
+
+    def close(self):
+        """Stop watching the events.
+
+        When polling, the thread exits the next time it wakes up, hence in at
+        most WATCH_PERIOD.
+
+        """
+        self._closed = True
+        if self._changed is not None:
+            self._changed.set()
+        self._thread.join()
+
+    # =========================================================================
+    # --- Private API ---------------------------------------------------------
+    # =========================================================================
+
+    def _watch(self):
+        """Wait for changes of the events and mirror them.
+
+        """
+        stop = self.stop
+        pause = self.pause
+        changed = self._changed
+        condition = stop.condition
+        while not self._closed:
+            if changed is not None:
+                # The changed event is cleared before reading the states so
+                # that no change made after the reading can be missed.
+                changed.wait()
+                changed.clear()
+            elif stop.flag:
+                sleep(WATCH_PERIOD)
+            elif pause.flag:
+                stop.event.wait(WATCH_PERIOD)
+            else:
+                pause.event.wait(WATCH_PERIOD)
+
+            with condition:
+                modified = False
+                for event in (stop, pause):
+                    state = event.event.is_set()
+                    if state != event.flag:
+                        event.flag = state
+                        modified = True
+                if modified:
+                    condition.notify_all()
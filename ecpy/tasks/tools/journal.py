@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015 by Ecpy Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Binary journal of the values written in the database in running mode.
+
+The journal starts with a header made of the MAGIC bytes, the length of the
+JSON encoded list of the entries full path, and that list. Each write is then
+stored as a record made of a RECORD header (entry index, timestamp, type code
+and payload length) followed by the payload.
+
+"""
+from __future__ import (division, unicode_literals, print_function,
+                        absolute_import)
+
+import json
+import mmap
+import struct
+import logging
+from numbers import Integral, Number
+from collections import deque
+from threading import Thread, Event
+from timeit import default_timer
+
+import numpy as np
+from future.utils import PY2
+from atom.api import Atom, Unicode, Float, Bool, Value, List, Dict
+
+if PY2:
+    import cPickle as pickle
+else:
+    import pickle
+
+
+#: Magic bytes identifying a journal file.
+MAGIC = b'ECPYJNL1'
+
+#: Header of the journal : magic bytes and length of the entries list.
+HEADER = struct.Struct(str('<8sI'))
+
+#: Header of a record : entry index, timestamp, type code, payload length.
+RECORD = struct.Struct(str('<IdBI'))
+
+#: Type codes of the payloads.
+FLOAT, INT, BOOL, COMPLEX, ARRAY, PICKLE, TEXT, BYTES = range(8)
+
+_DOUBLE = struct.Struct(str('<d'))
+_INT = struct.Struct(str('<q'))
+_BOOL = struct.Struct(str('<?'))
+_COMPLEX = struct.Struct(str('<dd'))
+_ARRAY = struct.Struct(str('<B'))
+
+#: Types whose values can be queued as is (checked before the slower
+#: isinstance checks).
+_IMMUTABLE_TYPES = frozenset((bool, int, float, complex, type(''), type(b''),
+                              type(2**70)))
+
+
+def encode_value(value):
+    """Encode a value as a type code and a payload.
+
+    Numpy arrays of numbers are stored raw, preceded by their dtype and shape.
+    Values which are not numbers, strings or arrays are pickled.
+
+    """
+    if isinstance(value, (bool, np.bool_)):
+        return BOOL, _BOOL.pack(value)
+    elif isinstance(value, Integral) and -2**63 <= value < 2**63:
+        return INT, _INT.pack(value)
+    elif isinstance(value, (float, np.floating)):
+        return FLOAT, _DOUBLE.pack(value)
+    elif isinstance(value, (complex, np.complexfloating)):
+        return COMPLEX, _COMPLEX.pack(value.real, value.imag)
+    elif isinstance(value, np.ndarray) and not value.dtype.hasobject:
+        dtype = value.dtype.str.encode('ascii')
+        shape = struct.pack(str('<%dq' % value.ndim), *value.shape)
+        return ARRAY, b''.join([_ARRAY.pack(len(dtype)), dtype,
+                                _ARRAY.pack(value.ndim), shape,
+                                np.ascontiguousarray(value).tostring()])
+    elif isinstance(value, type('')):
+        return TEXT, value.encode('utf-8')
+    elif isinstance(value, type(b'')):
+        return BYTES, value
+    return PICKLE, pickle.dumps(value, 2)
+
+
+def decode_value(code, payload):
+    """Decode a payload encoded by encode_value.
+
+    """
+    if code == FLOAT:
+        return _DOUBLE.unpack(payload)[0]
+    elif code == INT:
+        return _INT.unpack(payload)[0]
+    elif code == BOOL:
+        return _BOOL.unpack(payload)[0]
+    elif code == COMPLEX:
+        return complex(*_COMPLEX.unpack(payload))
+    elif code == ARRAY:
+        length = _ARRAY.unpack_from(payload)[0]
+        dtype = np.dtype(payload[1:1+length].decode('ascii'))
+        ndim = _ARRAY.unpack_from(payload, 1+length)[0]
+        start = 2 + length
+        shape = struct.unpack_from(str('<%dq' % ndim), payload, start)
+        data = payload[start+8*ndim:]
+        return np.frombuffer(data, dtype).reshape(shape).copy()
+    elif code == TEXT:
+        return payload.decode('utf-8')
+    elif code == BYTES:
+        return payload
+    return pickle.loads(payload)
+
+
+class DatabaseJournal(Atom):
+    """Recorder appending the writes made in a database to a binary file.
+
+    Writes are queued by record and encoded and written to the file by a
+    background thread every flush_period seconds. If writing the file fails
+    the error is logged and the following records are dropped.
+
+    Parameters
+    ----------
+    path : unicode
+        Path of the journal file. An existing file is overwritten.
+
+    paths : list
+        Full path of the entries of the flat database.
+
+    flush_period : float, optional
+        Time in seconds between two flushes of the queued records.
+
+    """
+    #: Path of the journal file.
+    path = Unicode()
+
+    #: Time in seconds between two flushes of the queued records.
+    flush_period = Float(0.1)
+
+    def __init__(self, path, paths, flush_period=0.1):
+        super(DatabaseJournal, self).__init__(path=path,
+                                              flush_period=flush_period)
+        self._queue = deque()
+        self._file = open(path, 'wb')
+        header = json.dumps(list(paths)).encode('utf-8')
+        self._file.write(HEADER.pack(MAGIC, len(header)) + header)
+        self._stop = Event()
+        self._thread = Thread(target=self._flush_loop,
+                              name='DatabaseJournal')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def record(self, index, value):
+        """Queue a write to be written in the journal.
+
+        Equivalent to append(index, freeze(value)).
+
+        Parameters
+        ----------
+        index : int
+            Index of the entry in the flat database.
+
+        value : any
+            Value written in the entry.
+
+        """
+        self.append(index, self.freeze(value))
+
+    def freeze(self, value):
+        """Capture a value so that later in place modifications are not
+        recorded.
+
+        Numpy arrays are copied and objects which are not numbers or strings
+        are pickled. This is the costly part of recording a write, which the
+        database does before acquiring its lock.
+
+        """
+        if type(value) not in _IMMUTABLE_TYPES:
+            if isinstance(value, np.ndarray):
+                value = value.copy()
+            elif not isinstance(value, (Number, type(''), type(b''),
+                                        np.bool_)):
+                value = _Pickled(pickle.dumps(value, 2))
+        return value
+
+    def append(self, index, value):
+        """Queue a write whose value was captured by freeze.
+
+        The write is timestamped when queued, so that the records are ordered
+        as the calls to this method.
+
+        """
+        if not self._failed:
+            self._queue.append((index, default_timer(), value))
+
+    def close(self):
+        """Write the queued records and close the file.
+
+        """
+        self._stop.set()
+        self._thread.join()
+        if not self._failed:
+            self._flush()
+        self._file.close()
+
+    # =========================================================================
+    # --- Private API ---------------------------------------------------------
+    # =========================================================================
+
+    #: Records waiting to be written.
+    _queue = Value()
+
+    #: Journal file.
+    _file = Value()
+
+    #: Event used to stop the flushing thread.
+    _stop = Value()
+
+    #: Thread periodically writing the queued records.
+    _thread = Value()
+
+    #: Whether writing the file failed, in which case the records are
+    #: dropped.
+    _failed = Bool()
+
+    def _flush_loop(self):
+        """Write the queued records until the journal is closed.
+
+        """
+        while not self._stop.wait(self.flush_period):
+            try:
+                self._flush()
+            except Exception:
+                logger = logging.getLogger(__name__)
+                logger.exception('Failed to write the database journal %s, '
+                                 'the following writes are not recorded.',
+                                 self.path)
+                # Records are not queued anymore so that the queue does not
+                # grow till the end of the measure.
+                self._failed = True
+                self._queue.clear()
+                return
+
+    def _flush(self):
+        """Encode and write the queued records.
+
+        """
+        queue = self._queue
+        chunks = []
+        pack = RECORD.pack
+        while queue:
+            index, timestamp, value = queue.popleft()
+            if isinstance(value, _Pickled):
+                code, payload = PICKLE, value.payload
+            else:
+                code, payload = encode_value(value)
+            chunks.append(pack(index, timestamp, code, len(payload)))
+            chunks.append(payload)
+        if chunks:
+            self._file.write(b''.join(chunks))
+            self._file.flush()
+
+
+class _Pickled(object):
+    """Marker of a value already pickled when it was recorded.
+
+    """
+    __slots__ = ('payload',)
+
+    def __init__(self, payload):
+        self.payload = payload
+
+
+class JournalReader(Atom):
+    """Memory mapped reader of a database journal.
+
+    Parameters
+    ----------
+    path : unicode
+        Path of the journal file.
+
+    """
+    #: Path of the journal file.
+    path = Unicode()
+
+    #: Full path of the entries of the flat database.
+    paths = List()
+
+    #: Time series of the entries by full path (see read).
+    series = Dict()
+
+    def __init__(self, path):
+        super(JournalReader, self).__init__(path=path)
+        with open(path, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, length = HEADER.unpack_from(buf)
+            if magic != MAGIC:
+                raise ValueError('{} is not a database journal'.format(path))
+            start = HEADER.size
+            self.paths = json.loads(buf[start:start+length].decode('utf-8'))
+            self.series = self._read(buf, start + length)
+        finally:
+            buf.close()
+
+    def read(self, entry):
+        """Get the time series of an entry.
+
+        Parameters
+        ----------
+        entry : unicode
+            Full path of the entry.
+
+        Returns
+        -------
+        times : np.ndarray
+            Timestamps of the writes.
+
+        values : np.ndarray or list
+            Written values. Numpy array if all the values are numbers of the
+            same type, list otherwise.
+
+        """
+        return self.series[entry]
+
+    # =========================================================================
+    # --- Private API ---------------------------------------------------------
+    # =========================================================================
+
+    def _read(self, buf, offset):
+        """Parse all the records of the journal.
+
+        """
+        records = {}
+        size = len(buf)
+        unpack = RECORD.unpack_from
+        header = RECORD.size
+        # A record truncated by a crash is ignored.
+        while offset + header <= size:
+            index, timestamp, code, length = unpack(buf, offset)
+            offset += header
+            if offset + length > size:
+                break
+            payload = buf[offset:offset+length]
+            offset += length
+            times, codes, values = records.setdefault(index, ([], set(), []))
+            times.append(timestamp)
+            codes.add(code)
+            values.append(decode_value(code, payload))
+
+        series = {}
+        for index, (times, codes, values) in records.items():
+            if len(codes) == 1 and codes.pop() in (FLOAT, INT, BOOL, COMPLEX):
+                values = np.array(values)
+            series[self.paths[index]] = (np.array(times), values)
+
+        return series
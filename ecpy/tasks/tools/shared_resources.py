@@ -14,10 +14,15 @@ from __future__ import (division, unicode_literals, print_function,
 
 import logging
 from contextlib import contextmanager
-from collections import defaultdict
-from threading import RLock, Lock
+from collections import defaultdict, deque
+from threading import (RLock, Lock, Condition, Event, Thread, local,
+                       current_thread)
 
-from atom.api import Atom, Instance, Value, Int
+from atom.api import Atom, Instance, Value, Int, Dict
+
+
+#: Default maximal number of threads executing the work of a pool.
+DEFAULT_MAX_WORKERS = 8
 
 
 class SharedCounter(Atom):
@@ -156,15 +161,308 @@ class ResourceHolder(SharedDict):
         pass
 
 
+class WorkItem(object):
+    """Future-like object representing a function executed by a WorkerPool.
+
+    The object exposes the join and is_alive methods of threads so that it
+    can be handled like the thread which would have executed the function.
+
+    """
+    def __init__(self, function, args, kwargs):
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self._done = Event()
+
+    def run(self):
+        """Call the function and mark the work as done.
+
+        Exceptions are logged so that they do not kill the worker.
+
+        """
+        try:
+            self.function(*self.args, **self.kwargs)
+        except Exception:
+            log = logging.getLogger(__name__)
+            log.exception('Unhandled exception in work item %s',
+                          self.function)
+        finally:
+            self._done.set()
+
+    def done(self):
+        """Whether the function has been executed.
+
+        """
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Wait for the function to be executed.
+
+        If called from the worker of a pool, the pool is allowed to start
+        one more worker while this one is blocked so that waiting on work
+        queued in the same pool cannot deadlock.
+
+        Returns
+        -------
+        done : bool
+            Whether the function has been executed.
+
+        """
+        if self._done.is_set():
+            return True
+        pool = getattr(_current_pool, 'pool', None)
+        if pool is None:
+            return self._done.wait(timeout)
+        pool._block()
+        try:
+            return self._done.wait(timeout)
+        finally:
+            pool._unblock()
+
+    def join(self, timeout=None):
+        """Alias for wait, mimicking the thread API.
+
+        """
+        self.wait(timeout)
+
+    def is_alive(self):
+        """Whether the function is still to be executed, mimicking the thread
+        API.
+
+        """
+        return not self._done.is_set()
+
+
+#: Thread local storage used by the workers to store the pool they belong to.
+_current_pool = local()
+
+
+class WorkerPool(object):
+    """Bounded pool of persistent threads executing work items in order.
+
+    Threads are started on demand and live until the pool is shut down.
+    Workers blocked waiting on a work item do not count toward the bound.
+
+    Parameters
+    ----------
+    name : unicode
+        Name of the pool, used to name the threads.
+
+    max_workers : int
+        Maximal number of workers executing work at the same time.
+
+    """
+    def __init__(self, name, max_workers=DEFAULT_MAX_WORKERS):
+        self.name = name
+        self.max_workers = max_workers
+        self._items = deque()
+        self._lock = Lock()
+        self._not_empty = Condition(self._lock)
+        self._threads = []
+        self._workers = 0
+        self._idle = 0
+        self._blocked = 0
+        self._shutdown = False
+
+    def submit(self, function, *args, **kwargs):
+        """Schedule the execution of a function.
+
+        Returns
+        -------
+        item : WorkItem
+            Object allowing to wait for the execution of the function.
+
+        """
+        item = WorkItem(function, args, kwargs)
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError('Cannot submit work to a shut down pool.')
+            self._items.append(item)
+            self._wake_or_start()
+        return item
+
+    def shutdown(self):
+        """Stop the workers once all the work has been executed.
+
+        """
+        with self._lock:
+            self._shutdown = True
+            self._idle = 0
+            self._not_empty.notify_all()
+            threads = list(self._threads)
+
+        for thread in threads:
+            thread.join()
+
+    # =========================================================================
+    # --- Private API ---------------------------------------------------------
+    # =========================================================================
+
+    def _wake_or_start(self):
+        """Wake an idle worker or start a new one if the bound allows it.
+
+        Must be called with the lock held.
+
+        """
+        if self._idle:
+            # The woken worker is no longer idle, do not wake it twice.
+            self._idle -= 1
+            self._not_empty.notify()
+        elif self._workers - self._blocked < self.max_workers:
+            self._workers += 1
+            thread = Thread(target=self._work,
+                            name='%s-%d' % (self.name, len(self._threads)))
+            thread.daemon = True
+            self._threads.append(thread)
+            thread.start()
+
+    def _block(self):
+        """Signal that a worker is blocked waiting on another work item.
+
+        """
+        with self._lock:
+            self._blocked += 1
+            if self._items:
+                self._wake_or_start()
+
+    def _unblock(self):
+        """Signal that a worker is no longer blocked.
+
+        """
+        with self._lock:
+            self._blocked -= 1
+
+    def _work(self):
+        """Execute the queued work items till the pool is shut down.
+
+        """
+        _current_pool.pool = self
+        self._lock.acquire()
+        try:
+            while True:
+                # Retire if some blocked workers resumed.
+                if self._workers - self._blocked > self.max_workers:
+                    break
+                if not self._items:
+                    if self._shutdown:
+                        break
+                    self._idle += 1
+                    self._not_empty.wait()
+                    continue
+                item = self._items.popleft()
+                self._lock.release()
+                try:
+                    item.run()
+                finally:
+                    self._lock.acquire()
+        finally:
+            self._workers -= 1
+            self._threads.remove(current_thread())
+            self._lock.release()
+
+
 class ThreadPoolResource(ResourceHolder):
-    """Resource holder specialized to handle threads grouped in pools.
+    """Resource holder specialized to handle work grouped in pools.
+
+    Each pool is executed by a WorkerPool and maps to the list of the work
+    items submitted to it and not yet waited on. The number of outstanding
+    work items of each pool is tracked so that waiting for pools to complete
+    does not require to join and rescan the items.
 
     """
+    #: Maximal number of workers of each pool. Pools not listed use
+    #: default_max_workers.
+    max_workers = Dict()
+
+    #: Maximal number of workers of the pools not listed in max_workers.
+    default_max_workers = Int(DEFAULT_MAX_WORKERS)
+
     def __init__(self, default=list):
         super(ThreadPoolResource, self).__init__(default)
+        self._drained = Condition(self._lock)
+
+    def submit(self, pool, function, *args, **kwargs):
+        """Execute a function in a pool.
+
+        Returns
+        -------
+        item : WorkItem
+            Object allowing to wait for the execution of the function.
+
+        """
+        with self.locked():
+            workers = self._workers.get(pool)
+            if workers is None:
+                size = self.max_workers.get(pool, self.default_max_workers)
+                workers = WorkerPool(pool, size)
+                self._workers[pool] = workers
+            item = workers.submit(self._execute, pool, function, args,
+                                  kwargs)
+            self._dict[pool].append(item)
+            self._pending[pool] = self._pending.get(pool, 0) + 1
+            self._outstanding += 1
+
+        return item
+
+    def wait(self, pools=None, excluded=None):
+        """Block till the work submitted to some pools has been executed.
+
+        Work submitted while waiting is waited for too. Once the pools have
+        completed their work, their lists of work items are emptied.
+
+        Parameters
+        ----------
+        pools : iterable, optional
+            Names of the pools to wait for. If None, all the pools are waited
+            for except the excluded ones.
+
+        excluded : iterable, optional
+            Names of the pools not to wait for when pools is None.
+
+        """
+        if pools is not None:
+            pools = tuple(pools)
+        excluded = tuple(excluded or ())
+
+        with self.locked():
+            if self._count_pending(pools, excluded):
+                # A worker waiting for pools to drain does not count toward
+                # the bound of its own pool so that the work it waits for can
+                # be executed.
+                worker_pool = getattr(_current_pool, 'pool', None)
+                if worker_pool is not None:
+                    worker_pool._block()
+                try:
+                    while self._count_pending(pools, excluded):
+                        self._drained.wait()
+                finally:
+                    if worker_pool is not None:
+                        worker_pool._unblock()
+
+            if pools is None:
+                pools = [p for p in self._dict if p not in excluded]
+            for p in pools:
+                if self._dict.get(p):
+                    self._dict[p] = []
+
+    def pending(self, pools=None, excluded=None):
+        """Count the work items submitted to some pools and not yet executed.
+
+        Parameters
+        ----------
+        pools : iterable, optional
+            Names of the pools to consider. If None, all the pools are
+            considered except the excluded ones.
+
+        excluded : iterable, optional
+            Names of the pools not to consider when pools is None.
+
+        """
+        with self.locked():
+            return self._count_pending(pools, excluded or ())
 
     def release(self):
-        """Join all the threads still alive.
+        """Wait for all the work to be done and stop the workers.
 
         """
         for _, pool in self.items():
@@ -176,6 +474,54 @@ class ThreadPoolResource(ResourceHolder):
                     mes = 'Failed to join thread %s from pool %s'
                     log.exception(mes, thread, pool)
 
+        with self.locked():
+            workers = list(self._workers.values())
+            self._workers = {}
+        for pool in workers:
+            pool.shutdown()
+
+    # =========================================================================
+    # --- Private API ---------------------------------------------------------
+    # =========================================================================
+
+    #: Worker pools by pool name.
+    _workers = Dict()
+
+    #: Number of work items submitted to each pool and not yet executed.
+    _pending = Dict()
+
+    #: Total number of work items submitted and not yet executed.
+    _outstanding = Int()
+
+    #: Condition notified each time a pool completes its work.
+    _drained = Value()
+
+    def _execute(self, pool, function, args, kwargs):
+        """Execute a function and account for its completion.
+
+        """
+        try:
+            function(*args, **kwargs)
+        finally:
+            with self.locked():
+                self._outstanding -= 1
+                count = self._pending[pool] - 1
+                self._pending[pool] = count
+                if not count:
+                    self._drained.notify_all()
+
+    def _count_pending(self, pools, excluded):
+        """Count the work items still to be executed in some pools.
+
+        Must be called with the lock held.
+
+        """
+        pending = self._pending
+        if pools is not None:
+            return sum(pending.get(p, 0) for p in pools)
+
+        return self._outstanding - sum(pending.get(p, 0) for p in excluded)
+
 
 class InstrsResource(ResourceHolder):
     """Resource holder specialized to handle instruments presenting the API
@@ -15,13 +15,26 @@ ressources can be shared and how preferences are handled.
 from __future__ import (division, unicode_literals, print_function,
                         absolute_import)
 
+import ast
+import re
+from collections import OrderedDict
+from threading import Lock
 from textwrap import fill
 from inspect import cleandoc
+from string import Formatter
+from types import ModuleType
 from math import (cos, sin, tan, acos, asin, atan, sqrt, log10,
                 exp, log, cosh, sinh, tanh, atan2)
 from cmath import pi as Pi
 import numpy as np
 import cmath as cm
+from atom.api import Atom, Int, Value
+from future.utils import PY2
+
+if PY2:
+    import __builtin__ as builtins
+else:
+    import builtins
 
 FORMATTER_TOOLTIP = fill(cleandoc("""In this field you can enter a text and
                         include fields which will be replaced by database
@@ -36,15 +49,567 @@ EVALUATER_TOOLTIP = '\n'.join([
     "- cos, sin, tan, acos, asin, atan, atan2",
     "- exp, log, log10, cosh, sinh, tanh, sqrt",
     "- complex math function are available under cm",
-    "- numpy function are avilable under np",
+    "- the usual numpy functions are available under np",
     "- pi is available as Pi"])
 
 
+#: Names of the functions whose result depends only on their arguments.
+PURE_FUNCTIONS = frozenset(('cos', 'sin', 'tan', 'acos', 'asin', 'atan',
+                            'sqrt', 'log10', 'exp', 'log', 'cosh', 'sinh',
+                            'tanh', 'atan2', 'abs', 'min', 'max', 'round',
+                            'int', 'float', 'complex', 'bool', 'len', 'range',
+                            'xrange', 'sum', 'str', 'unicode', 'list', 'tuple',
+                            'dict', 'set', 'sorted', 'reversed', 'zip',
+                            'enumerate', 'divmod', 'pow'))
+
+#: Modules whose functions are considered pure, apart from their random
+#: submodule.
+PURE_MODULES = frozenset(('np', 'cm'))
+
+
+#: Builtins which can be used in evaluated expressions.
+SAFE_BUILTINS = PURE_FUNCTIONS | frozenset(('True', 'False', 'None', 'any',
+                                            'all', 'map', 'filter', 'reduce',
+                                            'isinstance', 'frozenset',
+                                            'slice', 'long', 'basestring',
+                                            'hex', 'oct', 'bin', 'chr', 'ord',
+                                            'unichr', 'iter', 'next'))
+
+#: Attributes of the modules exposed in the evaluation namespace which can be
+#: accessed in an evaluated expression, as dotted paths relative to the
+#: module. The functions of the math module are directly exposed by name.
+ALLOWED_ATTRIBUTES = {
+    'np': frozenset((
+        # Constants.
+        'pi', 'e', 'inf', 'nan', 'newaxis', 'euler_gamma',
+        # Array creation.
+        'array', 'asarray', 'arange', 'linspace', 'logspace', 'geomspace',
+        'zeros', 'ones', 'full', 'zeros_like', 'ones_like', 'full_like',
+        'eye', 'identity', 'meshgrid', 'diag', 'copy',
+        # Elementwise functions.
+        'sin', 'cos', 'tan', 'arcsin', 'arccos', 'arctan', 'arctan2', 'sinh',
+        'cosh', 'tanh', 'arcsinh', 'arccosh', 'arctanh', 'hypot', 'deg2rad',
+        'rad2deg', 'degrees', 'radians', 'exp', 'exp2', 'expm1', 'log',
+        'log2', 'log10', 'log1p', 'sqrt', 'cbrt', 'square', 'power', 'abs',
+        'absolute', 'fabs', 'sign', 'floor', 'ceil', 'rint', 'round',
+        'around', 'trunc', 'fix', 'real', 'imag', 'conj', 'conjugate',
+        'angle', 'mod', 'fmod', 'remainder', 'floor_divide', 'clip',
+        'maximum', 'minimum', 'fmax', 'fmin', 'sinc', 'unwrap', 'isnan',
+        'isinf', 'isfinite', 'isclose', 'allclose', 'array_equal',
+        'nan_to_num', 'logical_and', 'logical_or', 'logical_not',
+        'logical_xor',
+        # Reductions and statistics.
+        'sum', 'prod', 'cumsum', 'cumprod', 'mean', 'average', 'median',
+        'std', 'var', 'min', 'max', 'amin', 'amax', 'ptp', 'argmin',
+        'argmax', 'all', 'any', 'nansum', 'nanmean', 'nanmin', 'nanmax',
+        'count_nonzero', 'percentile',
+        # Linear algebra.
+        'dot', 'vdot', 'inner', 'outer', 'cross', 'tensordot', 'trace',
+        'kron', 'linalg.norm', 'linalg.inv', 'linalg.pinv', 'linalg.det',
+        'linalg.eig', 'linalg.eigvals', 'linalg.solve',
+        # Manipulation and search.
+        'reshape', 'ravel', 'transpose', 'concatenate', 'stack', 'hstack',
+        'vstack', 'column_stack', 'append', 'insert', 'delete', 'flip',
+        'fliplr', 'flipud', 'roll', 'tile', 'repeat', 'squeeze',
+        'expand_dims', 'sort', 'argsort', 'unique', 'searchsorted', 'where',
+        'nonzero', 'take', 'diff', 'gradient', 'interp', 'trapz', 'convolve',
+        'polyval', 'polyfit', 'roots',
+        # Fourier transforms.
+        'fft.fft', 'fft.ifft', 'fft.rfft', 'fft.irfft', 'fft.fftfreq',
+        'fft.rfftfreq', 'fft.fftshift',
+        # Random numbers.
+        'random.rand', 'random.randn', 'random.random', 'random.uniform',
+        'random.normal', 'random.randint', 'random.choice',
+        'random.poisson')),
+    'cm': frozenset((
+        'pi', 'e', 'phase', 'polar', 'rect', 'exp', 'log', 'log10', 'sqrt',
+        'acos', 'asin', 'atan', 'acosh', 'asinh', 'atanh', 'cos', 'sin',
+        'tan', 'cosh', 'sinh', 'tanh', 'isinf', 'isnan')),
+    }
+
+#: Attributes which cannot be accessed on the values of an evaluated
+#: expression because they give access to the filesystem or to the memory of
+#: the process (such as ndarray.tofile).
+FORBIDDEN_ATTRIBUTES = frozenset(('tofile', 'dump', 'dumps', 'ctypes',
+                               'format_map'))
+
+
+def _checked_getattr(obj, name):
+    """Get an attribute of a value in an evaluated expression.
+
+    Modules and types are rejected as they give access to everything the
+    interpreter can do.
+
+    """
+    value = getattr(obj, name)
+    if isinstance(value, (ModuleType, type)) or (
+            PY2 and type(value).__name__ == 'classobj'):
+        raise ForbiddenExpressionError(name, ['attribute {}'.format(name)])
+    return value
+
+
+#: Name under which _checked_getattr is exposed to the compiled expressions.
+#: Expressions cannot refer to it directly (see check_expression).
+CHECKED_GETATTR = '__checked_getattr__'
+
+#: Names of the namespace which expressions cannot refer to. __import__ is
+#: needed by the functions which import modules at the C level (such as
+#: ndarray.sum).
+HIDDEN_NAMES = frozenset(('__builtins__', '__import__', CHECKED_GETATTR))
+
+#: Namespace in which the expressions are evaluated.
+EVALUATION_NAMESPACE = {
+    'cos': cos, 'sin': sin, 'tan': tan, 'acos': acos, 'asin': asin,
+    'atan': atan, 'atan2': atan2, 'sqrt': sqrt, 'log10': log10, 'exp': exp,
+    'log': log, 'cosh': cosh, 'sinh': sinh, 'tanh': tanh, 'Pi': Pi,
+    'np': np, 'cm': cm, CHECKED_GETATTR: _checked_getattr,
+    '__builtins__': {name: getattr(builtins, name)
+                     for name in SAFE_BUILTINS | {'__import__'}
+                     if hasattr(builtins, name)}}
+
+#: Names of the AST nodes allowed in an evaluated expression: literals,
+#: arithmetic, comparisons, boolean logic, conditional expressions, calls,
+#: attribute access, subscripts and comprehensions.
+ALLOWED_NODES = frozenset((
+    'Expression', 'Num', 'Str', 'Bytes', 'Constant', 'NameConstant',
+    'Ellipsis', 'List', 'Tuple', 'Dict', 'Set', 'Name', 'Load', 'Store',
+    'Attribute', 'Subscript', 'Index', 'Slice', 'ExtSlice', 'Call', 'keyword',
+    'Starred', 'BinOp', 'UnaryOp', 'BoolOp', 'Compare', 'IfExp', 'ListComp',
+    'SetComp', 'DictComp', 'GeneratorExp', 'comprehension', 'Add', 'Sub',
+    'Mult', 'MatMult', 'Div', 'FloorDiv', 'Mod', 'Pow', 'LShift', 'RShift',
+    'BitOr', 'BitXor', 'BitAnd', 'And', 'Or', 'Not', 'Invert', 'UAdd', 'USub',
+    'Eq', 'NotEq', 'Lt', 'LtE', 'Gt', 'GtE', 'Is', 'IsNot', 'In', 'NotIn'))
+
+
+class ForbiddenExpressionError(ValueError):
+    """Error raised when an expression uses constructs which are not allowed.
+
+    Parameters
+    ----------
+    expr : unicode
+        Rejected expression.
+
+    rejections : list(unicode)
+        Description of the forbidden constructs used by the expression.
+
+    """
+    def __init__(self, expr, rejections):
+        msg = 'Forbidden constructs in {} : {}'.format(expr,
+                                                       ', '.join(rejections))
+        super(ForbiddenExpressionError, self).__init__(msg)
+        self.rejections = rejections
+
+
+def split_fields(string):
+    """Split a string into its literal parts and its database fields.
+
+    Fields are delimited by '{' and '}'.
+
+    Returns
+    -------
+    literals : list(unicode)
+        Literal parts of the string, there is always one more literal part
+        than there are fields.
+
+    fields : list(unicode)
+        Names of the database entries referenced by the string.
+
+    """
+    elements = [el for aux in string.split('{') for el in aux.split('}')]
+    return elements[::2], elements[1::2]
+
+
+def is_pure_expression(expr):
+    """Determine whether evaluating expr twice always gives the same result.
+
+    Only calls to the functions listed in PURE_FUNCTIONS and to the functions
+    of the modules listed in PURE_MODULES (except their random submodule) are
+    allowed in a pure expression. Expressions which cannot be parsed are not
+    considered pure.
+
+    """
+    try:
+        tree = ast.parse(expr.strip(), mode='eval')
+    except SyntaxError:
+        return False
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            func = node.func
+            attrs = []
+            while isinstance(func, ast.Attribute):
+                attrs.append(func.attr)
+                func = func.value
+            if not isinstance(func, ast.Name):
+                return False
+            if attrs:
+                if func.id not in PURE_MODULES or 'random' in attrs:
+                    return False
+            elif func.id not in PURE_FUNCTIONS:
+                return False
+
+    return True
+
+
+def check_expression(expr, names=()):
+    """List the constructs of an expression which are not allowed.
+
+    Only the nodes listed in ALLOWED_NODES are allowed. Names must be either
+    listed in names, defined in EVALUATION_NAMESPACE or bound by a
+    comprehension, and attributes starting with an underscore cannot be
+    accessed. The modules of the evaluation namespace can only be used to
+    access the attributes listed in ALLOWED_ATTRIBUTES. The other attributes
+    are checked when the expression is evaluated, and rejected if they are
+    modules or types (see compile_expression). The attributes listed in
+    FORBIDDEN_ATTRIBUTES cannot be accessed and only literal strings can be
+    formatted (see _format_rejections).
+
+    Parameters
+    ----------
+    expr : unicode
+        Expression to check.
+
+    names : iterable, optional
+        Names of the variables which will be provided when evaluating the
+        expression.
+
+    Returns
+    -------
+    rejections : list(unicode)
+        Description of the forbidden constructs, empty if the expression is
+        allowed.
+
+    Raises
+    ------
+    SyntaxError :
+        If the expression cannot be parsed.
+
+    """
+    tree = ast.parse(expr.strip(), mode='eval')
+    allowed = (set(names) | set(EVALUATION_NAMESPACE) |
+               set(EVALUATION_NAMESPACE['__builtins__']))
+    allowed -= HIDDEN_NAMES
+    allowed.update(n.id for n in ast.walk(tree)
+                   if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Store))
+    modules = _module_names(tree, names)
+
+    # The content of a forbidden construct is not inspected.
+    rejections = []
+    nodes = [tree]
+    while nodes:
+        node = nodes.pop()
+        kind = type(node).__name__
+        if kind not in ALLOWED_NODES:
+            rejections.append('construct {}'.format(kind))
+            continue
+        elif isinstance(node, ast.Name):
+            if node.id not in allowed:
+                rejections.append('name {}'.format(node.id))
+            elif node.id in modules:
+                rejections.append('module {}'.format(node.id))
+        elif isinstance(node, ast.Attribute):
+            if not isinstance(node.ctx, ast.Load):
+                rejections.append('assignment of attribute {}'.format(
+                    node.attr))
+                continue
+            base, path = _attribute_chain(node)
+            if base in modules:
+                rejections.extend('attribute {}'.format(a) for a in path
+                                  if a.startswith('_'))
+                if _allowed_prefix(base, path) is None:
+                    rejections.append('attribute {}'.format(
+                        '.'.join([base] + path)))
+                # The rest of the chain is only made of attributes and of the
+                # name of the module.
+                continue
+            elif (node.attr.startswith('_') or
+                    node.attr in FORBIDDEN_ATTRIBUTES):
+                rejections.append('attribute {}'.format(node.attr))
+            elif node.attr == 'format':
+                rejections.extend(_format_rejections(node.value))
+        nodes.extend(reversed(list(ast.iter_child_nodes(node))))
+
+    return rejections
+
+
+def compile_expression(expr, names=()):
+    """Compile an expression into a code object after checking it.
+
+    Parameters
+    ----------
+    expr : unicode
+        Expression to compile.
+
+    names : iterable, optional
+        Names of the variables which will be provided when evaluating the
+        expression.
+
+    Raises
+    ------
+    ForbiddenExpressionError :
+        If the expression uses constructs which are not allowed (see
+        check_expression).
+
+    """
+    rejections = check_expression(expr, names)
+    if rejections:
+        raise ForbiddenExpressionError(expr, rejections)
+    tree = _guard_attributes(ast.parse(expr.strip(), mode='eval'), names)
+    return compile(tree, '<string>', 'eval')
+
+
+def safe_compile(expr, names=()):
+    """Compile expr into a function evaluating it.
+
+    The function evaluates expr in EVALUATION_NAMESPACE and takes the values
+    of the variables listed in names as positional arguments. Expressions
+    containing only letters are returned as is by the function, as safe_eval
+    does.
+
+    Raises
+    ------
+    ForbiddenExpressionError :
+        If the expression uses constructs which are not allowed (see
+        check_expression).
+
+    """
+    if expr.isalpha():
+        return lambda *args: expr
+
+    rejections = check_expression(expr, names)
+    if rejections:
+        raise ForbiddenExpressionError(expr, rejections)
+    source = 'lambda {}: {}'.format(', '.join(names), expr.strip())
+    tree = _guard_attributes(ast.parse(source, mode='eval'), names)
+    return eval(compile(tree, '<string>', 'eval'), EVALUATION_NAMESPACE)
+
+
+def _module_names(tree, names):
+    """Names referring to a module of the evaluation namespace in a tree.
+
+    """
+    bound = set(names)
+    bound.update(n.id for n in ast.walk(tree)
+                 if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Store))
+    return set(ALLOWED_ATTRIBUTES) - bound
+
+
+def _format_rejections(node):
+    """List the forbidden fields of a string whose format method is accessed.
+
+    Only literal strings can be formatted, and their fields cannot access
+    attributes or items whose name contains an underscore (such as
+    '{0.__class__}').
+
+    """
+    template = getattr(node, 's', None)
+    if not isinstance(template, (bytes, type(''))):
+        return ['format of a non literal string']
+
+    rejections = []
+    specs = [template]
+    while specs:
+        try:
+            parsed = list(Formatter().parse(specs.pop()))
+        except ValueError:
+            return ['invalid format string {}'.format(template)]
+        for _, field, spec, _ in parsed:
+            if field and any('_' in part
+                             for part in re.split(r'[.\[]', field)[1:]):
+                rejections.append('format field {}'.format(field))
+            # Format specifications can contain nested fields.
+            if spec:
+                specs.append(spec)
+    return rejections
+
+
+def _attribute_chain(node):
+    """Get the name at the base of a chain of attributes and the path.
+
+    Returns
+    -------
+    base : unicode or None
+        Name at the base of the chain, None if the chain does not start with
+        a name.
+
+    path : list(unicode)
+        Names of the attributes of the chain starting from the base.
+
+    """
+    path = []
+    while isinstance(node, ast.Attribute):
+        path.append(node.attr)
+        node = node.value
+    path.reverse()
+    return (node.id if isinstance(node, ast.Name) else None), path
+
+
+def _chain_nodes(node):
+    """List the attribute nodes of a chain of attributes.
+
+    """
+    nodes = []
+    while isinstance(node, ast.Attribute):
+        nodes.append(node)
+        node = node.value
+    return nodes
+
+
+def _allowed_prefix(module, path):
+    """Length of the shortest prefix of path listed in ALLOWED_ATTRIBUTES.
+
+    Returns None if no prefix is allowed.
+
+    """
+    allowed = ALLOWED_ATTRIBUTES[module]
+    for i in range(1, len(path) + 1):
+        if '.'.join(path[:i]) in allowed:
+            return i
+    return None
+
+
+class _AttributeGuard(ast.NodeTransformer):
+    """Replace the attribute accesses whose value cannot be known in advance
+    by calls to _checked_getattr.
+
+    """
+    def __init__(self, modules):
+        self.modules = modules
+
+    def visit_Attribute(self, node):
+        base, path = _attribute_chain(node)
+        if base in self.modules:
+            # The allowed prefix is kept as is, the rest is checked.
+            prefix = _allowed_prefix(base, path)
+            nodes = _chain_nodes(node)[:len(path) - prefix]
+            if not nodes:
+                return node
+            inner = nodes[-1].value
+        else:
+            nodes = [node]
+            inner = self.visit(node.value)
+
+        for attr in reversed(nodes):
+            call = ast.parse("{}(_, '{}')".format(CHECKED_GETATTR, attr.attr),
+                             mode='eval').body
+            call.args[0] = inner
+            inner = ast.copy_location(call, attr)
+        return inner
+
+
+def _guard_attributes(tree, names):
+    """Check the attributes accessed by an expression when evaluating it.
+
+    """
+    tree = _AttributeGuard(_module_names(tree, names)).visit(tree)
+    return ast.fix_missing_locations(tree)
+
+
+class CompilationCache(Atom):
+    """Thread safe cache of compiled expressions with LRU eviction.
+
+    Compiled objects are identified by the function used to build them and
+    the arguments passed to it, so that tasks formatting or evaluating the
+    same expression with the same database layout share the same object.
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        Maximal number of compiled objects kept in the cache.
+
+    """
+    #: Maximal number of compiled objects kept in the cache.
+    maxsize = Int(1024)
+
+    #: Number of lookups answered by the cache.
+    hits = Int()
+
+    #: Number of lookups which required a compilation.
+    misses = Int()
+
+    def __init__(self, maxsize=1024):
+        super(CompilationCache, self).__init__(maxsize=maxsize)
+        self._cache = OrderedDict()
+
+    def get(self, builder, *args):
+        """Get the object built by builder(*args), building it if necessary.
+
+        Parameters
+        ----------
+        builder : callable
+            Function used to compile the object. It should not have any side
+            effect and should always return equivalent objects for the same
+            arguments.
+
+        *args :
+            Hashable arguments to pass to the builder.
+
+        """
+        key = (builder, args)
+        cache = self._cache
+        with self._lock:
+            try:
+                compiled = cache.pop(key)
+            except KeyError:
+                self.misses += 1
+            else:
+                self.hits += 1
+                cache[key] = compiled
+                return compiled
+
+        # Compile outside of the lock, as two threads compiling the same
+        # expression simply produce equivalent objects.
+        compiled = builder(*args)
+        with self._lock:
+            cache[key] = compiled
+            while len(cache) > self.maxsize:
+                cache.popitem(last=False)
+
+        return compiled
+
+    def clear(self):
+        """Empty the cache and reset the counters.
+
+        """
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._cache)
+
+    # =========================================================================
+    # --- Private API ---------------------------------------------------------
+    # =========================================================================
+
+    #: Compiled objects ordered from the least to the most recently used.
+    _cache = Value()
+
+    #: Lock protecting the access to the cache and the counters.
+    _lock = Value(factory=Lock)
+
+
+#: Cache of the expressions compiled by the tasks of the process.
+COMPILATION_CACHE = CompilationCache()
+
+
 def safe_eval(expr, local_var):
     """Eval expr save is expr contains only letters.
 
+    The expression is checked and compiled once and then retrieved from the
+    COMPILATION_CACHE.
+
+    Raises
+    ------
+    ForbiddenExpressionError :
+        If the expression uses constructs which are not allowed (see
+        check_expression).
+
     """
     if expr.isalpha():
         return expr
 
-    return eval(expr, globals(), local_var)
+    code = COMPILATION_CACHE.get(compile_expression, expr,
+                                 tuple(sorted(local_var)))
+    return eval(code, EVALUATION_NAMESPACE, local_var)
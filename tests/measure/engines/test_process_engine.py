@@ -18,7 +18,7 @@ from time import sleep
 
 import pytest
 import enaml
-from atom.api import Value, Bool, Unicode
+from atom.api import Value, Bool, Unicode, set_default
 from future.builtins import str as text
 
 from ecpy.measure.engines.api import ExecutionInfos
@@ -45,12 +45,19 @@ class WaitingTask(SimpleTask):
     check_flag = Bool(True).tag(pref=True)
     sync_port = Value(()).tag(pref=True)
     sock_id = Unicode().tag(pref=True)
+    require_checked = Bool().tag(pref=True)
+
+    database_entries = set_default({'checked': False})
 
     def check(self, *args, **kwargs):
         super(WaitingTask, self).check(*args, **kwargs)
+        self.write_in_database('checked', True)
         return self.check_flag, {'test': 1}
 
     def perform(self):
+        if (self.require_checked and
+                not self.get_from_database(self.name + '_checked')):
+            raise RuntimeError('The checks did not initialise the database.')
         s = socket.socket()
         while True:
             if s.connect_ex(('localhost', self.sync_port)) == 0:
@@ -238,6 +245,40 @@ def test_perform(process_engine, exec_infos, sync_server):
         sleep(0.01)
 
 
+@pytest.mark.timeout(30)
+def test_perform_shared_database(process_engine, exec_infos, sync_server):
+    """Test perfoming a task while reading the observed entries from the
+    database shared with the subprocess.
+
+    """
+    updates = []
+    process_engine.observe('progress', updates.append)
+    process_engine.shared_database = True
+    exec_infos.observed_entries = ['root/test1_checked']
+    t = ExecThread(process_engine, exec_infos)
+    t.start()
+    sync_server.wait('test1')
+    sync_server.signal('test1')
+    sync_server.wait('test2')
+    sync_server.signal('test2')
+    t.join()
+    assert t.value.success
+    assert process_engine.status == 'Waiting'
+
+    # The values are read by the monitor thread.
+    for _ in range(100):
+        if any(('root/test1_checked', True) in news for news in updates
+               if isinstance(news, list)):
+            break
+        sleep(0.05)
+    else:
+        raise AssertionError('Shared value not read : %s' % updates)
+
+    process_engine.shutdown()
+    while not process_engine.status == 'Stopped':
+        sleep(0.01)
+
+
 @pytest.mark.timeout(30)
 def test_handle_fail_check(process_engine, exec_infos):
     """Test handling a measure failing the checks.
@@ -278,6 +319,45 @@ def test_skipping_checks(process_engine, exec_infos, sync_server):
         sleep(0.01)
 
 
+@pytest.mark.timeout(30)
+def test_skipping_unchanged_checks(process_engine, exec_infos, sync_server):
+    """Test skipping the checks of a task which did not change since they
+    passed.
+
+    """
+    task = exec_infos.task
+    runtime = exec_infos.runtime_deps
+    for child in task.children:
+        child.require_checked = True
+
+    # Without a fingerprint the checks must pass.
+    task.children[0].check_flag = False
+    t = ExecThread(process_engine, exec_infos)
+    t.start()
+    t.join()
+    assert not t.value.success
+    assert 'test' in t.value.errors
+
+    # The checks fail but the main process found that they already passed.
+    # They still initialise the database entries the tasks rely on.
+    exec_infos.checks_fingerprint = task.get_checks_fingerprint(runtime)
+    exec_infos.success = True
+    exec_infos.errors = {}
+    t = ExecThread(process_engine, exec_infos)
+    t.start()
+    sync_server.wait('test1')
+    sync_server.signal('test1')
+    sync_server.wait('test2')
+    sync_server.signal('test2')
+    t.join()
+    assert t.value.success
+    assert process_engine.status == 'Waiting'
+
+    process_engine.shutdown()
+    while not process_engine.status == 'Stopped':
+        sleep(0.01)
+
+
 class DummyP(TaskProcess):
     def run(self):
         pass
@@ -12,11 +12,15 @@
 from __future__ import (division, unicode_literals, print_function,
                         absolute_import)
 
+from time import sleep
 from multiprocessing.queues import Queue
 
+from atom.api import Value
+
 from ecpy.tasks.tools.database import TaskDatabase
 from ecpy.measure.engines.api import BaseEngine
-from ecpy.measure.engines.utils import MeasureSpy, ThreadMeasureMonitor
+from ecpy.measure.engines.utils import (MeasureSpy, ThreadMeasureMonitor,
+                                        SHARED_STORAGE)
 
 
 def test_spy():
@@ -25,25 +29,70 @@ def test_spy():
     """
     q = Queue()
     data = TaskDatabase()
+    data.set_value('root', 'test', 0)
+    data.set_value('root', 'test2', 0)
+    data.set_value('root', 'test3', 0)
     spy = MeasureSpy(queue=q, observed_database=data,
-                     observed_entries=('test',))
+                     observed_entries=('root/test', 'root/test3'))
+    data.prepare_to_run()
 
-    data.notifier(('test', 1))
-    assert q.get()
+    data.set_value('root', 'test', 1)
+    assert q.get() == ('root/test', 1)
 
-    data.notifier(('test2', 1))
+    data.set_value('root', 'test2', 1)
     assert q.empty()
 
+    data.set_values('root', {'test': 2, 'test2': 1})
+    assert q.get() == [('root/test', 2)]
+
+    data.set_values('root', {'test2': 2})
+    assert q.empty()
+
+    data.set_values('root', {'test': 3, 'test3': 3})
+    assert sorted(q.get()) == [('root/test', 3), ('root/test3', 3)]
+
     spy.close()
     assert q.get() == ('', '')
 
+    data.set_value('root', 'test', 1)
+    assert q.empty()
+
+
+def test_spy_shared_storage(tmpdir):
+    """Test that the spy sends the shared storage infos instead of updates.
+
+    """
+    q = Queue()
+    data = TaskDatabase()
+    data.set_value('root', 'test', 1)
+    data.set_value('root', 'other', 1)
+    data.set_value('root', 'str', 'a')
+    spy = MeasureSpy(queue=q, observed_database=data,
+                     observed_entries=('root/test', 'root/str'))
+    data.shared_storage_path = str(tmpdir.join('shared.db'))
+    data.prepare_to_run()
+
+    news = q.get()
+    assert news[0] == SHARED_STORAGE
+    assert list(news[1]['entries']) == ['root/test']
+
+    data.set_value('root', 'test', 2)
+    data.set_value('root', 'str', 'b')
+    assert q.get() == ('root/str', 'b')
+    assert q.empty()
+
+    # Once the entry is not numeric anymore updates are sent again.
+    data.set_value('root', 'test', 'c')
+    assert q.get() == ('root/test', 'c')
+
+    spy.close()
+    data.close_shared_storage()
+
 
 def test_monitor_thread():
     """Test the monitor thread rerouting news to engine signal.
 
     """
-    from atom.api import Value
-
     class E(BaseEngine):
 
         test = Value()
@@ -61,3 +110,42 @@ def test_monitor_thread():
     m.join()
 
     assert e.test == 'test'
+
+
+def test_monitor_thread_shared_storage(tmpdir):
+    """Test the monitor thread reading the values from a shared storage.
+
+    """
+    class E(BaseEngine):
+
+        test = Value(factory=list)
+
+        def _observe_progress(self, val):
+            self.test.append(val)
+
+    data = TaskDatabase()
+    data.set_value('root', 'test', 1)
+    data.shared_storage_path = str(tmpdir.join('shared.db'))
+    data.prepare_to_run()
+    infos = data.get_shared_storage_infos()
+
+    q = Queue()
+    e = E()
+    m = ThreadMeasureMonitor(e, q, 0.01)
+    m.start()
+    q.put((SHARED_STORAGE, infos))
+    q.put(('root/str', 'a'))
+    # Wait for the initial values to be read before modifying them.
+    for _ in range(100):
+        if ('root/str', 'a') in e.test:
+            break
+        sleep(0.01)
+    data.set_value('root', 'test', 2)
+    q.put(('', ''))
+    q.put((None, None))
+    m.join()
+    data.close_shared_storage()
+
+    assert e.test[0] == [('root/test', 1)]
+    assert ('root/str', 'a') in e.test
+    assert e.test[-1] == [('root/test', 2)]
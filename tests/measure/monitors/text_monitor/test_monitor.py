@@ -287,6 +287,12 @@ def test_process_news(monitor):
     assert monitor.displayed_entries[1].value == '2'
     assert monitor.displayed_entries[2].value == '2/10'
 
+    monitor.process_news([('root/test_index', 3), ('root/test_loop', 12)])
+    process_app_events()
+    assert monitor.displayed_entries[0].value == '12'
+    assert monitor.displayed_entries[1].value == '3'
+    assert monitor.displayed_entries[2].value == '3/12'
+
 
 def test_clear_state(monitor):
     """ Test clearing the monitor state.
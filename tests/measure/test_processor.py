@@ -315,6 +315,67 @@ def test_running_forced_enqueued_measure(processor, measure_with_tools):
     process_app_events()
 
 
+@pytest.mark.timeout(60)
+def test_running_measure_whose_checks_passed(processor, measure_with_tools,
+                                             monkeypatch):
+    """Test that the checks are not run again on an unchanged measure.
+
+    """
+    measure = measure_with_tools
+    measure.dependencies.collect_runtimes()
+    measure.checks_fingerprint = measure.compute_checks_fingerprint()
+    measure.dependencies.release_runtimes()
+
+    calls = []
+    run_checks = Measure.run_checks
+
+    def counting_run_checks(self, **kwargs):
+        calls.append(kwargs)
+        return run_checks(self, **kwargs)
+
+    monkeypatch.setattr(Measure, 'run_checks', counting_run_checks)
+
+    processor.start_measure(measure)
+    pre_hook = measure.pre_hooks['dummy']
+    assert pre_hook.waiting.wait(5)
+    process_app_events()
+
+    pre_hook.go_on.set()
+
+    wait_and_process(processor.engine.waiting.wait)
+    assert not processor.engine.measure_force_enqueued
+    processor.engine.go_on.set()
+
+    post_hook = measure.post_hooks['dummy']
+    wait_and_process(post_hook.waiting.wait)
+
+    post_hook.go_on.set()
+
+    processor._thread.join()
+    process_app_events()
+    assert measure.status == 'COMPLETED'
+    assert not calls
+
+
+@pytest.mark.timeout(60)
+def test_running_measure_changed_since_checks(processor, measure_with_tools):
+    """Test that the checks are run again on a measure which changed.
+
+    """
+    measure = measure_with_tools
+    measure.dependencies.collect_runtimes()
+    measure.checks_fingerprint = measure.compute_checks_fingerprint()
+    measure.dependencies.release_runtimes()
+
+    measure.pre_hooks['dummy'].fail_check = True
+    processor.start_measure(measure)
+
+    processor._thread.join()
+    process_app_events()
+    assert measure.status == 'FAILED'
+    assert 'checks' in measure.infos
+
+
 @pytest.mark.parametrize('mode', ['between hooks', 'after hooks'])
 @pytest.mark.timeout(60)
 def test_stopping_measure_while_preprocessing(mode, processor,
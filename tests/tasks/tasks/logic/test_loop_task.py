@@ -15,6 +15,7 @@ from __future__ import (division, unicode_literals, print_function,
 import pytest
 import enaml
 from multiprocessing import Event
+from atom.api import Unicode
 
 from ecpy.tasks.base_tasks import RootTask
 from ecpy.tasks.tasks.logic.loop_task import LoopTask
@@ -36,6 +37,23 @@ from ecpy.testing.util import show_and_close_widget
 pytest_plugins = str('ecpy.testing.tasks.manager.fixtures'),
 
 
+class EvalCheckTask(CheckTask):
+    """Check task evaluating expressions based on the loop entries.
+
+    """
+    #: Expression which can be vectorized.
+    setpoint = Unicode('2*{Test_value} + {Test_index}').tag(feval=True)
+
+    #: Expression whose vectorized evaluation differs from the point by point
+    #: one.
+    centered = Unicode('{Test_value} - np.mean({Test_value})').tag(feval=True)
+
+    #: Expression whose vectorized evaluation differs from the point by point
+    #: one only on the interior points.
+    bounded = Unicode('{Test_value} + ({Test_value} - np.min({Test_value})) *'
+                      ' (np.max({Test_value}) - {Test_value})').tag(feval=True)
+
+
 @pytest.fixture
 def linspace_interface(request):
     """Fixture building a linspace interface.
@@ -347,6 +365,35 @@ class TestLoopTask(object):
         self.task.perform()
         assert not self.task.children[1].perform_called
 
+    def test_perform_vectorized(self, linspace_interface):
+        """Test evaluating expressions on the whole iterable at once.
+
+        """
+        self.task.interface = linspace_interface
+        self.task.vectorize = True
+        values = []
+
+        def custom(task, value):
+            cache = task._eval_cache
+            values.append((task.format_and_eval_string(task.setpoint),
+                           task.format_and_eval_string(task.centered),
+                           task.format_and_eval_string(task.bounded),
+                           isinstance(cache[task.setpoint][0].__self__, list)))
+        check = EvalCheckTask(name='check', custom=custom)
+        self.task.add_child_task(0, check)
+        self.root.prepare()
+        assert ({v[1] for v in self.task._vectorized} ==
+                {check.setpoint, check.centered, check.bounded})
+
+        self.task.perform()
+        assert len(values) == 11
+        for i, (setpoint, centered, bounded, vectorized) in enumerate(values):
+            assert abs(setpoint - (2*(1 + 0.1*i) + i + 1)) < 1e-12
+            assert centered == 0
+            assert abs(bounded - (1 + 0.1*i)) < 1e-12
+            assert vectorized
+        assert check.setpoint not in check._eval_cache
+
     def test_perform_task1(self, iterable_interface):
         """Test performing a loop with an embedded task no timing.
 
@@ -565,6 +612,30 @@ class TestLoopTask(object):
 
         assert self.task.children[0].perform_called == 1
 
+    def test_perform_execution_plan(self, iterable_interface):
+        """Test performing through an execution plan with timing, break and
+        continue.
+
+        """
+        self.task.timing = True
+        self.task.interface = iterable_interface
+        self.task.task = CheckTask(name='check')
+        self.task.add_child_task(0, ContinueTask(name='Continue',
+                                                 condition='{Test_index} < 4')
+                                 )
+        self.task.add_child_task(1, CheckTask(name='check2'))
+        self.task.add_child_task(2, BreakTask(name='Break',
+                                              condition='{Test_index} == 6')
+                                 )
+        self.root.use_execution_plan = True
+
+        self.root.perform()
+        assert self.root._plan.slots == 1
+        assert self.root.get_from_database('Test_index') == 6
+        assert self.task.task.perform_value == 5
+        assert self.task.children[1].perform_called == 3
+        assert self.root.get_from_database('Test_elapsed_time') != 1.0
+
     @pytest.mark.ui
     def test_view(self, windows, task_workbench):
         """Test the LoopTask view.
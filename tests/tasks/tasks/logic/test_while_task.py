@@ -117,6 +117,23 @@ class TestWhileTask(object):
 
         assert self.task.children[0].perform_called == 1
 
+    def test_perform_execution_plan(self):
+        """Test performing through an execution plan, the break and continue
+        tasks being compiled as jumps.
+
+        """
+        self.task.condition = 'True'
+        self.task.add_child_task(0, BreakTask(name='Break',
+                                              condition='{Test_index} == 6'))
+        self.task.add_child_task(0, ContinueTask(name='Continue',
+                                                 condition='{Test_index} < 3'))
+        self.root.use_execution_plan = True
+
+        self.root.perform()
+        assert self.root._plan.slots == 1
+        assert self.check.perform_called == 3
+        assert self.task.get_from_database('Test_index') == 6
+
 
 @pytest.mark.ui
 def test_while_view(windows):
@@ -12,9 +12,13 @@
 from __future__ import (division, unicode_literals, print_function,
                         absolute_import)
 
+from threading import Event
+
 import pytest
-from atom.api import Value, List
-from ecpy.tasks.base_tasks import RootTask, SimpleTask, ComplexTask
+from atom.api import Value, List, Unicode, set_default
+from ecpy.tasks.base_tasks import (RootTask, SimpleTask, ComplexTask,
+                                   CONSTANT, RUN_CONSTANT, DYNAMIC)
+from ecpy.testing.tasks.util import CheckTask
 
 
 class SignalListener(object):
@@ -367,6 +371,29 @@ def test_build_root_from_config():
     assert isinstance(task.children[0], SimpleTask)
 
 
+class EntryTask(SimpleTask):
+    """Task declaring a database entry by default.
+
+    """
+    database_entries = set_default({'val': 1})
+
+
+def test_prepare_root_from_config():
+    """Test that the entries of a rebuilt hierarchy are registered so that
+    it can be prepared and run.
+
+    """
+    config = {'children_0': {'name': 'child', 'task_id': 'EntryTask'}}
+    root = RootTask.build_from_config(config,
+                                      {'ecpy.task': {'EntryTask': EntryTask}})
+    child = root.children[0]
+    assert child.path == 'root'
+    assert root.get_from_database('child_val') == 1
+
+    root.prepare()
+    assert child._entry_handles['val'].path == 'root/child_val'
+
+
 def test_gather_children():
     """Test _gather_children method in all corner cases.
 
@@ -384,3 +411,322 @@ def test_gather_children():
     children = list(sct.gather_children())
 
     assert children == [2, 3, 1, t]
+
+
+def test_entry_handles():
+    """Test that preparing a task resolves its database entries.
+
+    """
+    root = RootTask()
+    task1 = ComplexTask(name='task1', database_entries={'val1': 2.0})
+    task2 = SimpleTask(name='task2', database_entries={'val2': 1})
+    task1.add_child_task(0, task2)
+    root.add_child_task(0, task1)
+
+    root.prepare()
+    assert sorted(task2._entry_handles) == ['val2']
+    assert task2._entry_handles['val2'].path == 'root/task1/task2_val2'
+
+    assert task2.write_in_database('val2', 3) is False
+    assert task2.get_from_database('task2_val2') == 3
+    assert task2.get_from_database('task1_val1') == 2.0
+    assert 'task1_val1' in task2._read_handles
+    assert root.get_from_database('default_path') == ''
+
+
+def test_check_after_exit_running(tmpdir):
+    """Test that the handles are not used once the database left the running
+    mode.
+
+    """
+    root = RootTask(default_path=str(tmpdir))
+    task = CheckTask(name='task', database_entries={'val': 1})
+    root.add_child_task(0, task)
+
+    root.prepare()
+    assert root.perform()
+    root.database.exit_running()
+
+    assert root.check()[0]
+    task.write_in_database('val', 2)
+    task.write_many_in_database({'val': 3})
+    assert task.get_from_database('task_val') == 3
+
+
+def test_write_many_in_database():
+    """Test writing several entries at once in edition and running mode.
+
+    """
+    root = RootTask()
+    task = SimpleTask(name='task', database_entries={'val1': 1, 'val2': 2})
+    root.add_child_task(0, task)
+    listener = SignalListener()
+    root.database.observe('notifier', listener.listen)
+
+    task.write_many_in_database({'val1': 3, 'val2': 4})
+    assert task.get_from_database('task_val1') == 3
+    assert task.get_from_database('task_val2') == 4
+    assert not listener.counter
+
+    root.prepare()
+    task.write_many_in_database({'val1': 5, 'val2': 6})
+    assert listener.counter == 1
+    assert sorted(listener.signals[0]) == [('added', 'root/task_val1', 5),
+                                           ('added', 'root/task_val2', 6)]
+
+
+class EvalTask(SimpleTask):
+    """Task with several formatted and evaluated members.
+
+    """
+    constant = Unicode('2*3').tag(feval=True)
+
+    run_constant = Unicode('{default_path}/file').tag(fmt=True)
+
+    dynamic = Unicode('{task_val}*2').tag(feval=True)
+
+    impure = Unicode('np.random.rand()').tag(feval=True)
+
+
+def test_constant_folding():
+    """Test that constant and run constant strings are evaluated once.
+
+    """
+    root = RootTask()
+    task = EvalTask(name='task', database_entries={'val': 1})
+    root.add_child_task(0, task)
+    root.default_path = 'test'
+    root.write_in_database('default_path', 'test')
+
+    root.prepare()
+    assert task._string_kinds == {('2*3', True): CONSTANT,
+                                  ('{default_path}/file', False): RUN_CONSTANT,
+                                  ('{task_val}*2', True): DYNAMIC,
+                                  ('np.random.rand()', True): DYNAMIC}
+
+    assert task.format_and_eval_string(task.constant) == 6
+    assert task.format_string(task.run_constant) == 'test/file'
+    root.write_in_database('default_path', 'other')
+    assert task.format_string(task.run_constant) == 'test/file'
+
+    assert task.format_and_eval_string(task.dynamic) == 2
+    task.write_in_database('val', 2)
+    assert task.format_and_eval_string(task.dynamic) == 4
+    assert (task.format_and_eval_string(task.impure) !=
+            task.format_and_eval_string(task.impure))
+
+
+def test_constant_folding_mutable():
+    """Test that constant strings with a mutable value are not folded.
+
+    """
+    root = RootTask()
+    task = EvalTask(name='task', constant='np.arange(3)')
+    root.add_child_task(0, task)
+
+    root.prepare()
+    assert task._string_kinds[('np.arange(3)', True)] == CONSTANT
+
+    result = task.format_and_eval_string(task.constant)
+    result[0] = 10
+    assert list(task.format_and_eval_string(task.constant)) == [0, 1, 2]
+    assert (task.format_and_eval_string(task.constant) is not
+            task.format_and_eval_string(task.constant))
+
+
+def test_caches_discarded_on_exit_running():
+    """Test that the caches built against the flat database are discarded
+    when the database goes back to edition mode.
+
+    """
+    root = RootTask()
+    task = EvalTask(name='task', database_entries={'val': 1})
+    root.add_child_task(0, task)
+
+    root.prepare()
+    assert task.format_and_eval_string(task.dynamic) == 2
+    assert task.format_string('{task_val}') == '1'
+    task.write_in_database('val', 2)
+    root.database.exit_running()
+
+    assert not (task._eval_cache or task._format_cache or
+                task._entry_handles or task._read_handles)
+    assert root._written_indexes is None
+    assert task.format_and_eval_string(task.dynamic) == 4
+    assert task.format_and_eval_string('{task_val} + 1') == 3
+    assert task.format_string('{task_val}') == '2'
+
+    # The caches are built again on the next run.
+    root.prepare()
+    assert task.format_and_eval_string(task.dynamic) == 4
+    assert task._eval_cache
+
+
+def test_check_forbidden_expression():
+    """Test that forbidden constructs are reported when checking.
+
+    """
+    root = RootTask()
+    task = EvalTask(name='task', database_entries={'val': 1},
+                    dynamic='{task_val}.__class__', impure='open("file")')
+    root.add_child_task(0, task)
+
+    test, traceback = task.check()
+    assert not test
+    assert 'attribute __class__' in traceback['root/task-dynamic']
+    assert 'name open' in traceback['root/task-impure']
+    assert 'root/task-constant' not in traceback
+
+
+class ReadCheckTask(CheckTask):
+    """Check task evaluating a database entry.
+
+    """
+    read = Unicode().tag(feval=True)
+
+
+def test_incremental_check(tmpdir):
+    """Test that only the modified tasks are checked again.
+
+    """
+    root = RootTask(default_path=str(tmpdir))
+    comp = ComplexTask(name='comp')
+    root.add_child_task(0, comp)
+    writer = CheckTask(name='writer', database_entries={'val': 1})
+    comp.add_child_task(0, writer)
+    writer.add_access_exception('val', 1)
+    reader = ReadCheckTask(name='reader', read='{writer_val}*2')
+    root.add_child_task(1, reader)
+    other = CheckTask(name='other')
+    root.add_child_task(2, other)
+
+    def counts():
+        return (writer.check_called, reader.check_called, other.check_called)
+
+    assert root.check(incremental=True)[0]
+    assert counts() == (1, 1, 1)
+    assert root.check(incremental=True)[0]
+    assert counts() == (1, 1, 1)
+
+    # Changing a preference marks the task and its ancestors as dirty.
+    writer.stoppable = False
+    assert root.check(incremental=True)[0]
+    assert counts() == (2, 1, 1)
+
+    # Changing an entry read by a task invalidates its check.
+    writer.write_in_database('val', 2)
+    assert root.check(incremental=True)[0]
+    assert counts() == (2, 2, 1)
+
+    # Different keyword arguments or a non incremental check run everything.
+    assert root.check(incremental=True, test_instr=True)[0]
+    assert counts() == (3, 3, 2)
+    assert root.check()[0]
+    assert counts() == (4, 4, 3)
+
+    # Failed checks are never cached.
+    reader.read = '{writer_val}*'
+    assert not root.check(incremental=True)[0]
+    assert not root.check(incremental=True)[0]
+    assert counts() == (5, 6, 4)
+
+
+def test_checks_fingerprint(tmpdir):
+    """Test that the fingerprint of the checks tracks their inputs.
+
+    """
+    def build():
+        root = RootTask(default_path=str(tmpdir))
+        root.add_child_task(0, CheckTask(name='check',
+                                         database_entries={'val': 1}))
+        return root
+
+    root = build()
+    fingerprint = root.get_checks_fingerprint()
+    assert root.get_checks_fingerprint() == fingerprint
+
+    # Computing the fingerprint leaves the preferences untouched.
+    registered = root.preferences.dict()
+    root.children[0].stoppable = False
+    assert root.get_checks_fingerprint() != fingerprint
+    assert root.preferences.dict() == registered
+    root.register_preferences()
+    assert root.preferences.dict() == root.preferences_from_members()
+    root.children[0].stoppable = True
+
+    # The checks write the default path in the database and the values of
+    # the task entries are not part of the fingerprint.
+    root.check()
+    root.children[0].write_in_database('val', 2)
+    assert root.get_checks_fingerprint() == fingerprint
+
+    # Rebuilding the same hierarchy from its preferences gives the same
+    # fingerprint.
+    root.update_preferences_from_members()
+    rebuilt = RootTask.build_from_config(root.preferences.dict(),
+                                         {'ecpy.task':
+                                             {'ecpy.CheckTask': CheckTask}})
+    assert rebuilt.get_checks_fingerprint() == fingerprint
+
+    root.children[0].stoppable = False
+    assert root.get_checks_fingerprint() != fingerprint
+
+    root = build()
+    root.write_in_database('meas_name', 'test')
+    assert root.get_checks_fingerprint() != fingerprint
+
+    root = build()
+    runtime = {'ecpy.instruments.drivers': {'Driver': object}}
+    assert root.get_checks_fingerprint(runtime) != fingerprint
+    root.run_time = runtime
+    assert (root.get_checks_fingerprint() ==
+            root.get_checks_fingerprint(dict(runtime)))
+
+
+class BarrierCheckTask(CheckTask):
+    """Check task whose check only passes if the check of its partner runs
+    concurrently.
+
+    """
+    partner = Value()
+
+    checking = Value(factory=Event)
+
+    def check(self, *args, **kwargs):
+        self.checking.set()
+        test, traceback = super(BarrierCheckTask, self).check(*args, **kwargs)
+        return test and self.partner.checking.wait(5), traceback
+
+
+def test_parallel_check(tmpdir):
+    """Test checking concurrently the independent children of a task.
+
+    """
+    root = RootTask(default_path=str(tmpdir))
+    writer = ReadCheckTask(name='writer', read='3',
+                           database_entries={'read': 1})
+    root.add_child_task(0, writer)
+    reader = ReadCheckTask(name='reader', read='{writer_read}*2',
+                           database_entries={'read': 0})
+    root.add_child_task(1, reader)
+    first = BarrierCheckTask(name='first')
+    second = BarrierCheckTask(name='second', partner=first)
+    first.partner = second
+    root.add_child_task(2, first)
+    comp = ComplexTask(name='comp')
+    root.add_child_task(3, comp)
+    comp.add_child_task(0, second)
+
+    assert root._get_check_dependencies(root.children) == [[], [0], [], []]
+
+    test, traceback = root.check(parallel=2)
+    assert test
+    assert not traceback
+    assert root.get_from_database('reader_read') == 6
+    assert [t.check_called for t in (writer, reader, first, second)] == \
+        [1, 1, 1, 1]
+
+    reader.read = '{writer_read}*'
+    test, traceback = root.check(parallel=True)
+    assert not test
+    assert list(traceback) == ['root/reader-read']
@@ -15,7 +15,7 @@ from __future__ import (division, unicode_literals, print_function,
 import pytest
 import threading
 from multiprocessing import Event
-from time import sleep
+from time import sleep, time
 from atom.api import Unicode, set_default
 from enaml.application import deferred_call
 
@@ -176,6 +176,61 @@ class TestTaskExecution(object):
         assert aux.perform_called == 1
         assert root.resources['threads']['test']
 
+    @pytest.mark.timeout(10)
+    def test_root_perform_parallel_bounded_pool(self):
+        """Test that the tasks of a pool are executed by a bounded number of
+        re-used threads.
+
+        """
+        names = set()
+
+        def record_thread(task, value):
+            names.add(threading.current_thread().name)
+
+        root = self.root
+        root.pools_max_workers = {'test': 2}
+        tasks = [CheckTask(name='test%d' % i, custom=record_thread,
+                           parallel={'activated': True, 'pool': 'test'})
+                 for i in range(5)]
+        for i, task in enumerate(tasks):
+            root.add_child_task(i, task)
+        tasks[-1].parallel = {'activated': True, 'pool': 'test',
+                              'workers': 1}
+        root.check()
+        root.perform()
+
+        assert not root.should_stop.is_set()
+        assert all(task.perform_called == 1 for task in tasks)
+        assert len(root.resources['threads']['test']) == 5
+        assert root.resources['threads'].max_workers == {'test': 2}
+        assert 1 <= len(names) <= 2
+        assert not root.resources['threads']._workers
+
+    @pytest.mark.timeout(10)
+    def test_stop_parallel_queued(self):
+        """Test that the work waiting for a free worker is not performed once
+        the execution is stopped.
+
+        """
+        def stop(task, value):
+            sleep(0.2)
+            task.root.should_stop.set()
+
+        root = self.root
+        tasks = [CheckTask(name='test%d' % i,
+                           parallel={'activated': True, 'pool': 'test',
+                                     'workers': 1})
+                 for i in range(4)]
+        tasks[0].custom = stop
+        for i, task in enumerate(tasks):
+            root.add_child_task(i, task)
+        root.check()
+        root.perform()
+
+        assert tasks[0].perform_called == 1
+        assert not any(task.perform_called for task in tasks[1:])
+        assert not root.resources['threads']._workers
+
     def test_handle_task_exception_in_thread(self):
         """Test handling an exception occuring in a thread (test smooth_crash).
 
@@ -420,6 +475,74 @@ class TestTaskExecution(object):
         assert not par2.perform_called
         assert not par3.perform_called
 
+    def test_root_perform_coroutines(self):
+        """Test performing tasks as coroutines.
+
+        Parallel tasks providing a coroutine should overlap in the thread of
+        the event loop, the other tasks being performed in the executor.
+
+        """
+        threads = []
+
+        class SleepTask(CheckTask):
+            """Task sleeping without blocking the event loop.
+
+            """
+            def perform_async(self):
+                self.perform_called += 1
+                threads.append(threading.current_thread().ident)
+                yield self.root.event_loop.sleep(0.1)
+
+        root = self.root
+        root.use_coroutines = True
+        tasks = [SleepTask(name='test%d' % i,
+                           parallel={'activated': True, 'pool': 'test'})
+                 for i in range(10)]
+        for i, task in enumerate(tasks):
+            root.add_child_task(i, task)
+        sync = CheckTask(name='sync', wait={'activated': True,
+                                            'wait': ['test']},
+                         custom=lambda t, x: threads.append(
+                             all(p.perform_called for p in tasks)))
+        root.add_child_task(10, sync)
+        root.check()
+
+        thread_id = threading.current_thread().ident
+        tic = time()
+        assert root.perform()
+        assert time() - tic < 0.5
+        assert all(task.perform_called == 1 for task in tasks)
+        assert sync.perform_called == 1
+        assert threads[:-1] == [thread_id]*10
+        assert threads[-1] is True
+
+    @pytest.mark.timeout(10)
+    def test_pause_coroutines(self):
+        """Test pausing and resuming while all coroutines are waiting.
+
+        """
+        root = self.root
+        root.use_coroutines = True
+        par = CheckTask(name='test', custom=lambda t, x: sleep(0.3),
+                        parallel={'activated': True, 'pool': 'test'})
+        par2 = CheckTask(name='test2', wait={'activated': True})
+        for i, c in enumerate([par, par2]):
+            root.add_child_task(i, c)
+        root.check()
+
+        t = threading.Thread(target=root.perform)
+        t.start()
+        sleep(0.1)
+        root.should_pause.set()
+        assert root.paused.wait(1)
+        root.should_pause.clear()
+        t.join()
+
+        assert not root.should_stop.is_set()
+        assert par.perform_called == 1
+        assert par2.perform_called == 1
+        assert root.resumed.is_set()
+
     def test_handle_finalisation_issues(self):
         """Test the handling of issues in cleaning ressources in root.
 
@@ -278,6 +278,16 @@ class TestInterfaceableTaskMixin(object):
 
         assert type(bis.children[0].interface).__name__ == 'InterfaceTest'
 
+    def test_preferences_from_members(self):
+        """Test collecting the preferences of a task and its interface.
+
+        """
+        self.mixin.interface = InterfaceTest(answer=True)
+        prefs = self.mixin.preferences_from_members()
+        assert 'InterfaceTest' in prefs['interface']['interface_id']
+        self.mixin.register_preferences()
+        assert self.mixin.preferences.dict() == prefs
+
     def test_traverse(self):
         """Test traversing a task with interface.
 
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015 by Ecpy Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Test the event loop running tasks as coroutines.
+
+"""
+from __future__ import (division, unicode_literals, print_function,
+                        absolute_import)
+
+import threading
+from time import sleep
+from timeit import default_timer
+
+import pytest
+
+from ecpy.tasks.tools.coroutines import EventLoop
+
+
+@pytest.yield_fixture
+def loop():
+    loop = EventLoop()
+    yield loop
+    loop.close()
+
+
+def test_sleep_concurrently(loop):
+    """Test that sleeping coroutines spawned in a group overlap.
+
+    """
+    done = []
+
+    def sleeper(i):
+        yield loop.sleep(0.1)
+        done.append(i)
+
+    def main():
+        for i in range(10):
+            loop.spawn(sleeper(i), 'test')
+        yield loop.wait_groups(['test'])
+
+    tic = default_timer()
+    loop.run_until_complete(main())
+    assert default_timer() - tic < 0.5
+    assert sorted(done) == list(range(10))
+
+
+def test_wait_groups(loop):
+    """Test waiting for some groups only.
+
+    """
+    events = []
+
+    def sleeper(name, delay):
+        yield loop.sleep(delay)
+        events.append(name)
+
+    def main():
+        loop.spawn(sleeper('slow', 0.2), 'slow')
+        loop.spawn(sleeper('fast', 0.01), 'fast')
+        yield loop.wait_groups(excluded=['slow'])
+        events.append('excluded')
+        yield loop.wait_groups()
+        events.append('all')
+
+    loop.run_until_complete(main())
+    assert events == ['fast', 'excluded', 'slow', 'all']
+
+
+def test_run_in_executor(loop):
+    """Test calling a blocking function in the executor.
+
+    """
+    def blocking(value):
+        sleep(0.01)
+        return value, threading.current_thread().name
+
+    def main():
+        result = yield loop.run_in_executor(blocking, 1)
+        assert result[0] == 1
+        assert result[1] != threading.current_thread().name
+
+    loop.run_until_complete(main())
+
+
+def test_exceptions_propagation(loop):
+    """Test that exceptions propagate from sub-coroutines and the executor.
+
+    """
+    def failing():
+        yield
+        raise ValueError()
+
+    def blocking():
+        raise KeyError()
+
+    caught = []
+
+    def main():
+        try:
+            yield failing()
+        except ValueError:
+            caught.append('coroutine')
+        try:
+            yield loop.run_in_executor(blocking)
+        except KeyError:
+            caught.append('executor')
+        yield 1
+
+    with pytest.raises(TypeError):
+        loop.run_until_complete(main())
+    assert caught == ['coroutine', 'executor']
+
+
+def test_poll(loop):
+    """Test that the poll function is called while the loop waits.
+
+    """
+    calls = []
+    loop.poll = lambda: calls.append(True)
+
+    def main():
+        yield loop.run_in_executor(sleep, 0.1)
+
+    loop.run_until_complete(main())
+    assert len(calls) > 2
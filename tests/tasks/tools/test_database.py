@@ -12,6 +12,9 @@
 from __future__ import (division, unicode_literals, print_function,
                         absolute_import)
 
+from threading import Event, Thread, current_thread
+
+import pytest
 from pytest import raises
 
 from ecpy.tasks.tools.database import TaskDatabase
@@ -120,6 +123,48 @@ def test_database_listing():
     assert database.list_accessible_entries('root/node1') == sorted(['val2'])
 
 
+def test_node_index_and_accessible_cache():
+    """Test that the node index and accessible entries cache stay in sync.
+
+    """
+    database = TaskDatabase()
+    database.set_value('root', 'val1', 1)
+    database.create_node('root', 'node1')
+    database.create_node('root/node1', 'node2')
+    database.set_value('root/node1/node2', 'val2', 2)
+    node2 = database.go_to_path('root/node1/node2')
+    assert database.list_accessible_entries('root/node1/node2') ==\
+        ['val1', 'val2']
+
+    database.set_value('root/node1', 'val3', 3)
+    assert database.list_accessible_entries('root/node1/node2') ==\
+        ['val1', 'val2', 'val3']
+
+    database.add_access_exception('root/node1', 'root/node1/node2', 'val2')
+    assert database.list_accessible_entries('root/node1') == \
+        ['val1', 'val2', 'val3']
+    database.remove_access_exception('root/node1', 'val2')
+    assert database.list_accessible_entries('root/node1') == ['val1', 'val3']
+
+    database.rename_node('root', 'node1', 'n_node1')
+    assert database.go_to_path('root/n_node1/node2') is node2
+    with raises(KeyError):
+        database.go_to_path('root/node1/node2')
+    assert database.list_accessible_entries('root/n_node1/node2') ==\
+        ['val1', 'val2', 'val3']
+
+    database.delete_value('root', 'val1')
+    assert database.list_accessible_entries('root/n_node1/node2') ==\
+        ['val2', 'val3']
+    assert database.get_value('root/n_node1/node2', 'val3') == 3
+
+    database.delete_node('root', 'n_node1')
+    with raises(KeyError):
+        database.go_to_path('root/n_node1/node2')
+    database.create_node('root', 'n_node1')
+    assert database.list_accessible_entries('root/n_node1') == []
+
+
 def test_access_exceptions():
     """Test access exceptions.
 
@@ -148,6 +193,26 @@ def test_access_exceptions():
     assert database.list_accessible_entries('root') == ['val1']
 
 
+def test_resolve_entry_path():
+    """Test resolving the full path of an entry in both modes.
+
+    """
+    database = TaskDatabase()
+    database.set_value('root', 'val1', 1)
+    database.create_node('root', 'node1')
+    database.set_value('root/node1', 'val2', 'a')
+    database.create_node('root/node1', 'node2')
+    database.add_access_exception('root', 'root/node1', 'val2')
+
+    for _ in range(2):
+        assert (database.resolve_entry_path('root/node1/node2', 'val1') ==
+                'root/val1')
+        assert database.resolve_entry_path('root', 'val2') == 'root/node1/val2'
+        with raises(KeyError):
+            database.resolve_entry_path('root', 'val3')
+        database.prepare_to_run()
+
+
 def test_access_exceptions_renaming_values():
     """Test renaming values linked to an access ex.
 
@@ -358,3 +423,370 @@ def test_get_set_on_flat_database3():
 
     assert not database.set_value('root/node1', 'val2', 2)
     assert database.get_value('root/node1', 'val2') == 2
+
+
+def build_nested_database():
+    """Build a database with nested access exceptions.
+
+    """
+    database = TaskDatabase()
+    database.set_value('root', 'val1', 1)
+    database.create_node('root', 'node1')
+    database.create_node('root/node1', 'node2')
+    database.set_value('root/node1/node2', 'val2', 'a')
+    database.add_access_exception('root/node1', 'root/node1/node2', 'val2')
+    database.add_access_exception('root', 'root/node1', 'val2')
+    return database
+
+
+def test_exit_running():
+    """Test going back to edition mode after running.
+
+    """
+    database = build_nested_database()
+    database.prepare_to_run()
+    database.set_value('root', 'val2', 2)
+    database.set_value('root', 'val1', 3)
+
+    database.exit_running()
+    assert not database.running
+    assert database.get_value('root/node1/node2', 'val2') == 2
+    assert database.get_value('root', 'val2') == 2
+    assert database.get_value('root', 'val1') == 3
+    assert database.list_accessible_entries('root') == ['val1', 'val2']
+    database.create_node('root', 'node3')
+    database.set_value('root/node3', 'val3', 4)
+
+    database.prepare_to_run()
+    assert database.get_value('root/node3', 'val3') == 4
+    assert database.get_value('root/node3', 'val2') == 2
+
+    with raises(RuntimeError):
+        TaskDatabase().exit_running()
+
+
+def test_prepare_to_run_twice():
+    """Test entering the running mode while already running.
+
+    """
+    database = build_nested_database()
+    database.prepare_to_run()
+    database.set_value('root', 'val1', 3)
+
+    database.prepare_to_run()
+    assert database.get_value('root', 'val1') == 3
+    database.exit_running()
+    assert database.get_value('root', 'val1') == 3
+
+
+def test_flat_layout_reuse():
+    """Test that the flat layout is reused when the structure is unchanged.
+
+    """
+    database = build_nested_database()
+    database.prepare_to_run()
+    mapping = database._entry_index_map
+    database.exit_running()
+
+    database.set_value('root', 'val1', 5)
+    database.prepare_to_run()
+    assert database._entry_index_map is mapping
+    assert database.get_value('root', 'val1') == 5
+    database.exit_running()
+
+    database.set_value('root', 'val3', 5)
+    database.prepare_to_run()
+    assert database._entry_index_map is not mapping
+    assert database.get_value('root', 'val3') == 5
+    mapping = database._entry_index_map
+    database.exit_running()
+
+    # Removing an entry and adding it back changes the structure version.
+    database.delete_value('root', 'val3')
+    database.set_value('root', 'val3', 6)
+    database.prepare_to_run()
+    assert database._entry_index_map is not mapping
+    assert database._entry_index_map == mapping
+    assert database.get_value('root', 'val3') == 6
+
+
+@pytest.mark.parametrize('typed', [False, True])
+def test_snapshots(typed):
+    """Test capturing the state of the database in running mode.
+
+    """
+    database = TaskDatabase(typed_storage=typed)
+    for i in range(200):
+        database.set_value('root', 'val%d' % i, i)
+    database.create_node('root', 'node1')
+    database.set_value('root/node1', 'val', 'a')
+    database.add_access_exception('root', 'root/node1', 'val')
+    database.set_value('root', 'threads', {})
+    with raises(RuntimeError):
+        database.snapshot()
+    database.prepare_to_run()
+
+    first = database.snapshot()
+    database.set_value('root', 'val1', -1)
+    index = database.get_entries_indexes('root', ['val'])['val']
+    database.set_values_by_index([index], ['b'])
+    second = database.snapshot()
+
+    assert first.get_value('root/val1') == 1
+    assert first.get_value('root/val') == 'a'
+    assert second.get_value('root/val1') == -1
+    assert second.get_value('root/node1/val') == 'b'
+    assert second.get_values()['root/val199'] == 199
+    assert 'root/threads' not in second.get_values()
+
+    # Only the modified chunks are copied.
+    shared = [a is b for a, b in zip(first.chunks, second.chunks)]
+    assert shared.count(False) <= 2
+    assert all(a is b for a, b in zip(second.chunks,
+                                      database.snapshot().chunks))
+
+
+def test_subscriptions():
+    """Test subscribing to the changes of specific entries.
+
+    """
+    database = TaskDatabase()
+    database.set_value('root', 'val1', 1)
+    database.create_node('root', 'node1')
+    database.set_value('root/node1', 'val2', 'a')
+    database.add_access_exception('root', 'root/node1', 'val2')
+
+    changes = []
+    database.subscribe('root/val2', changes.append)
+    database.subscribe('root/unknown', changes.append)
+    database.prepare_to_run()
+    assert not database.has_observers('notifier')
+
+    database.set_value('root', 'val1', 2)
+    assert not changes
+    database.set_value('root/node1', 'val2', 'b')
+    assert changes == [('added', 'root/node1/val2', 'b')]
+
+    others = []
+    database.subscribe('root/val1', others.append)
+    indexes = database.get_entries_indexes('root', ['val1', 'val2'])
+    database.set_values_by_index([indexes['val1'], indexes['val2']],
+                                 [3, 'c'])
+    assert changes[-1] == [('added', 'root/node1/val2', 'c')]
+    assert others == [[('added', 'root/val1', 3)]]
+
+    database.unsubscribe('root/val1', others.append)
+    database.set_value('root', 'val1', 4)
+    assert len(others) == 1
+
+
+def test_entry_handles():
+    """Test accessing entries through resolved handles.
+
+    """
+    database = TaskDatabase()
+    database.set_value('root', 'val1', 1)
+    database.create_node('root', 'node1')
+    database.create_node('root/node1', 'node2')
+    database.set_value('root/node1/node2', 'val2', 'a')
+    database.add_access_exception('root/node1', 'root/node1/node2', 'val2')
+
+    database.prepare_to_run()
+    notifications = []
+    database.observe('notifier', lambda c: notifications.append(c))
+
+    handle = database.get_entry_handle('root/node1/node2', 'val1')
+    assert handle.index == 0
+    assert handle.path == 'root/val1'
+    assert handle.get() == 1
+    handle.set(2)
+    assert database.get_value('root', 'val1') == 2
+    assert notifications == [('added', 'root/val1', 2)]
+
+    handle = database.get_entry_handle('root/node1', 'val2')
+    assert handle.path == 'root/node1/node2/val2'
+    database.set_value_by_index(handle.index, 'b')
+    assert handle.get() == 'b'
+
+    with raises(KeyError):
+        database.get_entry_handle('root', 'val2')
+
+
+def test_set_values():
+    """Test setting multiple values at once in edition and running mode.
+
+    """
+    database = TaskDatabase()
+    notifications = []
+    database.observe('notifier', lambda c: notifications.append(c))
+
+    assert database.set_values('root', {'val1': 1, 'val2': 2}) is True
+    assert sorted(notifications[0]) == [('added', 'root/val1', 1),
+                                        ('added', 'root/val2', 2)]
+    assert database.set_values('root', {'val1': 3}) is False
+    assert len(notifications) == 1
+    assert database.get_value('root', 'val1') == 3
+
+    database.prepare_to_run()
+    assert database.set_values('root', {'val1': 4, 'val2': 5}) is False
+    assert sorted(notifications[1]) == [('added', 'root/val1', 4),
+                                        ('added', 'root/val2', 5)]
+
+    indexes = database.get_entries_indexes('root', ['val1', 'val2'])
+    database.set_values_by_index([indexes['val2'], indexes['val1']],
+                                 ['b', 'a'])
+    assert notifications[2] == [('added', 'root/val2', 'b'),
+                                ('added', 'root/val1', 'a')]
+    assert database.get_value('root', 'val1') == 'a'
+    assert database.get_value('root', 'val2') == 'b'
+
+
+def test_notifications_outside_lock():
+    """Test that notifications are emitted after the lock is released.
+
+    """
+    database = TaskDatabase()
+    database.set_value('root', 'val1', 1)
+    database.set_value('root', 'val2', 1)
+    database.prepare_to_run()
+
+    lock_states = []
+
+    def observer(change):
+        free = database._lock.acquire(False)
+        if free:
+            database._lock.release()
+        lock_states.append(free)
+
+    database.observe('notifier', observer)
+    database.set_value('root', 'val1', 2)
+    database.set_value_by_index(0, 3)
+    database.set_values_by_index([0, 1], [4, 5])
+    assert lock_states == [True, True, True]
+
+
+def test_notifications_ordering():
+    """Test that concurrent writes are notified in order for each entry.
+
+    """
+    database = TaskDatabase()
+    for i in range(4):
+        database.set_value('root', 'val%d' % i, 0)
+    database.prepare_to_run()
+
+    received = {}
+
+    def observer(change):
+        received.setdefault(change[1], []).append(change[2])
+
+    database.observe('notifier', observer)
+
+    def write(i):
+        handle = database.get_entry_handle('root', 'val%d' % i)
+        for j in range(1, 501):
+            handle.set(j)
+
+    threads = [Thread(target=write, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not database._outbox
+    for i in range(4):
+        assert received['root/val%d' % i] == list(range(1, 501))
+
+
+@pytest.mark.timeout(10)
+def test_notifications_delivered_by_other_writer():
+    """Test that a write made while another thread delivers notifications
+    returns immediately and is notified by the delivering thread.
+
+    """
+    database = TaskDatabase()
+    database.set_value('root', 'val1', 0)
+    database.set_value('root', 'val2', 0)
+    database.prepare_to_run()
+
+    delivering = Event()
+    release = Event()
+    received = []
+
+    def observer(change):
+        received.append((change[1], current_thread().name))
+        if change[1] == 'root/val1':
+            delivering.set()
+            release.wait()
+
+    database.observe('notifier', observer)
+
+    first = Thread(target=database.set_value, args=('root', 'val1', 1),
+                   name='first')
+    first.start()
+    assert delivering.wait(5)
+
+    second = Thread(target=database.set_value, args=('root', 'val2', 1),
+                    name='second')
+    second.start()
+    second.join(5)
+    assert not second.is_alive()
+    assert received == [('root/val1', 'first')]
+
+    release.set()
+    first.join()
+    assert received == [('root/val1', 'first'), ('root/val2', 'first')]
+    assert not database._outbox
+
+
+def test_typed_storage():
+    """Test storing numeric entries in numpy arrays.
+
+    """
+    database = TaskDatabase(typed_storage=True)
+    database.set_value('root', 'f', 1.0)
+    database.set_value('root', 'i', 2)
+    database.set_value('root', 'b', True)
+    database.set_value('root', 'c', 1j)
+    database.set_value('root', 's', 'a')
+    database.prepare_to_run()
+
+    for name, val, kind in (('f', 1.0, float), ('i', 2, int),
+                            ('b', True, bool), ('c', 1j, complex),
+                            ('s', 'a', type('a'))):
+        value = database.get_value('root', name)
+        assert value == val and type(value) is kind
+
+    indexes = database.get_entries_indexes('root', ['f', 'i', 's', 'c'])
+    ids = [indexes[n] for n in ('f', 'i', 's', 'c')]
+    assert database.get_values_by_index(ids) == [1.0, 2, 'a', 1j]
+    assert database.get_values_by_index(ids[:1], 'e') ==\
+        {'e' + str(ids[0]): 1.0}
+
+    database.set_value('root', 'f', 3.0)
+    columns = database.copy_numeric_values()
+    layout = database.get_numeric_layout()
+    assert sorted(columns) == ['bool', 'complex', 'float', 'int']
+    kind, pos = layout['root/f']
+    assert columns[kind][pos] == 3.0
+    database.set_value('root', 'f', 4.0)
+    assert columns[kind][pos] == 3.0
+
+    # Writing a value of another type moves the entry to the object storage.
+    database.set_value('root', 'i', 2.5)
+    assert database.get_value('root', 'i') == 2.5
+    assert 'root/i' not in database.get_numeric_layout()
+    database.set_value('root', 'i', 3)
+    assert database.get_value('root', 'i') == 3
+
+
+def test_copy_numeric_values_untyped():
+    """Test that copying the numeric values requires the typed storage.
+
+    """
+    database = TaskDatabase()
+    database.set_value('root', 'f', 1.0)
+    database.prepare_to_run()
+    with raises(RuntimeError):
+        database.copy_numeric_values()
+    with raises(RuntimeError):
+        database.get_numeric_layout()
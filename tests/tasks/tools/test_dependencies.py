@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015 by Ecpy Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Test the static analysis of the dependencies between tasks.
+
+"""
+from __future__ import (division, unicode_literals, print_function,
+                        absolute_import)
+
+import pytest
+from atom.api import Unicode
+
+from ecpy.tasks.base_tasks import RootTask, SimpleTask, ComplexTask
+from ecpy.tasks.tools.dependencies import analyse_dependencies
+
+
+class ReadTask(SimpleTask):
+    """Task formatting and evaluating strings.
+
+    """
+    form = Unicode().tag(fmt=True)
+
+    feval = Unicode().tag(feval=True)
+
+
+@pytest.fixture
+def root():
+    """Hierarchy in which a task in a parallel complex task writes an entry
+    read by later tasks.
+
+    """
+    root = RootTask()
+    comp = ComplexTask(name='comp', parallel={'activated': True,
+                                              'pool': 'pool'})
+    root.add_child_task(0, comp)
+    writer = SimpleTask(name='writer', database_entries={'val': 1})
+    comp.add_child_task(0, writer)
+    root.add_child_task(1, ReadTask(name='reader', form='{default_path}',
+                                    feval='{writer_val}*{missing}'))
+    writer.add_access_exception('val', 1)
+    return root
+
+
+def test_reads_writes(root):
+    """Test the collection of the entries read and written.
+
+    """
+    deps = analyse_dependencies(root)
+    assert deps.tasks == ['root/Root', 'root/comp', 'root/comp/writer',
+                          'root/reader']
+    assert deps.writes['root/comp/writer'] == {'root/comp/writer_val'}
+    assert deps.reads['root/reader'] == {'root/default_path',
+                                         'root/comp/writer_val'}
+    assert deps.unresolved['root/reader'] == {'missing'}
+    assert deps.pools['root/comp/writer'] == ('pool',)
+    assert deps.pools['root/reader'] == ()
+
+    assert deps.get_writers('root/comp/writer_val') == ['root/comp/writer']
+    assert deps.get_readers('root/comp/writer_val') == ['root/reader']
+    assert 'root/comp/writer_val' in deps.get_written_entries()
+    assert deps.get_read_entries() == {'root/default_path',
+                                       'root/comp/writer_val'}
+    graph = deps.get_graph()
+    assert graph['root/comp/writer'] == {'root/reader':
+                                         {'root/comp/writer_val'}}
+
+
+def test_races(root):
+    """Test the detection of races between parallel pools.
+
+    """
+    deps = analyse_dependencies(root)
+    assert deps.find_races() == [('root/comp/writer_val', 'root/comp/writer',
+                                  'root/reader', 'pool')]
+
+    root.children[1].wait = {'activated': True, 'no_wait': ['other']}
+    assert not analyse_dependencies(root).find_races()
+
+    root.children[1].wait = {'activated': True, 'wait': ['other']}
+    assert analyse_dependencies(root).find_races()
+
+
+def test_analysis_running_mode(root):
+    """Test that the analysis gives the same results in running mode.
+
+    """
+    deps = analyse_dependencies(root)
+    root.database.prepare_to_run()
+    try:
+        running = analyse_dependencies(root)
+    finally:
+        root.database.exit_running()
+    assert running.reads == deps.reads
+    assert running.writes == deps.writes
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015 by Ecpy Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Test the compilation of a task hierarchy into an execution plan.
+
+"""
+from __future__ import (division, unicode_literals, print_function,
+                        absolute_import)
+
+import pytest
+
+from ecpy.tasks.base_tasks import RootTask, ComplexTask
+from ecpy.tasks.tools.execution_plan import (ExecutionPlan, CALL, CHECK, WAIT,
+                                             JUMP, LOOP_START, LOOP_NEXT,
+                                             LOOP_BREAK, LOOP_END)
+from ecpy.testing.tasks.util import CheckTask
+
+
+@pytest.fixture
+def root():
+    root = RootTask(should_stop=None, should_pause=None)
+    root.use_execution_plan = True
+    comp = ComplexTask(name='comp', stoppable=False)
+    comp.add_child_task(0, CheckTask(name='check1'))
+    comp.add_child_task(1, CheckTask(name='check2', stoppable=False,
+                                     wait={'activated': True,
+                                           'wait': ['test']}))
+    root.add_child_task(0, comp)
+    return root
+
+
+def test_compile(root):
+    """Test compiling a simple hierarchy.
+
+    """
+    root.prepare()
+    plan = root._plan
+    opcodes = [i[0] for i in plan.instructions]
+    assert opcodes == [CHECK, CALL, WAIT, CALL]
+    assert plan.instructions[0][1] == 2
+    assert plan.instructions[2][1:] == (('test',), None)
+
+
+def test_compile_parallel(root):
+    """Test that parallel tasks are simply called.
+
+    """
+    comp = root.children[0]
+    comp.parallel = {'activated': True, 'pool': 'test'}
+    root.prepare()
+    assert root._plan.instructions == [(CALL, comp.perform_)]
+
+
+def test_perform(root):
+    """Test that performing through the plan calls the tasks.
+
+    """
+    root.prepare()
+    root.perform()
+    assert not root.should_stop.is_set()
+    for child in root.children[0].children:
+        assert child.perform_called == 1
+
+
+def test_compile_loop():
+    """Test compiling a loop and recovering from the exceptions of its body.
+
+    """
+    plan = ExecutionPlan(None)
+    plan.compile_loop(lambda: iter(()), lambda: plan.emit(CALL, None),
+                      {KeyError: 'break', ValueError: 'continue'})
+    plan._finalize()
+
+    assert [i[0] for i in plan.instructions] == [LOOP_START, LOOP_NEXT, CALL,
+                                                 JUMP, LOOP_BREAK, LOOP_END]
+    assert plan.instructions[1][2] == 5
+    assert plan.instructions[3][1] == 1
+    assert plan.find_handler(2, KeyError(), [None]) == 4
+    assert plan.find_handler(2, ValueError(), [None]) == 1
+
+    closed = []
+
+    class Iterator(object):
+        def close(self):
+            closed.append(True)
+
+    iterators = [Iterator()]
+    assert plan.find_handler(2, RuntimeError(), iterators) is None
+    assert closed and iterators == [None]
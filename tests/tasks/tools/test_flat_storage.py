@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015 by Ecpy Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Test the storages used by the database in running mode.
+
+"""
+from __future__ import (division, unicode_literals, print_function,
+                        absolute_import)
+
+import os
+
+from ecpy.tasks.tools.database import TaskDatabase
+from ecpy.tasks.tools.flat_storage import (TypedFlatStorage,
+                                           SharedFlatStorage,
+                                           SharedStorageReader)
+
+
+def test_typed_flat_storage():
+    """Test storing and demoting values in a typed storage.
+
+    """
+    storage = TypedFlatStorage([1, 2.0, 'a', True, 1j])
+    assert sorted(storage.columns) == ['bool', 'complex', 'float', 'int']
+    assert [storage[i] for i in range(5)] == [1, 2.0, 'a', True, 1j]
+    assert storage.take([4, 1, 2]) == [1j, 2.0, 'a']
+
+    storage[0] = 5
+    assert storage[0] == 5
+    storage[0] = 'b'
+    assert storage[0] == 'b'
+    assert 0 not in storage.layout()
+    assert len(storage) == 5
+
+
+def test_shared_storage_roundtrip(tmpdir):
+    """Test reading the values written in a shared storage.
+
+    """
+    path = str(tmpdir.join('shared.db'))
+    storage = SharedFlatStorage([1, 2.0, 'a'], path)
+    demoted = []
+    storage.observe('demoted', lambda change: demoted.append(change))
+    infos = storage.infos()
+    infos['entries'] = {'root/i': ('int', 0, 0), 'root/f': ('float', 0, 1)}
+
+    reader = SharedStorageReader(infos)
+    assert reader.read() == {'root/i': 1, 'root/f': 2.0}
+
+    storage[0] = 3
+    storage[1] = 1.5
+    assert reader.read() == {'root/i': 3, 'root/f': 1.5}
+
+    storage[0] = 'b'
+    assert demoted
+    assert reader.read() == {'root/f': 1.5}
+
+    reader.close()
+    storage.close()
+    assert not os.path.isfile(path)
+
+
+def test_database_shared_storage(tmpdir):
+    """Test using a shared storage in the database.
+
+    """
+    database = TaskDatabase()
+    database.set_value('root', 'i', 1)
+    database.set_value('root', 's', 'a')
+    database.shared_storage_path = str(tmpdir.join('shared.db'))
+    database.prepare_to_run()
+
+    infos = database.get_shared_storage_infos()
+    assert list(infos['entries']) == ['root/i']
+    reader = SharedStorageReader(infos)
+    database.set_value('root', 'i', 2)
+    assert reader.read() == {'root/i': 2}
+    reader.close()
+
+    database.close_shared_storage()
+    assert database.get_shared_storage() is None
+    assert database.get_value('root', 'i') == 2
+    assert database.get_value('root', 's') == 'a'
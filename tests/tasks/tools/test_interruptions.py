@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015 by Ecpy Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Test the events used to interrupt the execution of a task hierarchy.
+
+"""
+from __future__ import (division, unicode_literals, print_function,
+                        absolute_import)
+
+from multiprocessing import Event
+from threading import Thread
+from time import sleep
+
+import pytest
+
+from ecpy.tasks.base_tasks import RootTask
+from ecpy.tasks.tools.interruptions import (InterruptionEvent,
+                                            InterruptionWatcher, link_events)
+
+
+def wait_for(condition, timeout=5):
+    """Wait for a condition to become true.
+
+    """
+    for _ in range(int(timeout/0.01)):
+        if condition():
+            return True
+        sleep(0.01)
+    return condition()
+
+
+def test_interruption_event():
+    """Test that the in-process copy follows the changes of the event.
+
+    """
+    event = Event()
+    event.set()
+    interruption = InterruptionEvent(event)
+    assert interruption.flag and interruption.is_set()
+
+    interruption.clear()
+    assert not interruption.flag and not event.is_set()
+
+    interruption.set()
+    assert interruption.flag and event.is_set()
+    assert interruption.wait(0)
+
+
+def test_root_events_coercion():
+    """Test that the events of the root are wrapped.
+
+    """
+    root = RootTask()
+    event = Event()
+    root.should_stop = event
+    assert isinstance(root.should_stop, InterruptionEvent)
+    assert root.should_stop.event is event
+    assert isinstance(root.should_pause, InterruptionEvent)
+    assert root.should_stop.condition is root.should_pause.condition
+
+
+@pytest.mark.timeout(10)
+@pytest.mark.parametrize('resume, stopped', [('clear', False),
+                                             ('set', True)])
+def test_wait_cleared(resume, stopped):
+    """Test that a paused thread wakes up when resumed or stopped.
+
+    """
+    stop = InterruptionEvent()
+    pause = InterruptionEvent()
+    link_events(stop, pause)
+    pause.set()
+
+    def resume_or_stop():
+        sleep(0.05)
+        if resume == 'clear':
+            pause.clear()
+        else:
+            stop.set()
+
+    thread = Thread(target=resume_or_stop)
+    thread.start()
+    assert pause.wait_cleared(stop) is stopped
+    thread.join()
+
+
+@pytest.mark.timeout(10)
+@pytest.mark.parametrize('shared', [False, True])
+def test_interruption_watcher(shared):
+    """Test mirroring changes made directly on the inter-process events.
+
+    When the events share a changed event, the other process sets it after
+    each change and the watcher blocks on it instead of polling.
+
+    """
+    changed = Event() if shared else None
+    stop = InterruptionEvent(changed=changed)
+    pause = InterruptionEvent(changed=changed)
+
+    def modify(event, state):
+        getattr(event.event, state)()
+        if changed is not None:
+            changed.set()
+
+    watcher = InterruptionWatcher(stop, pause)
+    assert stop.condition is pause.condition
+    watcher.start()
+    try:
+        modify(pause, 'set')
+        assert wait_for(lambda: pause.flag)
+
+        def resume():
+            sleep(0.05)
+            modify(pause, 'clear')
+
+        thread = Thread(target=resume)
+        thread.start()
+        assert not pause.wait_cleared(stop)
+        thread.join()
+
+        modify(stop, 'set')
+        assert wait_for(lambda: stop.flag)
+    finally:
+        watcher.close()
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright 2015 by Ecpy Authors, see AUTHORS for more details.
+#
+# Distributed under the terms of the BSD license.
+#
+# The full license is in the file LICENCE, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Test the binary journal of the database writes.
+
+"""
+from __future__ import (division, unicode_literals, print_function,
+                        absolute_import)
+
+import numpy as np
+import pytest
+
+from ecpy.tasks.tools.database import TaskDatabase
+from ecpy.tasks.tools.journal import (encode_value, decode_value,
+                                      DatabaseJournal, JournalReader)
+
+
+@pytest.mark.parametrize('value', [1.5, 3, True, 1j, 'é', b'ab', 2**70,
+                                   {'a': [1, 2]}])
+def test_encoding(value):
+    """Test encoding and decoding values.
+
+    """
+    assert decode_value(*encode_value(value)) == value
+
+
+def test_encoding_arrays():
+    """Test encoding and decoding numpy arrays.
+
+    """
+    array = np.arange(6, dtype=np.int32).reshape((2, 3))
+    decoded = decode_value(*encode_value(array))
+    assert decoded.dtype == array.dtype
+    np.testing.assert_array_equal(decoded, array)
+
+    array = np.array([1, 'a'], dtype=object)
+    assert list(decode_value(*encode_value(array))) == [1, 'a']
+
+
+def test_journal_roundtrip(tmpdir):
+    """Test writing and reading back a journal.
+
+    """
+    path = str(tmpdir.join('journal.bin'))
+    journal = DatabaseJournal(path, ['root/a', 'root/b', 'root/c'], 0.001)
+    mutable = [1]
+    for i in range(1000):
+        journal.record(0, float(i))
+    journal.record(1, mutable)
+    mutable.append(2)
+    journal.record(1, 'a')
+    journal.close()
+
+    reader = JournalReader(path)
+    times, values = reader.read('root/a')
+    np.testing.assert_array_equal(values, np.arange(1000.))
+    assert np.all(np.diff(times) >= 0)
+    assert reader.read('root/b')[1] == [[1], 'a']
+    assert 'root/c' not in reader.series
+
+
+def test_database_journal(tmpdir):
+    """Test recording the writes of a database in running mode.
+
+    """
+    path = str(tmpdir.join('journal.bin'))
+    database = TaskDatabase(journal_path=path)
+    database.set_value('root', 'a', 0)
+    database.set_value('root', 'b', np.zeros(2))
+    database.prepare_to_run()
+
+    database.set_value('root', 'a', 1)
+    handle = database.get_entry_handle('root', 'a')
+    handle.set(2)
+    database.set_values('root', {'a': 3, 'b': np.ones(2)})
+    database.close_journal()
+    database.set_value('root', 'a', 4)
+
+    reader = JournalReader(path)
+    assert list(reader.read('root/a')[1]) == [1, 2, 3]
+    np.testing.assert_array_equal(reader.read('root/b')[1][0], np.ones(2))
+
+
+class LockChecker(object):
+    """Object checking when pickled that the lock of a database is free.
+
+    """
+    database = None
+
+    def __getstate__(self):
+        lock = LockChecker.database._lock
+        assert lock.acquire(False)
+        lock.release()
+        return {}
+
+
+def test_database_journal_outside_lock(tmpdir):
+    """Test that the values are captured before acquiring the lock of the
+    database.
+
+    """
+    path = str(tmpdir.join('journal.bin'))
+    database = TaskDatabase(journal_path=path)
+    database.set_value('root', 'a', 0)
+    database.prepare_to_run()
+    LockChecker.database = database
+
+    database.set_value('root', 'a', LockChecker())
+    database.set_value_by_index(0, LockChecker())
+    database.set_values_by_index([0], [LockChecker()])
+    database.close_journal()
+
+    reader = JournalReader(path)
+    assert len(reader.read('root/a')[1]) == 3
+
+
+class FailingFile(object):
+    """File whose writes fail.
+
+    """
+    def write(self, data):
+        raise IOError()
+
+    def close(self):
+        pass
+
+
+def test_journal_write_failure(tmpdir):
+    """Test that the records are dropped once writing the journal failed.
+
+    """
+    path = str(tmpdir.join('journal.bin'))
+    journal = DatabaseJournal(path, ['root/a'], 0.001)
+    journal._file.close()
+    journal._file = FailingFile()
+    journal.record(0, 1)
+    journal._thread.join(1)
+    assert not journal._thread.is_alive()
+
+    journal.record(0, 2)
+    assert not journal._queue
+    journal.close()
@@ -15,7 +15,13 @@ check that in single thread things work.
 from __future__ import (division, unicode_literals, print_function,
                         absolute_import)
 
-from ecpy.tasks.tools.shared_resources import SharedCounter, SharedDict
+from threading import Event, current_thread, Lock
+from time import sleep
+
+import pytest
+
+from ecpy.tasks.tools.shared_resources import (SharedCounter, SharedDict,
+                                               WorkerPool, ThreadPoolResource)
 
 
 def test_shared_counter():
@@ -54,3 +60,137 @@ def test_shared_dict():
 
     for i in sdict:
         pass
+
+
+@pytest.mark.timeout(10)
+def test_worker_pool_bound():
+    """Test that a worker pool never uses more threads than allowed.
+
+    """
+    pool = WorkerPool('test', 2)
+    lock = Lock()
+    state = {'running': 0, 'max': 0}
+    threads = set()
+    go_on = Event()
+
+    def work():
+        with lock:
+            state['running'] += 1
+            state['max'] = max(state['max'], state['running'])
+            threads.add(current_thread().name)
+        go_on.wait()
+        with lock:
+            state['running'] -= 1
+
+    items = [pool.submit(work) for i in range(10)]
+    assert items[0].is_alive()
+    while state['running'] < 2:
+        sleep(0.001)
+    sleep(0.05)
+    go_on.set()
+    for item in items:
+        item.join()
+    assert all(item.done() for item in items)
+    assert state['max'] == 2
+    # The threads are re-used.
+    assert len(threads) == 2
+
+    pool.shutdown()
+    assert not pool._threads
+    with pytest.raises(RuntimeError):
+        pool.submit(work)
+
+
+@pytest.mark.timeout(10)
+def test_worker_pool_nested_wait():
+    """Test that waiting on work of the same pool from a worker does not
+    deadlock.
+
+    """
+    pool = WorkerPool('test', 1)
+    values = []
+
+    def outer():
+        inner = pool.submit(values.append, 1)
+        inner.wait()
+        values.append(2)
+
+    pool.submit(outer).wait()
+    assert values == [1, 2]
+    pool.shutdown()
+
+
+@pytest.mark.timeout(10)
+def test_worker_pool_exception():
+    """Test that an exception in a work item does not kill the worker.
+
+    """
+    pool = WorkerPool('test', 1)
+    values = []
+
+    def raiser():
+        raise Exception()
+
+    pool.submit(raiser).wait()
+    pool.submit(values.append, 1).wait()
+    assert values == [1]
+    assert len(pool._threads) == 1
+    pool.shutdown()
+
+
+@pytest.mark.timeout(10)
+def test_thread_pool_resource():
+    """Test submitting work to named pools.
+
+    """
+    resource = ThreadPoolResource()
+    resource.max_workers = {'a': 1}
+    values = []
+    first = resource.submit('a', values.append, 1)
+    second = resource.submit('b', values.append, 2)
+    assert resource['a'] == [first]
+    assert resource['b'] == [second]
+    assert resource._workers['a'].max_workers == 1
+    assert resource._workers['b'].max_workers == \
+        resource.default_max_workers
+
+    resource.release()
+    assert sorted(values) == [1, 2]
+    assert not resource._workers
+
+
+@pytest.mark.timeout(10)
+def test_thread_pool_resource_wait():
+    """Test waiting for some pools to complete their work.
+
+    """
+    resource = ThreadPoolResource()
+    events = {'a': Event(), 'b': Event(), 'c': Event()}
+    for pool, event in events.items():
+        resource.submit(pool, event.wait)
+    assert resource.pending() == 3
+    assert resource.pending(['a']) == 1
+    assert resource.pending(excluded=['a']) == 2
+
+    events['a'].set()
+    resource.wait(['a'])
+    assert not resource['a']
+    assert resource._pending['a'] == 0
+    assert resource['b'] and resource['c']
+
+    events['b'].set()
+    resource.wait(excluded=['c'])
+    assert not resource['b']
+    assert resource['c']
+    assert resource._outstanding == 1
+
+    # Work submitted from a worker while waiting is waited for too.
+    done = []
+    resource.submit('a', lambda: resource.submit('a', done.append, 1))
+    events['c'].set()
+    resource.wait()
+    assert done == [1]
+    assert not any(resource[p] for p in events)
+    assert resource._outstanding == 0
+
+    resource.release()
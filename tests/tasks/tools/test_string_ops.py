@@ -12,8 +12,18 @@
 from __future__ import (division, unicode_literals, print_function,
                         absolute_import)
 
-from ecpy.tasks.base_tasks import RootTask
+from ecpy.tasks.base_tasks import RootTask, TASK_CACHE_SIZE
+import pytest
+
+from ecpy.tasks.tools.string_evaluation import (CompilationCache,
+                                                COMPILATION_CACHE,
+                                                ALLOWED_ATTRIBUTES,
+                                                EVALUATION_NAMESPACE,
+                                                ForbiddenExpressionError,
+                                                check_expression, safe_compile,
+                                                safe_eval)
 from math import cos
+from types import ModuleType
 import numpy
 from numpy.testing import assert_array_equal
 
@@ -271,3 +281,158 @@ class TestEvaluation(object):
         test = 'np.abs({val1})[{val2}]'
         formatted = self.root.format_and_eval_string(test)
         assert formatted == 2.0
+
+    def test_eval_running_mode_compiled(self):
+        """Test that the cached expression is compiled only once.
+
+        """
+        self.root.database.prepare_to_run()
+        test = '{val1} + {val1}*{val2}'
+        assert self.root.format_and_eval_string(test) == 11
+        evaluate = self.root._eval_cache[test][0]
+        self.root.database.set_value('root', 'val1', 2)
+        assert self.root.format_and_eval_string(test) == 22
+        assert self.root._eval_cache[test][0] is evaluate
+
+    def test_eval_running_mode_generator(self):
+        """Test that database values are visible in nested scopes.
+
+        """
+        self.root.database.prepare_to_run()
+        test = 'sum(i*{val1} for i in range(3))'
+        assert self.root.format_and_eval_string(test) == 3
+
+    def test_eval_running_mode_shared(self):
+        """Test that tasks evaluating the same expression share the compiled
+        function.
+
+        """
+        other = RootTask(database=self.root.database)
+        self.root.database.prepare_to_run()
+        test = '{val1}*{val2} + 1'
+        assert self.root.format_and_eval_string(test) == 11
+        misses = COMPILATION_CACHE.misses
+        assert other.format_and_eval_string(test) == 11
+        assert COMPILATION_CACHE.misses == misses
+        assert (other._eval_cache[test][0] is
+                self.root._eval_cache[test][0])
+
+    def test_eval_running_mode_bounded(self):
+        """Test that the strings cached by a task are bounded.
+
+        """
+        self.root.database.prepare_to_run()
+        for i in range(TASK_CACHE_SIZE + 10):
+            assert self.root.format_and_eval_string('{val1} + %d' % i) == i + 1
+        assert len(self.root._eval_cache) <= TASK_CACHE_SIZE
+
+
+def test_compilation_cache():
+    """Test the LRU eviction and the counters of the compilation cache.
+
+    """
+    cache = CompilationCache(maxsize=2)
+    add = cache.get(safe_compile, 'a + 1', ('a',))
+    assert add(1) == 2
+    assert cache.get(safe_compile, 'a + 1', ('a',)) is add
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    cache.get(safe_compile, 'a + 2', ('a',))
+    cache.get(safe_compile, 'a + 1', ('a',))
+    cache.get(safe_compile, 'a + 3', ('a',))
+    assert len(cache) == 2
+    assert cache.get(safe_compile, 'a + 1', ('a',)) is add
+    assert cache.get(safe_compile, 'a + 2', ('a',)) is not add
+    assert cache.misses == 4
+
+    cache.clear()
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (0, 0)
+
+
+@pytest.mark.parametrize('expr', ['1 + 2*3 < 4 or not True', 'cos(Pi)/2',
+                                  'np.linspace(0, 1, num=3)[1:]',
+                                  '[i**2 for i in range(3)]', '{1: 2}[1]',
+                                  'a if b else cm.sqrt(-1).real',
+                                  'np.linalg.norm(a) + np.pi.real',
+                                  '"{0:.{1}f} {a.real}".format(a, 2, a=b)'])
+def test_check_allowed_expression(expr):
+    """Test that the usual constructs are allowed.
+
+    """
+    assert check_expression(expr, ('a', 'b')) == []
+
+
+@pytest.mark.parametrize('expr, rejection',
+                         [('__import__("os")', 'name __import__'),
+                          ('open("f")', 'name open'),
+                          ('a.__class__', 'attribute __class__'),
+                          ('(lambda: 1)()', 'construct Lambda'),
+                          ('unknown + 1', 'name unknown'),
+                          ('np.lib.npyio.os.getcwd()',
+                           'attribute np.lib.npyio.os.getcwd'),
+                          ('np.ctypeslib.ctypes.CDLL',
+                           'attribute np.ctypeslib.ctypes.CDLL'),
+                          ('np.ctypeslib.load_library("a", ".")',
+                           'attribute np.ctypeslib.load_library'),
+                          ('np.load("f")', 'attribute np.load'),
+                          ('[m.lib for m in [np]]', 'module np'),
+                          ('__checked_getattr__(a, "b")',
+                           'name __checked_getattr__'),
+                          ('"{0.__class__}".format(a)',
+                           'format field 0.__class__'),
+                          ('"{0:{1[_a]}}".format(a, a)',
+                           'format field 1[_a]'),
+                          ('str.format("{0.__class__}", a)',
+                           'format of a non literal string'),
+                          ('("{0." + "__class__}").format(a)',
+                           'format of a non literal string'),
+                          ('format(a, "")', 'name format'),
+                          ('np.zeros(2).tofile("f")', 'attribute tofile'),
+                          ('a.dump("f")', 'attribute dump')])
+def test_check_forbidden_expression(expr, rejection):
+    """Test that forbidden constructs are rejected.
+
+    """
+    assert check_expression(expr, ('a',)) == [rejection]
+    with pytest.raises(ForbiddenExpressionError) as e:
+        safe_compile(expr, ('a',))
+    assert e.value.rejections == [rejection]
+    with pytest.raises(ForbiddenExpressionError):
+        safe_eval(expr, {'a': 1})
+
+
+def test_allowed_attributes():
+    """Test that the allowed attributes are neither modules nor types.
+
+    """
+    for module, paths in ALLOWED_ATTRIBUTES.items():
+        for path in paths:
+            value = EVALUATION_NAMESPACE[module]
+            for attr in path.split('.'):
+                value = getattr(value, attr)
+            assert not isinstance(value, (ModuleType, type)), path
+
+
+def test_attributes_checked_when_evaluating():
+    """Test that attributes of values giving access to types are rejected
+    when evaluating the expression.
+
+    """
+    assert check_expression('a.dtype.type', ('a',)) == []
+    a = numpy.arange(3)
+    with pytest.raises(ForbiddenExpressionError):
+        safe_eval('a.dtype.type', {'a': a})
+    with pytest.raises(ForbiddenExpressionError):
+        safe_compile('a.dtype.type', ('a',))(a)
+    assert safe_eval('a.sum() + a.real[1]', {'a': a}) == 4
+
+
+def test_safe_eval_cached():
+    """Test that safe_eval compiles an expression only once.
+
+    """
+    assert safe_eval('_a0 + 1', {'_a0': 1}) == 2
+    misses = COMPILATION_CACHE.misses
+    assert safe_eval('_a0 + 1', {'_a0': 2}) == 3
+    assert COMPILATION_CACHE.misses == misses